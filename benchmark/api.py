@@ -1,16 +1,41 @@
 """
 This file implements a FastAPI application that serves as an API for the TEXT2SPARQL service.
 It allows users to submit natural language questions and receive SPARQL queries in response.
+Requests are answered concurrently by a bounded pool of warm browsers, 
+when all the browsers are busy and too many requests are waiting, the API answers 503 with a Retry-After header.
 """
-
+import asyncio
+from contextlib import asynccontextmanager
 import fastapi
 from fastapi.staticfiles import StaticFiles
 import interactions
+import llm_proxy
+import sparql_proxy
+import wikidata_service
+from driver_pool import DriverPool
 import config
 
+# Shared pool of browsers, started with the application
+driver_pool: DriverPool = None
+# One slot per browser of the pool
+driver_slots: asyncio.Semaphore = None
+# Number of requests waiting for a browser
+waiting_requests = 0
+
+@asynccontextmanager
+async def lifespan(app: fastapi.FastAPI):
+    global driver_pool, driver_slots
+    driver_pool = await asyncio.to_thread(
+        DriverPool, config.API_NB_DRIVERS, is_headless=True,
+        max_questions=config.DRIVER_MAX_QUESTIONS, max_memory_mb=config.DRIVER_MAX_MEMORY_MB
+    )
+    driver_slots = asyncio.Semaphore(config.API_NB_DRIVERS)
+    yield
+    await asyncio.to_thread(driver_pool.close)
 
 app = fastapi.FastAPI(
     title="TEXT2SPARQL API Example",
+    lifespan=lifespan,
 )
 
 script_dir = config.script_dir
@@ -18,14 +43,54 @@ script_dir = config.script_dir
 # Serve static files (HTML, JS, CSS)
 app.mount("/static", StaticFiles(directory=script_dir+"/../webapp/"), name="static")
 
+# Caching proxy for the LLM API (used by the page when LLM_PROXY is True)
+app.include_router(llm_proxy.router, prefix="/llm")
+# Caching proxy for the SPARQL queries of Sparklis (used by the page when SPARQL_PROXY is True)
+app.include_router(sparql_proxy.router, prefix="/sparql")
+# Label and entity search service for Wikidata (used by the page when WIKIDATA_SERVICE is True)
+app.include_router(wikidata_service.router, prefix="/wikidata")
+
 KNOWN_DATASETS = [
     "https://text2sparql.aksw.org/2025/dbpedia/",
     "https://text2sparql.aksw.org/2025/corporate/",
     "https://query.wikidata.org/sparql/"
 ]
 
+def saturated_error() -> fastapi.HTTPException:
+    """
+    Error sent when no browser is available to answer a request.
+    """
+    return fastapi.HTTPException(503, "All browsers are busy, please retry later.",
+                                 headers={"Retry-After": str(config.API_RETRY_AFTER)})
+
+async def run_with_driver(interaction):
+    """
+    Run a blocking interaction with a browser of the pool, without blocking the event loop.
+    The request waits for a free browser (backpressure), unless too many requests are already waiting.
+    """
+    global waiting_requests
+    if not driver_slots.locked():
+        await driver_slots.acquire() # a browser is free, no need to wait
+    else:
+        if waiting_requests >= config.API_MAX_WAITING_REQUESTS:
+            raise saturated_error()
+        waiting_requests += 1
+        try:
+            await asyncio.wait_for(driver_slots.acquire(), timeout=config.API_WAITING_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise saturated_error()
+        finally:
+            waiting_requests -= 1
+    try:
+        def blocking_interaction():
+            with driver_pool.driver() as driver:
+                return interaction(driver)
+        return await asyncio.to_thread(blocking_interaction)
+    finally:
+        driver_slots.release()
+
 @app.get("/")
-def get_answer(question: str, dataset: str) -> dict:
+async def get_answer(question: str, dataset: str) -> dict:
     """
      Translate a natural language question into a SPARQL query for a given dataset.
     """
@@ -41,13 +106,13 @@ def get_answer(question: str, dataset: str) -> dict:
     
     system_name = "sparklisllm-LLMFrameworkText2Sparql"
     suggestion_commands_tactic = 'best_at_individual_cmd'
-    driver = interactions.get_new_driver(is_headless=True)
-    result, nl_query, error, steps_status, reasoning, _ = interactions.simulated_user(
-        config.SPARKLIS_LINK,
-        lambda drv: interactions.sparklisllm_question(drv, question, dataset, system_name, suggestion_commands_tactic),
-        driver=driver
+    result, nl_query, error, steps_status, reasoning, calls, _ = await run_with_driver(
+        lambda driver: interactions.simulated_user(
+            interactions.sparklis_url(dataset),
+            lambda drv: interactions.sparklisllm_question(drv, question, system_name, suggestion_commands_tactic),
+            driver=driver
+        )
     )
-    driver.close() # should close the page after the api request
     return {
         "dataset": dataset,
         "question": question,
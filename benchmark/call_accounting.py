@@ -0,0 +1,117 @@
+"""
+Accounting of the LLM and SPARQL calls made while answering the questions of a run.
+Each call is a dictionary with its Type ("LLM" or "SPARQL"), Source ("System" for the calls of the tested system,
+"Evaluation" for the queries executed by the evaluation), Model, PromptTokens, CompletionTokens,
+TimeToFirstToken and Latency (in seconds) and HTTP Status.
+The calls of the system are recorded by calls_accounting.js in the page of Sparklis.
+The calls of a question are summarized in its Usage, and the calls of a run in its Stats.
+"""
+import config
+
+LLM = "LLM"
+SPARQL = "SPARQL"
+SYSTEM = "System"
+EVALUATION = "Evaluation"
+
+def make_call(call_type: str, source: str, latency: float, status, model: str = None,
+              prompt_tokens: int = None, completion_tokens: int = None, time_to_first_token: float = None) -> dict:
+    return {
+        "Type": call_type,
+        "Source": source,
+        "Model": model,
+        "PromptTokens": prompt_tokens,
+        "CompletionTokens": completion_tokens,
+        "TimeToFirstToken": time_to_first_token,
+        "Latency": latency,
+        "Status": status,
+    }
+
+def model_prices(model: str) -> tuple[float, float]:
+    """
+    Prices (per million input and output tokens) of a model in LLM_PRICES, or None if unknown.
+    The longest known name prefixing the model is used (e.g. gpt-4o-mini-2024-07-18 is priced as gpt-4o-mini).
+    """
+    if not model:
+        return None
+    known = [name for name in config.LLM_PRICES if model.startswith(name)]
+    if len(known) == 0:
+        return None
+    return config.LLM_PRICES[max(known, key=len)]
+
+def call_cost(call: dict) -> float:
+    """
+    Estimated cost of a LLM call, or None if its model or its tokens are unknown.
+    """
+    prices = model_prices(call.get("Model"))
+    if prices is None or call.get("PromptTokens") is None or call.get("CompletionTokens") is None:
+        return None
+    return (prices[0] * call["PromptTokens"] + prices[1] * call["CompletionTokens"]) / 1_000_000
+
+def percentile(values: list, p: float) -> float:
+    """
+    Percentile p (between 0 and 100) of the values, with linear interpolation, or None if there is no value.
+    """
+    values = sorted(values)
+    if len(values) == 0:
+        return None
+    position = (len(values) - 1) * p / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+def known_sum(values: list):
+    """
+    Sum of the known values, or None if no value is known.
+    """
+    values = [v for v in values if v is not None]
+    return sum(values) if len(values) > 0 else None
+
+def calls_usage(calls: list[dict]) -> dict:
+    """
+    Usage of a question: number of calls, tokens, latencies and cost of the calls of the system.
+    """
+    llm_calls = [c for c in calls if c.get("Type") == LLM and c.get("Source", SYSTEM) == SYSTEM]
+    sparql_calls = [c for c in calls if c.get("Type") == SPARQL and c.get("Source", SYSTEM) == SYSTEM]
+    return {
+        "NbLLMCalls": len(llm_calls),
+        "PromptTokens": known_sum([c.get("PromptTokens") for c in llm_calls]),
+        "CompletionTokens": known_sum([c.get("CompletionTokens") for c in llm_calls]),
+        "LLMLatency": known_sum([c.get("Latency") for c in llm_calls]),
+        "NbSparqlCalls": len(sparql_calls),
+        "SparqlLatency": known_sum([c.get("Latency") for c in sparql_calls]),
+        "Cost": known_sum([call_cost(c) for c in llm_calls]),
+    }
+
+def mean(values: list):
+    values = [v for v in values if v is not None]
+    return sum(values) / len(values) if len(values) > 0 else None
+
+def calls_stats(calls_list: list[list[dict]]) -> dict:
+    """
+    Stats of the calls of all the questions of a run (empty if no call was recorded).
+    """
+    if not any(calls_list):
+        return {}
+    usages = [calls_usage(calls) for calls in calls_list]
+    system_calls = [c for calls in calls_list for c in calls if c.get("Source", SYSTEM) == SYSTEM]
+    llm_latencies = [c["Latency"] for c in system_calls if c.get("Type") == LLM and c.get("Latency") is not None]
+    llm_ttfts = [c["TimeToFirstToken"] for c in system_calls if c.get("Type") == LLM and c.get("TimeToFirstToken") is not None]
+    sparql_latencies = [c["Latency"] for c in system_calls if c.get("Type") == SPARQL and c.get("Latency") is not None]
+    evaluation_latencies = [c["Latency"] for calls in calls_list for c in calls
+                            if c.get("Source") == EVALUATION and c.get("Latency") is not None]
+    return {
+        "MeanNbLLMCalls": mean([u["NbLLMCalls"] for u in usages]),
+        "MeanPromptTokens": mean([u["PromptTokens"] for u in usages]),
+        "MeanCompletionTokens": mean([u["CompletionTokens"] for u in usages]),
+        "LLMLatencyP50": percentile(llm_latencies, 50),
+        "LLMLatencyP95": percentile(llm_latencies, 95),
+        "LLMTimeToFirstTokenP50": percentile(llm_ttfts, 50),
+        "LLMTimeToFirstTokenP95": percentile(llm_ttfts, 95),
+        "MeanNbSparqlCalls": mean([u["NbSparqlCalls"] for u in usages]),
+        "SparqlLatencyP50": percentile(sparql_latencies, 50),
+        "SparqlLatencyP95": percentile(sparql_latencies, 95),
+        "EvaluationSparqlLatencyP50": percentile(evaluation_latencies, 50),
+        "EvaluationSparqlLatencyP95": percentile(evaluation_latencies, 95),
+        "TotalCost": known_sum([u["Cost"] for u in usages]),
+        "MeanCost": mean([u["Cost"] for u in usages]),
+    }
@@ -24,9 +24,19 @@ logging.basicConfig(
 # time constraint for a single question (in seconds)
 SYSTEM_TIMEOUT = 5000
 
-# Number of queries executed between each save for a benchmark evaluation
+# Number of questions answered before their queries are evaluated and saved in the log of the run
 BATCH_SIZE = 1
 
+# Number of questions answered in parallel during a benchmark evaluation (each worker owns its own headless browser)
+# With 1, the questions are answered one after the other (batches are enlarged to contain at least one question per worker)
+NB_WORKERS = 1
+
+# Browsers are kept warm in a pool (one per worker) and reused between questions
+# Number of questions answered by a browser before it is replaced by a new one (None for no limit, 1 to use a new browser for each question)
+DRIVER_MAX_QUESTIONS = 50
+# Memory (in MB) used by a browser above which it is replaced by a new one (None for no limit, only checked if psutil is installed)
+DRIVER_MAX_MEMORY_MB = 3000
+
 # Location of the Sparklis file (local or remote)
 SPARKLIS_FILE = "http://localhost:8000/static/osparklis.html"
 
@@ -39,12 +49,76 @@ LLM_API_KEY = os.getenv('LLM_API_KEY') or None # If None, the API key will not b
 
 NL_POST_PROCESSING = False # If True, the answers will be post-processed into natural language
 
+# Prices of the LLM models (in dollars per million input tokens, per million output tokens), to estimate the cost of the runs
+# A model is priced with the longest name prefixing it (e.g. gpt-4o-mini-2024-07-18 with gpt-4o-mini), unknown models have no cost
+LLM_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+}
+
+# Local caching proxy for the LLM API (llm_proxy.py, served by api.py under /llm or run alone)
+# If True, the page sends its LLM requests to LLM_PROXY_URL, which forwards them to LLM_API_CHAT_COMPLETIONS
+LLM_PROXY = False
+LLM_PROXY_URL = 'http://localhost:8000/llm/v1/chat/completions'
+LLM_PROXY_CACHE_FILE = script_dir + '/Cache/llm_completions.sqlite'
+# If True, the requests with a temperature > 0 (or without temperature) are also cached (by default, only the requests with a temperature of 0 are cached)
+LLM_PROXY_FORCE_CACHE = False
+# Temperature of the LLM requests of the page (None for the default temperature of the page, 0.8).
+# Set it to 0 for deterministic requests, which can be cached by the proxy
+LLM_TEMPERATURE = None
+
+# Label and entity search service for Wikidata (wikidata_service.py, served by api.py under /wikidata or run alone)
+# If True, the page gets the labels of the results (in one call per result) and searches the entities through WIKIDATA_SERVICE_URL
+# instead of sending its requests to the Wikidata API
+WIKIDATA_SERVICE = False
+WIKIDATA_SERVICE_URL = 'http://localhost:8000/wikidata'
+WIKIDATA_API = 'https://www.wikidata.org/w/api.php'
+WIKIDATA_CACHE_FILE = script_dir + '/Cache/wikidata_labels.sqlite'
+# Time (in seconds) after which a cached label or search is fetched again (None for no expiration)
+WIKIDATA_CACHE_TTL = 30 * 24 * 3600
+# If set, the labels and searches are answered offline from this dump file (Wikidata JSON dump, possibly filtered), without the Wikidata API
+WIKIDATA_DUMP_FILE = None
+
+# API (api.py): number of browsers kept warm to answer requests concurrently
+API_NB_DRIVERS = 2
+# API: number of requests allowed to wait for a browser, above it the API answers 503 (Service Unavailable)
+API_MAX_WAITING_REQUESTS = 8
+# API: maximum time (in seconds) a request waits for a browser before being answered 503
+API_WAITING_TIMEOUT = 600
+# API: delay (in seconds) sent in the Retry-After header of 503 answers
+API_RETRY_AFTER = 30
+
 # User agent for the simulated browser (to avoid being blocked)
 USER_AGENT = 'ALASQA/0.2 ; baptiste.amice@irisa.fr'
 
+# If True, the type, datatype and language of the values are also compared to score the results (e.g. "1"^^xsd:integer != "1"^^xsd:decimal, "Paris"@en != "Paris"@fr)
+# If False, only the values are compared (behaviour used for the outputs of BestOutputs/)
+SCORING_STRICT_TERMS = False
+
 # Output folder
 OUTPUT_FOLDER = script_dir + '/Outputs/'
 
+# Each evaluated question is appended to a log (.jsonl) next to the output file, the output (.json) is written at the end of the run
+# If False, the log is removed once the output is written (it can be used to build the output after a crash with run_log.py)
+KEEP_RUN_LOGS = False
+# If True, an interrupted run (log without output file) with the same benchmark (and selected questions), system, tactic, endpoint and LLM is resumed
+# instead of starting a new run: the questions already in its log are skipped (only by the first of the NB_TESTS runs)
+RESUME_INTERRUPTED_RUNS = True
+
+# Cache of the results of the benchmark queries (gold results), shared between runs, strategies and LLMs
+GOLD_RESULTS_CACHE = True
+GOLD_RESULTS_CACHE_FILE = script_dir + '/Cache/gold_results.sqlite'
+# Time (in seconds) after which a cached gold result is fetched again (None for no expiration)
+GOLD_RESULTS_CACHE_TTL = 30 * 24 * 3600
+# If True, the cached gold results are ignored and replaced by fresh ones (e.g. after an update of the endpoint data)
+GOLD_RESULTS_CACHE_REFRESH = False
+
+# Catalog of the outputs of the runs (metadata, Stats and scores of the questions), see run_catalog.py
+RUN_CATALOG_FILE = script_dir + '/Cache/run_catalog.sqlite'
+
 ####### 
 
 # number of time to test the dataset and of output files to generate
@@ -68,8 +142,15 @@ LANGUAGE_SPARKLIS = 'en'
 # If True, the browser is hidden during the benchmark evaluation (less heavy, but less readable)
 HIDE_BROWSER_ON_BENCHMARK_EVALUATION = True
 
+# How the questions are asked to Sparklis during the benchmark evaluation (sparklisllm systems)
+# ui: through the inputs and dropdowns of the chatbot interface | direct: by running the strategy directly in the page (faster)
+SPARKLIS_RUNNER = 'ui'
+
 # Name of the tested system and its strategy
-TESTED_SYSTEM = 'sparklisllm-LLMFrameworkOneShot' # dummy | sparklisllm-[specific_strategy_name]
+TESTED_SYSTEM = 'sparklisllm-LLMFrameworkOneShot' # dummy | llm (query asked directly to the LLM API) | replay | sparklisllm-[specific_strategy_name]
+
+# Output file whose system queries are replayed by the replay system (matched by question text), e.g. to score them again on another endpoint
+REPLAY_OUTPUT_FILE = None
 
 # Logic used to choose among suggestions
 SUGGESTION_COMMANDS_TACTIC = 'best_at_individual_cmd' # best_at_individual_cmd | depth_first_search | beam_search
@@ -78,5 +159,45 @@ SUGGESTION_COMMANDS_TACTIC = 'best_at_individual_cmd' # best_at_individual_cmd |
 #SPARQL_ENDPOINT = 'https://dbpedia.org/sparql'
 SPARQL_ENDPOINT = 'https://query.wikidata.org/sparql'
 
+# Client used by the evaluation to execute SPARQL queries (not the queries of Sparklis)
+# session: pooled keep-alive connections, gzip responses and POST for long queries | sparqlwrapper: SPARQLWrapper, one connection per query
+SPARQL_CLIENT = 'session'
+# Queries longer than this number of characters are sent with POST (session client only)
+SPARQL_POST_THRESHOLD = 2000
+# Time (in seconds) after which a SPARQL query is considered failed (session client only)
+SPARQL_QUERY_TIMEOUT = 300
+# The results of the system queries are truncated after this number of rows or of bytes (None for no limit)
+SPARQL_MAX_RESULT_ROWS = 10000
+SPARQL_MAX_RESULT_BYTES = 10 * 1024 * 1024
+
+# Limits of the SPARQL queries executed by the evaluation on each endpoint (not the queries of Sparklis)
+# Number of queries executed at the same time on an endpoint
+SPARQL_MAX_CONCURRENT_QUERIES = 4
+# Number of queries per second sent to an endpoint (None for no limit)
+SPARQL_MAX_QUERIES_PER_SECOND = 5
+# Number of retries of a query after 429 Too Many Requests errors, and bounds (in seconds) of the exponential backoff used without Retry-After header
+# (SPARQL_BACKOFF_MAX also caps the delays asked by the Retry-After headers)
+SPARQL_MAX_RETRIES = 5
+SPARQL_BACKOFF_BASE = 2
+SPARQL_BACKOFF_MAX = 60
+
+# Local caching proxy for the SPARQL queries sent by Sparklis (sparql_proxy.py, served by api.py under /sparql or run alone)
+# SPARQL_PROXY_URL + target forwards the queries to the endpoint SPARQL_PROXY_TARGETS[target] (e.g. http://localhost:8000/sparql/wikidata)
+SPARQL_PROXY_TARGETS = {
+    'wikidata': 'https://query.wikidata.org/sparql',
+    'dbpedia': 'https://dbpedia.org/sparql',
+}
+SPARQL_PROXY_URL = 'http://localhost:8000/sparql/'
+SPARQL_PROXY_CACHE_FILE = script_dir + '/Cache/sparql_proxy.sqlite'
+# Time (in seconds) after which a cached response is fetched again (None for no expiration)
+SPARQL_PROXY_CACHE_TTL = 30 * 24 * 3600
+# Number of queries sent at the same time by the proxy to each endpoint
+SPARQL_PROXY_MAX_CONCURRENT_QUERIES = 4
+# If True, Sparklis sends its queries to the proxy of SPARQL_ENDPOINT (which must be in SPARQL_PROXY_TARGETS) instead of the endpoint itself
+# The queries of the evaluation are still sent to SPARQL_ENDPOINT
+SPARQL_PROXY = False
+SPARKLIS_ENDPOINT = (SPARQL_PROXY_URL + {endpoint: target for target, endpoint in SPARQL_PROXY_TARGETS.items()}[SPARQL_ENDPOINT]
+                     if SPARQL_PROXY else SPARQL_ENDPOINT)
+
 # We need to specify the endpoint in the url and not just set it later, else the proxy of the default config will be loaded and sometimes cause issues
-SPARKLIS_LINK = SPARKLIS_FILE + "?title=custom&endpoint=" + SPARQL_ENDPOINT
\ No newline at end of file
+SPARKLIS_LINK = SPARKLIS_FILE + "?title=custom&endpoint=" + SPARKLIS_ENDPOINT
\ No newline at end of file
@@ -0,0 +1,179 @@
+"""
+Pool of warm browsers (Selenium WebDrivers) used to answer questions without starting a new browser each time.
+
+A driver is borrowed from the pool for a question and given back afterwards.
+Between two questions the page state is reset instead of restarting the browser,
+and a browser is replaced by a new one after a given number of questions or when it uses too much memory.
+The health of a browser is checked before it is handed out.
+If a browser can't be started, its slot stays empty in the pool and a new browser is started when the slot is borrowed.
+"""
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+import interactions
+
+try:
+    import psutil # optional, only used to check the memory used by the browsers
+except ImportError:
+    psutil = None
+
+class DriverPool:
+    """
+    Fixed size pool of browsers, safe to share between threads.
+    """
+    def __init__(self, size: int, is_headless: bool = True, max_questions: int = None, max_memory_mb: int = None,
+                 driver_factory=None):
+        """
+        size: number of browsers kept warm in the pool
+        max_questions: number of questions answered by a browser before it is replaced (None for no limit)
+        max_memory_mb: memory used by a browser (and its child processes) above which it is replaced (None for no limit, needs psutil)
+        driver_factory: function creating a new driver (by default a Firefox driver from interactions.get_new_driver)
+        """
+        self.size = size
+        self.max_questions = max_questions
+        self.max_memory_mb = max_memory_mb
+        self.driver_factory = driver_factory or (lambda: interactions.get_new_driver(is_headless=is_headless))
+        if max_memory_mb is not None and psutil is None:
+            logging.warning("psutil is not installed, the memory used by the browsers of the pool will not be checked.")
+
+        self._lock = threading.Lock()
+        self._idle_drivers = queue.Queue() # idle drivers, or None for the slots without driver
+        self._uses = {} # number of questions answered by each driver (by id of the driver)
+        self._closed = False
+        started_drivers = []
+        try:
+            for _ in range(size):
+                started_drivers.append(self._new_driver())
+        except Exception:
+            # The pool is not created, the browsers already started are closed
+            for driver in started_drivers:
+                self._discard_driver(driver)
+            raise
+        for driver in started_drivers:
+            self._idle_drivers.put(driver)
+        logging.info(f"Driver pool started with {size} browser(s).")
+
+    def _new_driver(self):
+        driver = self.driver_factory()
+        with self._lock:
+            self._uses[id(driver)] = 0
+        return driver
+
+    def _discard_driver(self, driver):
+        with self._lock:
+            self._uses.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception as e:
+            logging.warning(f"Error while closing a browser of the pool: {e}")
+
+    def _replace_driver(self, driver):
+        """
+        Replace a driver by a new one, or by None (an empty slot) if the new driver can't be started.
+        """
+        if driver is not None:
+            self._discard_driver(driver)
+        try:
+            return self._new_driver()
+        except Exception as e:
+            logging.error(f"Failed to start a browser for the pool, it will be started again when needed: {e}")
+            return None
+
+    def acquire(self, timeout: float = None):
+        """
+        Borrow a healthy driver from the pool.
+        Wait until a driver is available, raise TimeoutError if none is available before the timeout (in seconds).
+        """
+        try:
+            driver = self._idle_drivers.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError("No browser available in the pool.")
+        if driver is not None and not is_healthy(driver):
+            logging.warning("Unhealthy browser found in the pool, it is replaced by a new one.")
+            driver = self._replace_driver(driver)
+        elif driver is None:
+            driver = self._replace_driver(None)
+        if driver is None:
+            self._idle_drivers.put(None) # the slot is kept for a next try
+            raise RuntimeError("Failed to start a browser for the pool.")
+        return driver
+
+    def release(self, driver):
+        """
+        Give back a driver to the pool after a question.
+        The driver is recycled if it answered too many questions or uses too much memory, else its page state is reset.
+        """
+        if self._closed:
+            self._discard_driver(driver)
+            return
+        with self._lock:
+            self._uses[id(driver)] = self._uses.get(id(driver), 0) + 1
+            uses = self._uses[id(driver)]
+
+        if self.max_questions is not None and uses >= self.max_questions:
+            logging.info(f"Browser recycled after {uses} question(s).")
+            driver = self._replace_driver(driver)
+        elif self.max_memory_mb is not None and driver_memory_mb(driver) > self.max_memory_mb:
+            logging.info(f"Browser recycled because it uses more than {self.max_memory_mb} MB.")
+            driver = self._replace_driver(driver)
+        else:
+            interactions.reset_page_state(driver)
+        self._idle_drivers.put(driver)
+
+    @contextmanager
+    def driver(self, timeout: float = None):
+        """
+        Context manager to borrow a driver and automatically give it back.
+        """
+        driver = self.acquire(timeout)
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+
+    def close(self):
+        """
+        Close all the idle browsers of the pool (the borrowed ones are closed when given back).
+        """
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle_drivers.get_nowait()
+            except queue.Empty:
+                break
+            if driver is not None:
+                self._discard_driver(driver)
+        logging.info("Driver pool closed.")
+
+
+def is_healthy(driver) -> bool:
+    """
+    Check that the browser still answers and has an open window.
+    """
+    try:
+        if len(driver.window_handles) == 0:
+            return False
+        driver.execute_script("return document.readyState;")
+        return True
+    except Exception as e:
+        logging.warning(f"Browser health check failed: {e}")
+        return False
+
+def driver_memory_mb(driver) -> float:
+    """
+    Memory used by the browser process and its children (in MB).
+    Return 0 if it can't be measured (psutil not installed or unknown process id).
+    """
+    if psutil is None:
+        return 0
+    try:
+        pid = driver.capabilities.get("moz:processID")
+        if pid is None:
+            return 0
+        process = psutil.Process(pid)
+        rss = process.memory_info().rss + sum(child.memory_info().rss for child in process.children(recursive=True))
+        return rss / (1024 * 1024)
+    except Exception as e:
+        logging.warning(f"Failed to measure the memory of a browser: {e}")
+        return 0
@@ -0,0 +1,355 @@
+"""
+Benchmark suite of the evaluation harness itself (system_evaluation.py), independently of the LLM and of the remote endpoint.
+The harness is run end-to-end against a local SPARQL endpoint with canned answers (MockSparqlEndpoint)
+and a stub OpenAI-compatible LLM server with a configurable latency (StubLLMServer).
+
+Each scenario of SCENARIOS runs system_evaluation.main in a fresh process, and reports its number of questions per minute,
+the time spent in each stage of the run (see system_evaluation.stage_times) and its peak memory (RSS).
+Micro benchmarks time the scoring, the parsing of the SPARQL results and the building of the output.
+
+The results can be saved as a JSON baseline, and compared to a previous baseline to catch regressions of the harness:
+python harness_benchmark.py --save HarnessBaselines/baseline.json
+python harness_benchmark.py --compare HarnessBaselines/baseline.json (exit code 1 if the harness regressed)
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+STUB_MODEL = "stub-llm"
+
+# Questions used to build the benchmark of the scenarios (cycled if more questions are needed)
+QUESTIONS_FILE = os.path.dirname(os.path.abspath(__file__)) + '/Inputs/qald_10_patched.json'
+
+# Scenarios run end-to-end: tested system, number of questions, latencies (in seconds) of the stubs and config.py overrides
+SCENARIOS = {
+    'dummy-sequential': {'system': 'dummy', 'questions': 200},
+    'dummy-parallel': {'system': 'dummy', 'questions': 200, 'config': {'NB_WORKERS': 4, 'BATCH_SIZE': 8}},
+    'llm-sequential': {'system': 'llm', 'questions': 50, 'llm_latency': 0.05},
+    'llm-parallel': {'system': 'llm', 'questions': 200, 'llm_latency': 0.05, 'config': {'NB_WORKERS': 8, 'BATCH_SIZE': 16}},
+    'slow-endpoint': {'system': 'dummy', 'questions': 50, 'sparql_latency': 0.05, 'config': {'BATCH_SIZE': 10}},
+}
+
+# config.py overrides of all the scenarios: outputs in a temporary folder, no cache and no throttling of the local endpoint
+COMMON_CONFIG = {
+    'GOLD_RESULTS_CACHE': False,
+    'RESUME_INTERRUPTED_RUNS': False,
+    'KEEP_RUN_LOGS': False,
+    'LLM_PROXY': False,
+    'LLM_API_KEY': None,
+    'LLM_API_MODEL_NAME': STUB_MODEL,
+    'SPARQL_MAX_QUERIES_PER_SECOND': None,
+}
+
+# Stage times below this duration (in seconds) are too noisy to be compared to the baseline
+MIN_COMPARED_TIME = 0.05
+
+#####################################
+
+def canned_results(query: str) -> dict:
+    """
+    Deterministic SPARQL results of a query (a boolean for ASK queries, else between 0 and 20 bindings).
+    """
+    seed = int(hashlib.sha1(query.encode()).hexdigest(), 16)
+    if query.lstrip().upper().startswith("ASK") or ("ASK" in query.upper() and "SELECT" not in query.upper()):
+        return {"head": {}, "boolean": bool(seed % 2)}
+    bindings = [{"x": {"type": "uri", "value": f"http://www.wikidata.org/entity/Q{(seed >> i) % 50}"},
+                 "label": {"type": "literal", "xml:lang": "en", "value": f"label {(seed >> i) % 50}"}}
+                for i in range(seed % 21)]
+    return {"head": {"vars": ["x", "label"]}, "results": {"bindings": bindings}}
+
+def stub_completion(messages: list) -> str:
+    """
+    Deterministic answer of the stub LLM: a SPARQL query depending on the prompt.
+    """
+    seed = int(hashlib.sha1(json.dumps(messages).encode()).hexdigest(), 16)
+    return f"```sparql\nSELECT ?x ?label WHERE {{ ?x <http://example.com/p{seed % 10}> ?label }} LIMIT {seed % 7}\n```"
+
+class LocalServer:
+    """
+    HTTP server running in a background thread on a free local port.
+    """
+    handler_class = None
+
+    def __init__(self, latency: float = 0):
+        self.latency = latency
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler_class)
+        self.server.daemon_threads = True
+        self.server.latency = latency
+        self.url = f"http://localhost:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+class QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive connections, as the real endpoints
+    disable_nagle_algorithm = True # else the body, sent after the headers, waits for the delayed ACK of the client
+
+    def send_json(self, data: dict, status: int = 200, content_type: str = "application/json"):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self) -> str:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+
+    def log_message(self, *args):
+        pass
+
+class SparqlHandler(QuietHandler):
+    def do_GET(self):
+        self.answer(parse_qs(urlparse(self.path).query).get("query", [""])[0])
+
+    def do_POST(self):
+        body = self.read_body()
+        if "application/x-www-form-urlencoded" in self.headers.get("Content-Type", ""):
+            body = parse_qs(body).get("query", [""])[0]
+        self.answer(body)
+
+    def answer(self, query: str):
+        time.sleep(self.server.latency)
+        self.send_json(canned_results(query), content_type="application/sparql-results+json")
+
+class MockSparqlEndpoint(LocalServer):
+    """
+    Local SPARQL endpoint answering canned results (see canned_results), after a fixed latency.
+    """
+    handler_class = SparqlHandler
+
+    @property
+    def endpoint(self) -> str:
+        return self.url + "/sparql"
+
+class LLMHandler(QuietHandler):
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self.send_json({"object": "list", "data": [{"id": STUB_MODEL, "object": "model"}]})
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        request = json.loads(self.read_body() or "{}")
+        messages = request.get("messages", [])
+        content = stub_completion(messages)
+        usage = {"prompt_tokens": sum(len(str(m.get("content", "")).split()) for m in messages),
+                 "completion_tokens": len(content.split())}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        time.sleep(self.server.latency)
+        if not request.get("stream"):
+            self.send_json({"id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": STUB_MODEL,
+                            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                            "usage": usage})
+            return
+        # Server-sent events, as used by sendPrompt in llm_utils.js
+        chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": STUB_MODEL}
+        events = [{**chunk, "choices": [{"index": 0, "delta": {"role": "assistant", "content": content}, "finish_reason": None}]},
+                  {**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}]
+        if (request.get("stream_options") or {}).get("include_usage"):
+            events.append({**chunk, "choices": [], "usage": usage})
+        body = "".join("data: " + json.dumps(event) + "\n\n" for event in events) + "data: [DONE]\n\n"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(body.encode())))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+class StubLLMServer(LocalServer):
+    """
+    Local OpenAI-compatible LLM API (models and chat/completions), answering a canned query after a fixed latency.
+    """
+    handler_class = LLMHandler
+
+    @property
+    def api(self) -> str:
+        return self.url + "/v1/"
+
+#####################################
+
+def make_benchmark_file(file_name: str, nb_questions: int):
+    """
+    Write a QALD-10 benchmark of nb_questions questions, cycling the questions of QUESTIONS_FILE.
+    """
+    with open(QUESTIONS_FILE) as file:
+        source = json.load(file)["questions"]
+    questions = []
+    for i in range(nb_questions):
+        question = dict(source[i % len(source)])
+        question["id"] = str(i)
+        questions.append(question)
+    with open(file_name, "w") as file:
+        json.dump({"questions": questions}, file)
+
+def peak_rss_mb() -> float:
+    """
+    Peak memory (RSS, in MB) of the current process, or None if unknown.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024 # bytes on macOS, kB on Linux
+
+def run_scenario(scenario: dict, sparql_endpoint: str, llm_api: str, work_dir: str) -> dict:
+    """
+    Run a scenario end-to-end (in a fresh process, to measure its own peak memory).
+    """
+    import config
+    import benchmark_extraction
+    for key, value in {**COMMON_CONFIG, **scenario.get('config', {})}.items():
+        setattr(config, key, value)
+    config.OUTPUT_FOLDER = work_dir + '/'
+    config.LLM_API_MODELS = llm_api + 'models'
+    config.LLM_API_CHAT_COMPLETIONS = llm_api + 'chat/completions'
+    import system_evaluation
+
+    benchmark_file = os.path.join(work_dir, 'questions.json')
+    make_benchmark_file(benchmark_file, scenario['questions'])
+    used_llm = system_evaluation.getModelName(config.LLM_API_MODELS, config.LLM_API_MODEL_NAME)
+
+    start = time.perf_counter()
+    system_evaluation.main(benchmark_file, benchmark_extraction.QALD10, scenario['system'],
+                           config.SUGGESTION_COMMANDS_TACTIC, sparql_endpoint, used_llm)
+    elapsed = time.perf_counter() - start
+
+    outputs = [name for name in os.listdir(work_dir) if name.startswith(benchmark_extraction.QALD10) and name.endswith('.json')]
+    with open(os.path.join(work_dir, outputs[0])) as file:
+        nb_questions = len(json.load(file)['Data'])
+    return {
+        'Questions': nb_questions,
+        'Time': elapsed,
+        'QuestionsPerMinute': nb_questions / elapsed * 60,
+        'StageTimes': dict(system_evaluation.stage_times),
+        'PeakRSSMB': peak_rss_mb(),
+    }
+
+def run_scenarios(names: list[str]) -> dict:
+    """
+    Run the scenarios, each one in a new process with its own stub servers.
+    """
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for name in names:
+        scenario = SCENARIOS[name]
+        with MockSparqlEndpoint(scenario.get('sparql_latency', 0)) as endpoint, \
+             StubLLMServer(scenario.get('llm_latency', 0)) as llm, \
+             tempfile.TemporaryDirectory() as work_dir, \
+             context.Pool(1) as pool:
+            results[name] = pool.apply(run_scenario, (scenario, endpoint.endpoint, llm.api, work_dir))
+        print(f"{name}: {results[name]['QuestionsPerMinute']:.1f} questions/min, peak RSS {results[name]['PeakRSSMB']} MB")
+    return results
+
+#####################################
+
+def best_time(function, repeat: int = 5) -> float:
+    """
+    Best time (in seconds) of several executions of a function.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def run_micro_benchmarks() -> dict:
+    """
+    Time the parts of the harness that don't depend on the endpoint or the LLM.
+    """
+    import system_evaluation
+    from sparql_client import parse_results
+
+    results_list = [canned_results(f"SELECT * WHERE {{ ?x ?p {i} }}")["results"]["bindings"] * 50 for i in range(200)]
+    large_results = json.dumps({"head": {"vars": ["x", "label"]},
+                                "results": {"bindings": [b for bindings in results_list for b in bindings][:100000]}}).encode()
+    chunks = [large_results[i:i + 64 * 1024] for i in range(0, len(large_results), 64 * 1024)]
+    records = system_evaluation.make_records(
+        [str(i) for i in range(1000)], ["question"] * 1000, [[]] * 1000,
+        ["SELECT ?x WHERE { ?x ?p ?o }"] * 1000, ["SELECT ?x WHERE { ?x ?p ?o }"] * 1000, [""] * 1000,
+        [results_list[i % 200] for i in range(1000)], [results_list[(i + 1) % 200] for i in range(1000)],
+        [1.0] * 1000, ["uri"] * 1000, [""] * 1000, [""] * 1000, [""] * 1000,
+        [0.5] * 1000, [0.5] * 1000, [0.5] * 1000)
+    return {
+        'StatsCalculation': best_time(lambda: system_evaluation.stats_calculation(results_list, results_list[::-1])),
+        'ParseResults': best_time(lambda: parse_results(iter(chunks), None, None)),
+        'MakeDictFromRecords': best_time(lambda: system_evaluation.make_dict_from_records({}, records)),
+    }
+
+#####################################
+
+def compare_results(baseline: dict, results: dict, tolerance: float) -> list[str]:
+    """
+    Regressions of the results relative to the baseline (slower or heavier by more than the tolerance, e.g. 0.25 for 25%).
+    """
+    regressions = []
+    def check(name: str, old, new, higher_is_better: bool = False, min_value: float = 0):
+        if old is None or new is None or old < min_value:
+            return
+        if (new < old * (1 - tolerance)) if higher_is_better else (new > old * (1 + tolerance)):
+            regressions.append(f"{name}: {old:.3f} -> {new:.3f}")
+
+    for name, old in baseline.get('Scenarios', {}).items():
+        new = results.get('Scenarios', {}).get(name)
+        if new is None:
+            continue
+        check(f"{name} questions/min", old['QuestionsPerMinute'], new['QuestionsPerMinute'], higher_is_better=True)
+        check(f"{name} peak RSS (MB)", old.get('PeakRSSMB'), new.get('PeakRSSMB'))
+        for stage, old_time in old.get('StageTimes', {}).items():
+            check(f"{name} {stage} time (s)", old_time, new.get('StageTimes', {}).get(stage), min_value=MIN_COMPARED_TIME)
+    for name, old_time in baseline.get('Micro', {}).items():
+        check(f"{name} time (s)", old_time, results.get('Micro', {}).get(name))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the evaluation harness with a mocked endpoint and a stub LLM.")
+    parser.add_argument("--scenarios", nargs="*", default=list(SCENARIOS), choices=list(SCENARIOS),
+                        help="Scenarios to run (all by default).")
+    parser.add_argument("--no-micro", action="store_true", help="Don't run the micro benchmarks.")
+    parser.add_argument("--save", help="Save the results as a JSON baseline in this file.")
+    parser.add_argument("--compare", help="Compare the results to this JSON baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Tolerated slowdown relative to the baseline (0.25 for 25%%).")
+    args = parser.parse_args()
+
+    results = {
+        'Meta': {'Date': datetime.datetime.now().isoformat(timespec='seconds'),
+                 'Python': platform.python_version(), 'Platform': platform.platform(), 'CPUs': os.cpu_count()},
+        'Scenarios': run_scenarios(args.scenarios),
+        'Micro': {} if args.no_micro else run_micro_benchmarks(),
+    }
+    print(json.dumps(results, indent=4))
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or '.', exist_ok=True)
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=4)
+        print(f"Baseline saved in {args.save}")
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare_results(json.load(file), results, args.tolerance)
+        for regression in regressions:
+            print("Regression: " + regression)
+        if len(regressions) > 0:
+            sys.exit(1)
+        print("No regression.")
@@ -11,6 +11,8 @@ from selenium.webdriver.firefox.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.common.exceptions import UnexpectedAlertPresentException, TimeoutException
 from selenium.webdriver.support.ui import Select
+import functools
+import json
 import logging
 import config
 
@@ -23,7 +25,7 @@ def get_new_driver(is_headless:bool=False) -> webdriver.Firefox:
     driver = webdriver.Firefox(options=options)
     return driver
 
-def simulated_user(url: str, interactions, driver: webdriver.Firefox = None) -> tuple[str, str, str, str, webdriver.Firefox]:
+def simulated_user(url: str, interactions, driver: webdriver.Firefox = None) -> tuple:
     """
     Simulate a given user interaction with a web page.
     If driver is None, a new driver is created.
@@ -34,9 +36,87 @@ def simulated_user(url: str, interactions, driver: webdriver.Firefox = None) ->
     # Create a new driver if none is provided
     if driver is None:
         driver = get_new_driver(is_headless=config.HIDE_BROWSER_ON_BENCHMARK_EVALUATION)
-    driver.get(url)
-    result, nl_query, error, steps_status, reasoning = interactions(driver)
-    return result, nl_query, error, steps_status, reasoning, driver
+    load_page(driver, url)
+    answer = interactions(driver)
+    return (*answer, driver)
+
+# True if the page was loaded from the given url and is not processing a question
+WARM_PAGE_SCRIPT = """
+const input = document.getElementById("user-input");
+return window.alasqa_loaded_url === arguments[0] && input !== null && !input.disabled;
+"""
+
+def load_page(driver, url: str):
+    """
+    Load the page of the url, unless the driver already shows it and is ready for a new question (warm page).
+    The state left by the previous question on a warm page is cleared by reset_page_state.
+    """
+    try:
+        is_warm = driver.execute_script(WARM_PAGE_SCRIPT, url)
+    except Exception:
+        is_warm = False
+    if not is_warm:
+        driver.get(url)
+        driver.execute_script("window.alasqa_loaded_url = arguments[0];", url)
+
+def sparklis_url(endpoint_sparql: str) -> str:
+    """
+    Full url of Sparklis (SPARKLIS_LINK) with the parameters specific to the endpoint and the language.
+    """
+    return _sparklis_url(config.SPARKLIS_LINK, endpoint_sparql, config.LANGUAGE_SPARKLIS)
+
+@functools.lru_cache(maxsize=None)
+def _sparklis_url(sparklis_link: str, endpoint_sparql: str, language: str) -> str:
+    url_extension = ''
+    no_caching = True
+    no_logging = True
+    if no_caching:
+        # Caching SPARQL query results (uncheck for frequently changing data)
+        url_extension += '&caching=false'
+    if no_logging:
+        # Reporting query history for usability improvement (only client IP, session ID, and queries are reported, not query results)
+        url_extension += '&logging=false'
+    if "wikidata" in endpoint_sparql:
+        url_extension += '&wikidata_mode=true&entity_lexicon_select=http%3A//www.w3.org/2000/01/rdf-schema%23label&entity_lexicon_lang='+language+'&concept_lexicons_select=http%3A//www.w3.org/2000/01/rdf-schema%23label&concept_lexicons_lang='+language+'&auto-filtering=false'
+    return sparklis_link + url_extension
+
+def reset_page_state(driver):
+    """
+    Reset the state left by a question on the page, to reuse the same browser for the next question.
+    Clear the steps status, alert messages and recorded calls of the local storage, and the history of the chatbot.
+    """
+    try:
+        driver.execute_script("""
+        localStorage.removeItem('steps_status');
+        localStorage.setItem('alertMessages', '[]');
+        if (typeof clearCalls === 'function') {
+            clearCalls();
+        } else {
+            localStorage.setItem('calls', '[]');
+        }
+        if (typeof clearQuestionData === 'function') {
+            clearQuestionData();
+        } else {
+            sessionStorage.removeItem('questionsData');
+        }
+        """)
+    except Exception as e:
+        logging.warning(f"Error while resetting the page state: {e}")
+
+def dismiss_alert(driver) -> str:
+    """
+    Dismiss the alert of the page and return the corresponding error text.
+    """
+    try:
+        alert = driver.switch_to.alert
+        alert_text = alert.text
+        alert.accept()
+        new_error_text = f"Unhandled alert detected and dismissed: {alert_text}"
+    except Exception as e:
+        # For exemple useful with wikidata endpoint alerts, that disapear before the alert is read
+        new_error_text = "An alert was dismissed before it could be read + " + str(e)
+    logging.warning(new_error_text)
+    return new_error_text
 
 def wait_and_handle_alert(driver, timeout: int, end_condition) -> str:
     """
@@ -54,18 +134,7 @@ def wait_and_handle_alert(driver, timeout: int, end_condition) -> str:
         )
     except UnexpectedAlertPresentException: 
         # Dismiss the alert and log it to continue waiting
-        try:
-            alert = driver.switch_to.alert
-            alert_text = alert.text
-            alert.accept()
-            new_error_text = f"Unhandled alert detected and dismissed: {alert_text}"
-            logging.warning(new_error_text)
-            errorText += new_error_text
-        except Exception as e:
-            # For exemple useful with wikidata endpoint alerts, that disapear before the alert is read
-            new_error_text = "An alert was dismissed before it could be read + " + str(e)
-            logging.warning(new_error_text)
-            errorText += new_error_text
+        errorText += dismiss_alert(driver)
         # Retry waiting after dismissing the alert (generally the condition is met after the alert)
         errorText += wait_and_handle_alert(driver, timeout, end_condition)  # Retry waiting after dismissing the alert
     except TimeoutException:
@@ -78,6 +147,45 @@ def wait_and_handle_alert(driver, timeout: int, end_condition) -> str:
         errorText += new_error_text 
     return errorText
 
+# Resolved by the page when the question started by start_qa_control is answered
+QA_END_SCRIPT = """
+const done = arguments[arguments.length - 1];
+if (!window.qa_control_run) {
+    done("no_run");
+    return;
+}
+window.qa_control_run.then(() => done("done"), (e) => done("failed: " + e));
+"""
+
+def wait_for_qa_end(driver, timeout: int, fallback_condition) -> str:
+    """
+    Wait for the end of the question answering, signaled by the page when qa_control ends (no polling).
+    If the page did not expose the run of qa_control, wait until the fallback condition is met instead.
+    Unexpected alerts are dismissed as in wait_and_handle_alert.
+    """
+    errorText : str = ""
+    try:
+        driver.set_script_timeout(timeout)
+        status = driver.execute_async_script(QA_END_SCRIPT)
+    except UnexpectedAlertPresentException:
+        errorText += dismiss_alert(driver)
+        # The run is still awaited after dismissing the alert
+        return errorText + wait_for_qa_end(driver, timeout, fallback_condition)
+    except TimeoutException:
+        new_error_text = "Timeout while waiting for system response."
+        logging.error(new_error_text)
+        return errorText + new_error_text
+    except Exception as e:
+        logging.warning(f"Can't await the end of the question answering, polling instead: {e}")
+        status = "no_run"
+    if status == "no_run":
+        errorText += wait_and_handle_alert(driver, timeout, fallback_condition)
+    elif status != "done":
+        new_error_text = f"Error while waiting for system response: {status}"
+        logging.error(new_error_text)
+        errorText += new_error_text
+    return errorText
+
 def getStepsStatus(driver):
     """
     Get the current status of the steps.
@@ -89,47 +197,84 @@ def getStepsStatus(driver):
         logging.error(f"Error while getting the steps status: {e}")
         return "Failed to get steps status"
 
-def sparklisllm_question(driver, question, endpoint_sparql, system_name, suggestion_commands_tactic) -> tuple[str, str, str, str]:
+def harvest_results(driver) -> dict:
     """
-    Interaction with the SparklisLLM system to ask a question
+    Get the results of the last question of the chatbot in one call:
+    reasoning, answer, sparql_request, sparklis_request, errors, alert_messages, steps_status and calls.
+    """
+    return driver.execute_script("return harvestLastQuestion();")
+
+def harvest_calls(harvest: dict) -> list[dict]:
+    """
+    LLM and SPARQL calls recorded by the page while answering the question (see call_accounting.py).
+    """
+    try:
+        return json.loads(harvest.get("calls") or "[]")
+    except json.JSONDecodeError as e:
+        logging.warning(f"Error while reading the recorded calls: {e}")
+        return []
+
+def harvest_errors(harvest: dict) -> str:
+    """
+    Errors and warnings corresponding to the harvested results of a question.
     """
-    # The errors will be concatenated in this variable
     error = ""
-    language = config.LANGUAGE_SPARKLIS
-    
-    url_extension = ''
-    no_caching = True
-    no_logging = True
-    if no_caching:
-        # Caching SPARQL query results (uncheck for frequently changing data)
-        url_extension += '&caching=false'
-    if no_logging:
-        # Reporting query history for usability improvement (only client IP, session ID, and queries are reported, not query results)
-        url_extension += '&logging=false'
-    if "wikidata" in endpoint_sparql:
-        url_extension += '&wikidata_mode=true&entity_lexicon_select=http%3A//www.w3.org/2000/01/rdf-schema%23label&entity_lexicon_lang='+language+'&concept_lexicons_select=http%3A//www.w3.org/2000/01/rdf-schema%23label&concept_lexicons_lang='+language+'&auto-filtering=false'
-    if url_extension != '':
-        driver.get(driver.current_url + url_extension)
+    # If a field is empty, add a warning
+    if harvest["reasoning"] == "":
+        error += "Warning: Empty reasoning from the system;"
+    if harvest["answer"] == "":
+        error += "Warning: Empty answer from the system;"
+    if harvest["sparql_request"] == "":
+        error += "Warning: Empty SPARQL request from the system;"
+    if harvest["sparklis_request"] == "":
+        error += "Warning: Empty Sparklis request from the system;"
+    # Retrieve the error messages from the system
+    if harvest["errors"] != "":
+        error += "Errors from the system [" + harvest["errors"] + "]"
+    # Retrieve the alert messages stored in the local storage
+    alert_messages = harvest["alert_messages"]
+    if alert_messages != "" and alert_messages != "[]":
+        error += "Alert messages from the system [" + str(alert_messages) + "]"
+    return error
 
-    # Override ALASQAConfig if needed
+def override_alasqa_config(driver, llm_model_name: str = None):
+    """
+    Override the ALASQAConfig of the page with the LLM (model, temperature) and Wikidata service settings of config.py.
+    The model is llm_model_name if given, else LLM_API_MODEL_NAME.
+    """
+    llm_model_name = llm_model_name or config.LLM_API_MODEL_NAME
     override_alasqa_config_script = f"""
     // Assuming getALASQAConfig and setALASQAConfig are already defined on the page
     var temp_config = getALASQAConfig();
-    temp_config.api_url = "{config.LLM_API_CHAT_COMPLETIONS}";
+    temp_config.api_url = "{config.LLM_PROXY_URL if config.LLM_PROXY else config.LLM_API_CHAT_COMPLETIONS}";
     {f'temp_config.api_key = "{config.LLM_API_KEY}";' if config.LLM_API_KEY is not None else ''}
-    {f'temp_config.model = "{config.LLM_API_MODEL_NAME}";' if config.LLM_API_MODEL_NAME is not None else ''}
+    {f'temp_config.model = "{llm_model_name}";' if llm_model_name is not None else ''}
     temp_config.nl_post_processing = "{config.NL_POST_PROCESSING}";
+    {f'temp_config.temperature = {config.LLM_TEMPERATURE};' if config.LLM_TEMPERATURE is not None else ''}
+    temp_config.wikidata_service_url = {f'"{config.WIKIDATA_SERVICE_URL}"' if config.WIKIDATA_SERVICE else 'undefined'};
     setALASQAConfig(temp_config);
     console.log("Updated ALASQAConfig");
     """
     driver.execute_script(override_alasqa_config_script)
 
-    #deploy llm menu
-    llm_menu_button = driver.find_element(by=By.ID, value="chatbot-menu-button")
-    llm_menu_button.click()
+def sparklisllm_question(driver, question, system_name, suggestion_commands_tactic, llm_model_name: str = None) -> tuple[str, str, str, str, str, list]:
+    """
+    Interaction with the SparklisLLM system to ask a question.
+    The page must be loaded from the url given by sparklis_url.
+    """
+    # The errors will be concatenated in this variable
+    error = ""
 
-    # clear all previous messages 
+    # Override ALASQAConfig if needed
+    override_alasqa_config(driver, llm_model_name)
+
+    #deploy llm menu (already deployed on a warm page)
     clear_button = driver.find_element(by=By.ID, value="chatbot-clear-button")
+    if not clear_button.is_displayed():
+        llm_menu_button = driver.find_element(by=By.ID, value="chatbot-menu-button")
+        llm_menu_button.click()
+
+    # clear all previous messages 
     clear_button.click()
 
     #select the strategy
@@ -162,59 +307,68 @@ def sparklisllm_question(driver, question, endpoint_sparql, system_name, suggest
     text_box = driver.find_element(by=By.ID, value="user-input")
     text_box.send_keys(question)
   
+    # Forget the run of the previous question, so that only the run of this question is awaited
+    driver.execute_script("window.qa_control_run = null;")
     # Submit the question
     input_send_button = driver.find_element(by=By.ID, value="input-send-button")
     input_send_button.click()
 
-    #while the inputs are disabled, we can consider the system is still processing the question
+    # Wait for the page to signal the end of the process
+    # (or, with an older page, wait while the inputs are disabled, as the system is still processing the question)
     logging.info("Waiting for system response...")
-    error += wait_and_handle_alert(driver, config.SYSTEM_TIMEOUT, 
-                                  lambda d: not text_box.get_attribute("disabled"))
+    error += wait_for_qa_end(driver, config.SYSTEM_TIMEOUT, 
+                             lambda d: not text_box.get_attribute("disabled"))
     logging.info("System response received.")
     
-    # Locate the chatbot-responses-container and find the last chatbot-qa div
-    chatbot_qa_elements = driver.find_elements(By.CSS_SELECTOR, "#chatbot-responses-container .chatbot-qa")
+    # Get all the results of the question in one call
+    harvest = harvest_results(driver)
+    error += harvest_errors(harvest)
 
-    # Get the last chatbot-qa div
-    last_chatbot_qa = chatbot_qa_elements[-1]
+    return harvest["sparql_request"], harvest["sparklis_request"], error, harvest["steps_status"], harvest["reasoning"], harvest_calls(harvest)
 
-    # Find the chatbot-reasoning inside the last chatbot-qa div
-    chatbot_reasoning = last_chatbot_qa.find_element(By.CLASS_NAME, "chatbot-reasoning")
-    # If the reasoning is empty, add a warning
-    if chatbot_reasoning.text == "":
-        error += "Warning: Empty reasoning from the system;"
-
-    # Find the chatbot-answer inside the last chatbot-qa div
-    chatbot_answer = last_chatbot_qa.find_element(By.CLASS_NAME, "chatbot-answer")
-    # If the answer is empty, add a warning
-    if chatbot_answer.text == "":
-        error += "Warning: Empty answer from the system;"
-
-    # Find the sparql-request inside the last chatbot-qa div
-    sparql_request = last_chatbot_qa.find_element(By.CLASS_NAME, "sparql-request")
-    # If the sparql-request is empty, add a warning
-    if sparql_request.text == "":
-        error += "Warning: Empty SPARQL request from the system;"
+# Run a strategy directly and resolve with the results of the question (the run is kept to be awaited after an alert)
+RUN_STRATEGY_SCRIPT = """
+const done = arguments[arguments.length - 1];
+window.qa_control_run = run_strategy(arguments[0], arguments[1], arguments[2]);
+window.qa_control_run.then((harvest) => done(harvest), (e) => done("failed: " + e));
+"""
 
-    # Find the sparklis-request inside the last chatbot-qa div
-    sparklis_request = last_chatbot_qa.find_element(By.CLASS_NAME, "sparklis-request")
-    # If the sparql-request is empty, add a warning
-    if sparklis_request.text == "":
-        error += "Warning: Empty Sparklis request from the system;"
+def sparklisllm_direct_question(driver, question, system_name, suggestion_commands_tactic, llm_model_name: str = None) -> tuple[str, str, str, str, str, list]:
+    """
+    Ask a question to the SparklisLLM system by running the strategy directly (run_strategy in the page),
+    without using the inputs of the interface. The results are returned by the same call.
+    The page must be loaded from the url given by sparklis_url.
+    """
+    # The errors will be concatenated in this variable
+    error = ""
 
-    # Find the chatbot-errors inside the last chatbot-qa div
-    chatbot_errors = last_chatbot_qa.find_element(By.CLASS_NAME, "chatbot-errors")
-    # Retrieve the error messages from the system
-    if chatbot_errors.text != "":
-        error += "Errors from the system [" + chatbot_errors.text + "]"
+    # Override ALASQAConfig if needed
+    override_alasqa_config(driver, llm_model_name)
 
-    # Find the alert messages stored in the local storage
-    alert_messages = driver.execute_script("return localStorage.getItem('alertMessages');")
-    # Retrieve the alert messages from the system
-    if alert_messages != "" and alert_messages != "[]":
-        error += "Alert messages from the system [" + alert_messages + "]"
+    specific_strategy_name = system_name.split("sparklisllm-")[1]
+    logging.info(f"INPUT: {question}")
+    logging.info("Waiting for system response...")
+    harvest = None
+    try:
+        driver.set_script_timeout(config.SYSTEM_TIMEOUT)
+        harvest = driver.execute_async_script(RUN_STRATEGY_SCRIPT, question, specific_strategy_name, suggestion_commands_tactic)
+    except UnexpectedAlertPresentException:
+        error += dismiss_alert(driver)
+        # The run continues after the alert, wait for its end
+        error += wait_for_qa_end(driver, config.SYSTEM_TIMEOUT,
+                                 lambda d: d.execute_script('return !document.getElementById("user-input").disabled;'))
+    except TimeoutException:
+        new_error_text = "Timeout while waiting for system response."
+        logging.error(new_error_text)
+        error += new_error_text
+    if isinstance(harvest, str):
+        new_error_text = f"Error while waiting for system response: {harvest}"
+        logging.error(new_error_text)
+        error += new_error_text
+    if not isinstance(harvest, dict):
+        harvest = harvest_results(driver)
+    logging.info("System response received.")
 
-    # Get the current status of the steps
-    steps_status = getStepsStatus(driver)
+    error += harvest_errors(harvest)
 
-    return sparql_request.text, sparklis_request.text, error, steps_status, chatbot_reasoning.text
+    return harvest["sparql_request"], harvest["sparklis_request"], error, harvest["steps_status"], harvest["reasoning"], harvest_calls(harvest)
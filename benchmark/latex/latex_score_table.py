@@ -8,16 +8,22 @@
  - Set JSON_DIR to the folder containing your JSON benchmark files.
  - Set OUTPUT_FILE to the desired output file name.
  - Choose OUTPUT_FORMAT: "latex" or "md".
+ - With USE_RUN_CATALOG, the runs are read from the run catalog (run_catalog.py) instead of their JSON files,
+   and CATALOG_FILTERS selects the runs of JSON_DIR and its subfolders (e.g. {"used_llm": "gpt-4o-mini", "tactic": "best_at_individual_cmd"}).
 """
 import json
 import statistics
 import os
+import sys
 from glob import glob
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # === Configuration ===
 JSON_DIR = r'C:\Users\PC\Desktop\llmSparklis\benchmark\BestOutputs\for_egc\QALD9Plus\Wikidata\train\LLMFrameworkBooleanByMergeByPatterns\greedy'
 OUTPUT_FILE = "output_table.txt"  # Output file name
 OUTPUT_FORMAT = "md"  # "latex" or "md"
+USE_RUN_CATALOG = False  # Read the runs from the run catalog (updated first) instead of parsing the JSON files (the runs of the subfolders of JSON_DIR are included)
+CATALOG_FILTERS = {}  # Columns of run_catalog.RUN_COLUMNS and their values
 
 # Recalculation options
 RECALCULATE_FILTER = ["unknown"]
@@ -59,13 +65,19 @@ def load_json_files(directory):
     filepaths = glob(os.path.join(directory, "*.json"))
     return [json.load(open(f, "r", encoding="utf-8")) for f in filepaths]
 
+def load_catalog_runs(directory, filters):
+    from run_catalog import RunCatalog
+    catalog = RunCatalog()
+    catalog.update([directory])
+    return catalog.run_entries(directory, **filters)
+
 def compute_stats(data, fields):
     stats = {category: {metric: [] for metric in metrics} for category, metrics in fields.items()}
     ignored_number = 0
     for entry in data:
         stats_entry = {category: {metric: [] for metric in metrics} for category, metrics in fields.items()}
         for qid, item in entry.get("Data", {}).items():
-            result_type = item.get("BenchmarkResultType", "").lower()
+            result_type = (item.get("BenchmarkResultType") or "").lower()
             if result_type in RECALCULATE_FILTER:
                 ignored_number += 1
                 continue
@@ -151,7 +163,7 @@ def generate_markdown_table(stats, model_name, system_strategy, selection_tactic
 
 if __name__ == "__main__":
     print(f"Loading JSON files from '{JSON_DIR}'...")
-    data = load_json_files(JSON_DIR)
+    data = load_catalog_runs(JSON_DIR, CATALOG_FILTERS) if USE_RUN_CATALOG else load_json_files(JSON_DIR)
     print(f"Loaded {len(data)} files.")
 
     stats = compute_stats(data, FIELDS)
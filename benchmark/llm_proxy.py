@@ -0,0 +1,186 @@
+"""
+Local caching proxy for the OpenAI-compatible chat/completions API used by Sparklis (sendPrompt in llm_utils.js).
+Identical prompts sent again (e.g. when a strategy is evaluated again) are answered from a persistent cache,
+keyed on the model, messages, temperature, stop sequences and max tokens, instead of paying for a new generation.
+Streamed answers are replayed as server-sent events.
+Only the requests with a temperature of 0 are cached (see LLM_TEMPERATURE), unless LLM_PROXY_FORCE_CACHE is True in config.py.
+
+The proxy is served by api.py under /llm (http://localhost:8000/llm/v1/chat/completions),
+set LLM_PROXY to True in config.py to make the benchmarked page use it.
+It can also be run alone:
+python llm_proxy.py --port 8001
+"""
+import argparse
+import json
+import logging
+import time
+import uuid
+import fastapi
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+import httpx
+from persistent_cache import PersistentCache, make_key
+import config
+
+router = fastapi.APIRouter()
+
+_cache: PersistentCache = None
+_client: httpx.AsyncClient = None
+
+def completions_cache() -> PersistentCache:
+    """
+    Get the cache of the completions.
+    """
+    global _cache
+    if _cache is None:
+        _cache = PersistentCache(config.LLM_PROXY_CACHE_FILE)
+    return _cache
+
+def upstream_client() -> httpx.AsyncClient:
+    """
+    Get the client used to send the requests to the LLM API (no read timeout, as generations can be long).
+    """
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(timeout=httpx.Timeout(30, read=None))
+    return _client
+
+def completion_key(body: dict) -> str:
+    """
+    Key of a chat/completions request in the cache (the stream option doesn't change the completion).
+    """
+    model = body.get("model") or config.LLM_API_MODEL_NAME
+    return make_key(config.LLM_API_CHAT_COMPLETIONS, model, body.get("messages"), body.get("temperature"),
+                    body.get("stop"), body.get("max_tokens"))
+
+def is_cacheable(body: dict) -> bool:
+    """
+    Only deterministic requests are cached, unless forced.
+    Without temperature, the API uses its default temperature (1 for OpenAI), so the request isn't deterministic.
+    """
+    temperature = body.get("temperature")
+    return config.LLM_PROXY_FORCE_CACHE or (temperature is not None and temperature <= 0)
+
+def upstream_headers(request: fastapi.Request) -> dict:
+    headers = {"Content-Type": "application/json"}
+    authorization = request.headers.get("Authorization")
+    if authorization is None and config.LLM_API_KEY is not None:
+        authorization = f"Bearer {config.LLM_API_KEY}"
+    if authorization is not None:
+        headers["Authorization"] = authorization
+    return headers
+
+#####################################
+
+def completion_response(entry: dict) -> dict:
+    """
+    Non-streamed answer replaying a cached completion.
+    """
+    return {
+        "id": "chatcmpl-" + uuid.uuid4().hex,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": entry.get("model"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": entry["content"]},
+            "finish_reason": entry.get("finish_reason"),
+        }],
+    }
+
+def replay_stream(entry: dict):
+    """
+    Server-sent events replaying a cached completion.
+    """
+    chunk = {
+        "id": "chatcmpl-" + uuid.uuid4().hex,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": entry.get("model"),
+    }
+    yield "data: " + json.dumps({**chunk, "choices": [{"index": 0, "delta": {"role": "assistant", "content": entry["content"]}, "finish_reason": None}]}) + "\n\n"
+    yield "data: " + json.dumps({**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": entry.get("finish_reason")}]}) + "\n\n"
+    yield "data: [DONE]\n\n"
+
+async def forward_stream(response: httpx.Response, key: str):
+    """
+    Forward the server-sent events of the LLM API, and cache the completion once it is fully received.
+    """
+    content = ""
+    model = None
+    finish_reason = None
+    finished = False
+    async for line in response.aiter_lines():
+        yield line + "\n"
+        if key is None or not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            finished = True
+            continue
+        try:
+            chunk = json.loads(data)
+            model = chunk.get("model") or model
+            if len(chunk.get("choices") or []) == 0:
+                continue # last chunk with only the usage of tokens
+            choice = chunk["choices"][0]
+            content += choice.get("delta", {}).get("content") or ""
+            finish_reason = choice.get("finish_reason") or finish_reason
+        except (json.JSONDecodeError, KeyError, IndexError):
+            logging.warning(f"Unexpected chunk from the LLM API: {data}")
+    if key is not None and finished:
+        completions_cache().set(key, {"content": content, "finish_reason": finish_reason, "model": model})
+
+@router.post("/v1/chat/completions")
+async def chat_completions(request: fastapi.Request):
+    """
+    OpenAI-compatible chat/completions, answered from the cache when possible.
+    """
+    body = await request.json()
+    stream = bool(body.get("stream"))
+    key = completion_key(body) if is_cacheable(body) else None
+
+    if key is not None:
+        entry = completions_cache().get(key)
+        if entry is not None:
+            headers = {"X-Cache": "HIT"}
+            if stream:
+                return StreamingResponse(replay_stream(entry), media_type="text/event-stream", headers=headers)
+            return JSONResponse(completion_response(entry), headers=headers)
+    headers = {"X-Cache": "MISS" if key is not None else "BYPASS"}
+
+    client = upstream_client()
+    upstream_request = client.build_request("POST", config.LLM_API_CHAT_COMPLETIONS, json=body, headers=upstream_headers(request))
+    response = await client.send(upstream_request, stream=stream)
+    if response.status_code != 200:
+        content = await response.aread()
+        await response.aclose()
+        return Response(content, status_code=response.status_code, media_type=response.headers.get("Content-Type"))
+    if stream:
+        return StreamingResponse(forward_stream(response, key), media_type="text/event-stream", headers=headers,
+                                 background=BackgroundTask(response.aclose))
+
+    data = response.json()
+    if key is not None:
+        try:
+            choice = data["choices"][0]
+            completions_cache().set(key, {"content": choice["message"]["content"],
+                                          "finish_reason": choice.get("finish_reason"), "model": data.get("model")})
+        except (KeyError, IndexError):
+            logging.warning(f"Unexpected answer from the LLM API: {data}")
+    return JSONResponse(data, headers=headers)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    parser = argparse.ArgumentParser(description="Run the caching LLM proxy alone.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+
+    app = fastapi.FastAPI(title="Caching LLM proxy")
+    # The page of Sparklis is served from another origin
+    app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+    app.include_router(router, prefix="/llm")
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -3,7 +3,8 @@ Used to merge partial run outputs into a new JSON file.
 Will add the questions and answers from the partial runs to the new file (ids in files must be unique).
 Will also recalculate global metrics (averages) for the new file.
 Useful to be able to evaluate a benchmark with multiple runs and merge the results into a single file.
-(To run a benchmark starting from a given question, you can use BENCHMARK_QUESTIONS_FILTER in the config file).
+(To run a benchmark starting from a given question, you can use BENCHMARK_QUESTIONS_FILTER in the config file.
+An interrupted run is also automatically resumed by system_evaluation.py if RESUME_INTERRUPTED_RUNS is True).
 """
 import json
 from datetime import datetime
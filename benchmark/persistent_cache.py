@@ -0,0 +1,116 @@
+"""
+Persistent key-value cache stored in a local SQLite file.
+Used to avoid repeating requests whose answers don't change between runs (e.g. the results of the benchmark queries).
+Values are stored as JSON, with their creation time to handle expiration (TTL).
+
+Can also be executed to invalidate the entries of a cache file:
+python persistent_cache.py Cache/gold_results.sqlite --older-than 86400
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+class PersistentCache:
+    """
+    Key-value cache stored in a SQLite file, safe to share between threads.
+    """
+    def __init__(self, file_path: str, ttl: float = None):
+        """
+        file_path: SQLite file of the cache (created if needed)
+        ttl: time (in seconds) after which an entry is considered expired (None for no expiration)
+        """
+        self.file_path = file_path
+        self.ttl = ttl
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(file_path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+
+    def get(self, key: str, default=None):
+        """
+        Get the value of a key, or default if the key is missing or expired.
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return default
+        value, created = row
+        if self.ttl is not None and time.time() - created > self.ttl:
+            return default
+        return json.loads(value)
+
+    def set(self, key: str, value):
+        """
+        Set the value of a key (must be serializable in JSON).
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO entries (key, value, created) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time())
+            )
+
+    def delete(self, key: str):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def clear(self, older_than: float = None) -> int:
+        """
+        Remove all the entries, or only the ones older than the given time (in seconds).
+        Return the number of removed entries.
+        """
+        with self._lock, self._connection:
+            if older_than is None:
+                cursor = self._connection.execute("DELETE FROM entries")
+            else:
+                cursor = self._connection.execute("DELETE FROM entries WHERE created < ?", (time.time() - older_than,))
+        return cursor.rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+def make_key(*parts) -> str:
+    """
+    Content-addressed key: hash of the given parts (must be serializable in JSON).
+    """
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize the text of a SPARQL query so that queries only differing by their whitespaces get the same key.
+    """
+    return " ".join(query.split())
+
+def sparql_cache_key(endpoint: str, query: str) -> str:
+    """
+    Key of the results of a SPARQL query on an endpoint.
+    """
+    return make_key(endpoint, normalize_query(query))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Invalidate the entries of a persistent cache file.")
+    parser.add_argument("cache_file", help="SQLite file of the cache")
+    parser.add_argument("--older-than", type=float, default=None, help="only remove the entries older than this number of seconds")
+    args = parser.parse_args()
+
+    cache = PersistentCache(args.cache_file)
+    removed = cache.clear(args.older_than)
+    logging.info(f"{removed} entries removed from {args.cache_file}, {len(cache)} remaining.")
+    cache.close()
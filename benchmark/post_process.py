@@ -18,6 +18,7 @@ import numpy as np
 import os
 import re
 import math
+from run_data import load_run_data
 
 logging.basicConfig(
     level=logging.INFO, # NOTSET | DEBUG | INFO | WARNING | ERROR | CRITICAL
@@ -98,8 +99,7 @@ def extract_scores_from_file(file_name: str) -> tuple[list, list, list]:
     """
     Extracts precision, recall, and F1 scores from a JSON file.
     """
-    with open(file_name, 'r') as file:
-        data = json.load(file)
+    data = load_run_data(file_name)
     precisions = []
     recalls = []
     f1_scores = []
@@ -255,7 +255,7 @@ def boxplot_scores(precision, recall, f1_scores, title_end: str):
 
 def load_and_filter_data(json_file, constraints=None):
     """
-    Loads a JSON file and filters its data based on given constraints.
+    Loads a JSON file (only once, see run_data.py) and filters its data based on given constraints.
     
     Args:
         json_file (str): Path to the JSON file.
@@ -265,8 +265,7 @@ def load_and_filter_data(json_file, constraints=None):
     Returns:
         dict: Dictionary of filtered data entries with keys from the JSON.
     """
-    with open(json_file, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    data = load_run_data(json_file)
     
     filtered_data = {}
     for key, entry in data.get("Data", {}).items():
@@ -515,6 +514,84 @@ def plot_box_system_time(filtered_data):
         plt.show()
     plt.close()
 
+def extract_steps_timings(filtered_data) -> dict:
+    """
+    Timings of the steps of each question (only the questions whose steps were timed).
+    """
+    return {key: entry["StepsTimings"] for key, entry in filtered_data.items() if entry.get("StepsTimings")}
+
+def plot_stacked_steps_latency(filtered_data):
+    """
+    Plot the time spent by each question in each category of steps (LLM, Sparklis, Endpoint, Other),
+    as stacked bars sorted by total time.
+    """
+    steps_timings = extract_steps_timings(filtered_data)
+    if len(steps_timings) == 0:
+        return
+    categories = ["LLM", "Sparklis", "Endpoint", "Other"]
+    durations = {key: {category: 0 for category in categories} for key in steps_timings}
+    for key, timings in steps_timings.items():
+        for step in timings:
+            if step.get("Duration") is not None:
+                durations[key][step.get("Category", "Other")] += step["Duration"]
+    keys = sorted(durations, key=lambda key: sum(durations[key].values()), reverse=True)
+
+    plt.figure(figsize=(12, 6))
+    bottom = np.zeros(len(keys))
+    for category in categories:
+        values = np.array([durations[key][category] for key in keys])
+        plt.bar(range(len(keys)), values, bottom=bottom, label=category)
+        bottom += values
+    plt.xlabel("Questions (sorted by time)")
+    plt.ylabel("Time (seconds)")
+    plt.xticks([])
+    plt.legend()
+    plt.tight_layout()
+    if not show:
+        plt.title("Time spent in each category of steps per question")
+    pp.savefig()
+    if show:
+        plt.show()
+    plt.close()
+
+def plot_table_slowest_steps(filtered_data, max_rows=15):
+    """
+    Plot a table of the steps taking the most time in total, with their count, mean and max durations.
+    """
+    steps_timings = extract_steps_timings(filtered_data)
+    durations = defaultdict(list)
+    for timings in steps_timings.values():
+        for step in timings:
+            if step.get("Duration") is not None:
+                durations[step.get("Name")].append(step["Duration"])
+    if len(durations) == 0:
+        return
+    total_time = sum(sum(values) for values in durations.values())
+    names = sorted(durations, key=lambda name: sum(durations[name]), reverse=True)[:max_rows]
+    table_data = [[len(durations[name]),
+                   round(np.mean(durations[name]), 2),
+                   round(max(durations[name]), 2),
+                   round(sum(durations[name]), 2),
+                   round(sum(durations[name]) / total_time * 100, 2) if total_time > 0 else 0]
+                  for name in names]
+
+    fig, ax = plt.subplots(figsize=(12, 8))
+    ax.axis("off")
+    table = ax.table(
+        cellText=table_data,
+        colLabels=["Count", "Mean (s)", "Max (s)", "Total (s)", "% of time"],
+        rowLabels=names,
+        bbox=[0.4, 0, 0.6, 1],
+        cellLoc="center",
+    )
+    table.auto_set_font_size(False)
+    table.set_fontsize(9)
+    ax.set_title("Table of the slowest steps")
+    pp.savefig(fig)
+    if show:
+        plt.show()
+    plt.close(fig)
+
 def get_commands_from_reasoning(reasoning: str) -> list:
     """
     Extracts commands from the reasoning field.
@@ -1634,6 +1711,8 @@ def make_pdf_report(files_names: list[str], core_files_names: list[str], questio
 
     precisions, recalls, f1_scores = extract_scores(filtered_valid_data)
     plot_box_system_time(filtered_valid_data)
+    plot_stacked_steps_latency(filtered_valid_data)
+    plot_table_slowest_steps(filtered_valid_data)
     plot_score_relative_to_time(filtered_valid_data)
     plot_cumulative_score_relative_to_time(filtered_valid_data)
 
@@ -0,0 +1,90 @@
+"""
+Limits on the SPARQL queries sent by the evaluation to each endpoint, to avoid being blocked (429 Too Many Requests).
+Each endpoint has a cap on the number of concurrent queries and a token bucket limiting the number of queries per second.
+Also provides the delays to wait before retrying a rate limited query (Retry-After header or capped exponential backoff with jitter).
+"""
+import email.utils
+import random
+import threading
+import time
+import config
+
+class TokenBucket:
+    """
+    Token bucket allowing on average `rate` operations per second, with bursts of at most `capacity` operations.
+    """
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """
+        Take a token, waiting until one is available.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+class EndpointLimiter:
+    """
+    Limits of an endpoint, used as a context manager around each query.
+    """
+    def __init__(self, max_concurrent_queries: int, max_queries_per_second: float = None):
+        self._slots = threading.BoundedSemaphore(max_concurrent_queries)
+        self._bucket = TokenBucket(max_queries_per_second) if max_queries_per_second else None
+
+    def __enter__(self):
+        self._slots.acquire()
+        if self._bucket is not None:
+            self._bucket.take()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self._slots.release()
+        return False
+
+_limiters: dict[str, EndpointLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_endpoint_limiter(endpoint: str) -> EndpointLimiter:
+    """
+    Get the limiter shared by all the queries sent to an endpoint (created with the limits of config.py).
+    """
+    with _limiters_lock:
+        if endpoint not in _limiters:
+            _limiters[endpoint] = EndpointLimiter(config.SPARQL_MAX_CONCURRENT_QUERIES, config.SPARQL_MAX_QUERIES_PER_SECOND)
+        return _limiters[endpoint]
+
+def retry_after_seconds(headers) -> float:
+    """
+    Delay asked by the Retry-After header of an answer (in seconds or as an HTTP date), or None.
+    """
+    if headers is None:
+        return None
+    value = headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    Capped exponential backoff with jitter, for the given attempt (starting at 0).
+    """
+    return random.uniform(0.5, 1) * min(cap, base * 2 ** attempt)
@@ -0,0 +1,148 @@
+"""
+Score existing outputs of runs again, without running the tested system again
+(e.g. after a change of stats_calculation or a patch of the benchmark queries in a *_patched.json file).
+The benchmark queries are executed again (from the gold results cache if possible), taken from a benchmark file if given,
+and the stored system results are scored again, or the system queries are executed again with --reexecute-system.
+The scores of each question and the Stats are rewritten in place (--in-place) or in new files.
+
+python rescore.py Outputs/QALD-10_sparklisllm-LLMFrameworkOneShot_20250101_120000.json --benchmark-file Inputs/qald_10_patched.json
+python rescore.py BestOutputs/for_paper/QALD10/*/*.json --reexecute-system --output-folder Outputs/rescored
+"""
+import argparse
+import json
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+import benchmark_extraction
+import system_evaluation
+from call_accounting import SYSTEM
+import config
+
+RESCORED_SUFFIX = '_rescored'
+
+# Errors added by the evaluation of the benchmark (and system) queries, replaced by the ones of the new evaluation
+BENCHMARK_EVALUATION_ERRORS = re.compile(
+    r"Error: Benchmark query (is badly formed|execution failed( \(too many requests\))?)\."
+    r"|Warning: Benchmark query results truncated to \d+ rows;")
+SYSTEM_EVALUATION_ERRORS = re.compile(
+    r"Error: System query (is badly formed|execution failed( \(too many requests\))?)\."
+    r"|Warning: System query results truncated to \d+ rows;"
+    r"|Warning: No query to execute;"
+    r"|Error: Unexpected response format\.")
+
+def benchmark_queries_from_file(benchmark_file: str, benchmark_name: str) -> dict:
+    """
+    Benchmark queries of a benchmark file, by question id.
+    """
+    questions_ids, _, benchmark_queries, _ = benchmark_extraction.extractorFactory(benchmark_name).extractData(
+        benchmark_file, config.LANGUAGE_QUESTIONS, {})
+    return {str(question_id): query for question_id, query in zip(questions_ids, benchmark_queries)}
+
+def output_records(data: dict) -> list[dict]:
+    """
+    Records of the questions of an output (see system_evaluation.make_records), with defaults for older outputs.
+    """
+    records = []
+    for question_id, entry in data['Data'].items():
+        records.append({
+            'Tags': [], 'Error': '', 'StepsStatus': '', 'SystemNLQuery': '', 'SystemTime': 0, 'Reasoning': '',
+            'SystemQuery': '', 'SystemResult': None,
+            **{key: value for key, value in entry.items() if key not in ('Usage', 'StepsTimings')}, # recomputed by make_dict
+            'Id': question_id,
+        })
+    return records
+
+def rescore_records(records: list[dict], endpoint: str, reexecute_system: bool, benchmark_queries: dict = None):
+    """
+    Evaluate the queries of the records again and update their results, errors, calls and scores.
+    """
+    if benchmark_queries is not None:
+        for record in records:
+            record['BenchmarkQuery'] = benchmark_queries.get(record['Id'], record['BenchmarkQuery'])
+    errors = [BENCHMARK_EVALUATION_ERRORS.sub('', record['Error']) for record in records]
+    if reexecute_system:
+        errors = [SYSTEM_EVALUATION_ERRORS.sub('', error) for error in errors]
+    # Only the calls of the system are kept, the ones of the evaluation are replaced
+    calls_list = [[call for call in record.get('Calls', []) if call.get('Source', SYSTEM) == SYSTEM] for record in records]
+
+    benchmark_results, response_types, system_results, errors = system_evaluation.queries_evaluation(
+        [record['BenchmarkQuery'] for record in records], [record['SystemQuery'] for record in records],
+        errors, endpoint, calls_list,
+        stored_system_results=None if reexecute_system else [record['SystemResult'] for record in records])
+    precisions, recalls, f1_scores = system_evaluation.stats_calculation(benchmark_results, system_results)
+
+    for i, record in enumerate(records):
+        record.update({
+            'Error': errors[i],
+            'BenchmarkResultType': response_types[i],
+            'BenchmarkResult': benchmark_results[i],
+            'SystemResult': system_results[i],
+            'Precision': precisions[i],
+            'Recall': recalls[i],
+            'F1Score': f1_scores[i],
+            'Calls': calls_list[i],
+        })
+
+def rescore_file(file_name: str, output_file: str, endpoint: str = None, reexecute_system: bool = False,
+                 benchmark_file: str = None, batch_size: int = 50):
+    """
+    Score an output file again and write the result in output_file (which can be the same file).
+    The questions are evaluated in batches of batch_size questions.
+    """
+    with open(file_name) as file:
+        data = json.load(file)
+    meta = {key: value for key, value in data.items() if key not in ('Stats', 'Data')}
+    if endpoint is not None:
+        meta['Endpoint'] = endpoint
+    benchmark_queries = benchmark_queries_from_file(benchmark_file, meta['BenchmarkName']) if benchmark_file else None
+
+    records = output_records(data)
+    for i in range(0, len(records), batch_size):
+        rescore_records(records[i:i + batch_size], meta['Endpoint'], reexecute_system, benchmark_queries)
+    rescored = system_evaluation.make_dict_from_records(meta, records)
+
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    with open(output_file + '.tmp', 'w') as file:
+        json.dump(rescored, file, indent=4)
+    os.replace(output_file + '.tmp', output_file) # the original file is never left half written
+    logging.info(f'{file_name} rescored in {output_file}: MeanF1Score {data["Stats"].get("MeanF1Score")} -> {rescored["Stats"]["MeanF1Score"]}')
+    return rescored
+
+def rescored_file_name(file_name: str, output_folder: str = None) -> str:
+    base, extension = os.path.splitext(os.path.basename(file_name))
+    return os.path.join(output_folder or os.path.dirname(file_name), base + RESCORED_SUFFIX + extension)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score existing outputs of runs again, without running the system again.")
+    parser.add_argument("files", nargs="+", help="Output files (.json) to score again.")
+    parser.add_argument("--benchmark-file", help="Benchmark file from which the benchmark queries are taken (by question id), e.g. a *_patched.json file.")
+    parser.add_argument("--reexecute-system", action="store_true", help="Execute the system queries again instead of scoring the stored system results.")
+    parser.add_argument("--endpoint", help="SPARQL endpoint on which the queries are executed (by default the endpoint of each output).")
+    parser.add_argument("--in-place", action="store_true", help="Rewrite the output files instead of writing new files.")
+    parser.add_argument("--output-folder", help=f"Folder of the new files (by default next to each output, with the suffix {RESCORED_SUFFIX}).")
+    parser.add_argument("--jobs", type=int, default=4, help="Number of files scored at the same time.")
+    parser.add_argument("--batch-size", type=int, default=50, help="Number of questions of a file evaluated at the same time.")
+    parser.add_argument("--no-cache", action="store_true", help="Don't use the gold results cache.")
+    parser.add_argument("--refresh-cache", action="store_true", help="Execute the benchmark queries again and refresh the gold results cache.")
+    args = parser.parse_args()
+
+    if args.no_cache:
+        config.GOLD_RESULTS_CACHE = False
+    if args.refresh_cache:
+        config.GOLD_RESULTS_CACHE_REFRESH = True
+
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        rescorings = {file_name: executor.submit(
+            rescore_file, file_name, file_name if args.in_place else rescored_file_name(file_name, args.output_folder),
+            args.endpoint, args.reexecute_system, args.benchmark_file, args.batch_size) for file_name in args.files}
+    failed = False
+    for file_name, rescoring in rescorings.items():
+        try:
+            rescoring.result()
+        except Exception as e:
+            logging.error(f"Failed to rescore {file_name}: {e}")
+            failed = True
+    if failed:
+        exit(1)
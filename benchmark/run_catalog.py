@@ -0,0 +1,247 @@
+"""
+Catalog of the outputs of the runs (Outputs/ and BestOutputs/), stored in a SQLite file, to select and compare runs
+without parsing their (large) JSON files again: metadata, Stats and scores of each question.
+The catalog is updated incrementally: only the new or modified files are parsed, and a moved file is recognized by its hash.
+
+python run_catalog.py --strategy LLMFrameworkOneShot --benchmark QALD-10 --tactic best_at_individual_cmd --stat MeanF1Score --group-by used_llm
+python run_catalog.py BestOutputs/for_egc --used-llm gpt-4o-mini
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import statistics
+import threading
+import config
+
+# Columns of the runs that can be filtered or grouped by, and their keys in the outputs
+RUN_COLUMNS = {
+    'benchmark_name': 'BenchmarkName',
+    'tested_system': 'TestedSystem',
+    'strategy': 'Strategy',
+    'tactic': 'SuggestionCommandsTactic',
+    'used_llm': 'UsedLLM',
+    'endpoint': 'Endpoint',
+    'date': 'Date',
+}
+
+def file_hash(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def run_metadata(data: dict) -> dict:
+    """
+    Values of the columns of a run, from its output (older outputs have SuggestionCommandsAlgo or no tactic).
+    """
+    tested_system = data.get('TestedSystem')
+    return {
+        'benchmark_name': data.get('BenchmarkName'),
+        'tested_system': tested_system,
+        'strategy': tested_system.split('-')[-1] if tested_system else None,
+        'tactic': data.get('SuggestionCommandsTactic', data.get('SuggestionCommandsAlgo')),
+        'used_llm': data.get('UsedLLM'),
+        'endpoint': data.get('Endpoint'),
+        'date': data.get('Date'),
+    }
+
+class RunCatalog:
+    """
+    Catalog of run outputs stored in a SQLite file, safe to share between threads.
+    """
+    def __init__(self, file_path: str = None):
+        self.file_path = file_path or config.RUN_CATALOG_FILE
+        directory = os.path.dirname(self.file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.file_path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS runs (path TEXT PRIMARY KEY, hash TEXT NOT NULL, mtime REAL NOT NULL, size INTEGER NOT NULL, "
+                + ", ".join(f"{column} TEXT" for column in RUN_COLUMNS) + ", stats TEXT, error TEXT)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS questions (path TEXT NOT NULL, question_id TEXT NOT NULL, result_type TEXT, "
+                "precision REAL, recall REAL, f1_score REAL, system_time REAL, error TEXT, PRIMARY KEY (path, question_id))"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS runs_hash ON runs (hash)")
+
+    def _index_file(self, path: str, digest: str, mtime: float, size: int):
+        """
+        Parse an output and replace its rows (an invalid file is kept with its error, so that it isn't parsed again).
+        """
+        try:
+            with open(path, encoding='utf-8') as file:
+                data = json.load(file)
+            metadata, error = run_metadata(data), None
+        except (json.JSONDecodeError, UnicodeDecodeError, AttributeError) as e:
+            logging.warning(f"Invalid run output {path}: {e}")
+            data, metadata, error = {}, {column: None for column in RUN_COLUMNS}, str(e)
+        questions = [(path, str(question_id), entry.get('BenchmarkResultType'), entry.get('Precision'), entry.get('Recall'),
+                      entry.get('F1Score'), entry.get('SystemTime'), entry.get('Error', ''))
+                     for question_id, entry in data.get('Data', {}).items()]
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM questions WHERE path = ?", (path,))
+            self._connection.execute(
+                f"INSERT OR REPLACE INTO runs (path, hash, mtime, size, {', '.join(RUN_COLUMNS)}, stats, error) "
+                f"VALUES ({', '.join('?' * (len(RUN_COLUMNS) + 6))})",
+                (path, digest, mtime, size, *metadata.values(), json.dumps(data.get('Stats')) if data else None, error))
+            self._connection.executemany("INSERT OR REPLACE INTO questions VALUES (?, ?, ?, ?, ?, ?, ?, ?)", questions)
+
+    def _move(self, old_path: str, path: str, mtime: float, size: int):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM runs WHERE path = ?", (path,))
+            self._connection.execute("DELETE FROM questions WHERE path = ?", (path,))
+            self._connection.execute("UPDATE runs SET path = ?, mtime = ?, size = ? WHERE path = ?", (path, mtime, size, old_path))
+            self._connection.execute("UPDATE questions SET path = ? WHERE path = ?", (path, old_path))
+
+    def update(self, folders: list[str] = None) -> dict:
+        """
+        Index the new and modified outputs of the folders (recursively), and remove the deleted ones.
+        Returns the number of files of each kind (Added, Updated, Moved, Unchanged, Removed).
+        """
+        folders = [os.path.abspath(folder) for folder in (folders or [config.OUTPUT_FOLDER, config.script_dir + '/BestOutputs/'])]
+        files = {}
+        for folder in folders:
+            for directory, _, file_names in os.walk(folder):
+                for file_name in file_names:
+                    if file_name.endswith('.json'):
+                        path = os.path.join(directory, file_name)
+                        files[path] = os.stat(path)
+        with self._lock:
+            known = {row['path']: row for row in self._connection.execute("SELECT path, hash, mtime, size FROM runs")}
+        in_folders = lambda path: any(path.startswith(os.path.join(folder, '')) for folder in folders)
+        # Deleted (or moved) outputs, by hash
+        missing = {}
+        for path, row in known.items():
+            if path not in files and in_folders(path):
+                missing.setdefault(row['hash'], []).append(path)
+
+        counts = {'Added': 0, 'Updated': 0, 'Moved': 0, 'Unchanged': 0, 'Removed': 0}
+        for path, stat in files.items():
+            row = known.get(path)
+            if row is not None and row['mtime'] == stat.st_mtime and row['size'] == stat.st_size:
+                counts['Unchanged'] += 1
+                continue
+            digest = file_hash(path)
+            if row is not None and row['hash'] == digest:
+                with self._lock, self._connection:
+                    self._connection.execute("UPDATE runs SET mtime = ?, size = ? WHERE path = ?", (stat.st_mtime, stat.st_size, path))
+                counts['Unchanged'] += 1
+            elif missing.get(digest):
+                self._move(missing[digest].pop(), path, stat.st_mtime, stat.st_size)
+                counts['Moved'] += 1
+            else:
+                self._index_file(path, digest, stat.st_mtime, stat.st_size)
+                counts['Updated' if row is not None else 'Added'] += 1
+        with self._lock, self._connection:
+            for path in [path for paths in missing.values() for path in paths]:
+                self._connection.execute("DELETE FROM runs WHERE path = ?", (path,))
+                self._connection.execute("DELETE FROM questions WHERE path = ?", (path,))
+                counts['Removed'] += 1
+        return counts
+
+    #####################################
+
+    def _where(self, folder: str = None, **filters) -> tuple[str, list]:
+        unknown = set(filters) - set(RUN_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown filters {', '.join(unknown)}, use {', '.join(RUN_COLUMNS)} or folder.")
+        conditions, params = ["error IS NULL"], []
+        for column, value in filters.items():
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if folder is not None:
+            conditions.append("path LIKE ? ESCAPE '\\'")
+            prefix = os.path.join(os.path.abspath(folder), '')
+            params.append(prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+        return " AND ".join(conditions), params
+
+    def runs(self, folder: str = None, **filters) -> list[dict]:
+        """
+        Runs matching the filters (values of RUN_COLUMNS, folder for the runs under a folder), sorted by path.
+        Each run has its Path, the keys of RUN_COLUMNS and its Stats.
+        """
+        where, params = self._where(folder, **filters)
+        with self._lock:
+            rows = self._connection.execute(f"SELECT * FROM runs WHERE {where} ORDER BY path", params).fetchall()
+        return [{'Path': row['path'], **{key: row[column] for column, key in RUN_COLUMNS.items()},
+                 'Stats': json.loads(row['stats']) if row['stats'] else {}} for row in rows]
+
+    def stat_by_group(self, stat: str, group_by: str = 'used_llm', folder: str = None, **filters) -> dict:
+        """
+        Mean, standard deviation and number of runs of a stat (e.g. MeanF1Score), for each value of a column.
+        """
+        if group_by not in RUN_COLUMNS:
+            raise ValueError(f"Unknown column {group_by}, use {', '.join(RUN_COLUMNS)}.")
+        where, params = self._where(folder, **filters)
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT {group_by}, json_extract(stats, ?) FROM runs WHERE {where} ORDER BY {group_by}",
+                ['$.' + stat] + params).fetchall()
+        values = {}
+        for group, value in rows:
+            if value is not None:
+                values.setdefault(group, []).append(value)
+        return {group: {'Mean': statistics.mean(group_values),
+                        'Std': statistics.stdev(group_values) if len(group_values) > 1 else 0.0,
+                        'NbRuns': len(group_values)}
+                for group, group_values in values.items()}
+
+    def question_scores(self, paths: list[str]) -> dict:
+        """
+        Scores of the questions of runs, by path then question id, in the format of the Data of the outputs
+        (BenchmarkResultType, Precision, Recall, F1Score, SystemTime, Error).
+        """
+        scores = {path: {} for path in paths}
+        with self._lock:
+            for path in paths:
+                for row in self._connection.execute("SELECT * FROM questions WHERE path = ?", (path,)):
+                    scores[path][row['question_id']] = {
+                        'BenchmarkResultType': row['result_type'], 'Precision': row['precision'], 'Recall': row['recall'],
+                        'F1Score': row['f1_score'], 'SystemTime': row['system_time'], 'Error': row['error']}
+        return scores
+
+    def run_entries(self, folder: str = None, **filters) -> list[dict]:
+        """
+        Runs matching the filters, as light outputs: their metadata, Stats and Data with only the scores of the questions.
+        """
+        runs = self.runs(folder, **filters)
+        scores = self.question_scores([run['Path'] for run in runs])
+        return [{**run, 'Data': scores[run['Path']]} for run in runs]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update the catalog of the run outputs and select runs from it.")
+    parser.add_argument("folders", nargs="*", help="Folders of outputs to index (by default Outputs/ and BestOutputs/), also used to select the runs.")
+    parser.add_argument("--catalog", default=config.RUN_CATALOG_FILE, help="SQLite file of the catalog.")
+    for column, key in RUN_COLUMNS.items():
+        parser.add_argument("--" + column.replace('_name', '').replace('_', '-'), dest=column, help=f"Only the runs with this {key}.")
+    parser.add_argument("--stat", help="Print the mean of this stat (e.g. MeanF1Score) by group instead of the runs.")
+    parser.add_argument("--group-by", default="used_llm", choices=list(RUN_COLUMNS), help="Column of the groups of --stat.")
+    parser.add_argument("--no-update", action="store_true", help="Don't index the new outputs first.")
+    args = parser.parse_args()
+
+    catalog = RunCatalog(args.catalog)
+    if not args.no_update:
+        logging.info(f"Catalog updated: {catalog.update(args.folders or None)}")
+    filters = {column: getattr(args, column) for column in RUN_COLUMNS}
+    folders = args.folders or [None]
+    for folder in folders:
+        if args.stat:
+            for group, values in catalog.stat_by_group(args.stat, args.group_by, folder, **filters).items():
+                print(f"{group}\t{values['Mean']:.4f} ± {values['Std']:.4f}\t({values['NbRuns']} runs)")
+        else:
+            for run in catalog.runs(folder, **filters):
+                print(f"{run['Path']}\t{run['UsedLLM']}\t{run['SuggestionCommandsTactic']}\tMeanF1Score={run['Stats'].get('MeanF1Score')}")
@@ -0,0 +1,22 @@
+"""
+Outputs of runs loaded by the post-processing (post_process.py): each output file is loaded only once
+(again if it is modified), however many times its questions are filtered.
+"""
+import json
+import os
+
+# Loaded outputs, by path: (modification time, output)
+_runs_data = {}
+
+def load_run_data(file_name: str) -> dict:
+    """
+    Output of a run, loaded only once. The output is shared by all the callers, it must not be modified.
+    """
+    path = os.path.realpath(file_name)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _runs_data.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, "r", encoding="utf-8") as file:
+            cached = (mtime, json.load(file))
+        _runs_data[path] = cached
+    return cached[1]
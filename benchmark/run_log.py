@@ -0,0 +1,102 @@
+"""
+Append-only log of a benchmark run (JSON Lines).
+The first line contains the metadata of the run, then one line is appended for each question as soon as it is evaluated.
+The final JSON output of the run is built from this log at the end of the run.
+A log without its output file corresponds to an interrupted run, which can be resumed by system_evaluation.py.
+
+It can also be built on demand (e.g. after a crash) by executing this file:
+python run_log.py Outputs/QALD-10_sparklisllm-LLMFrameworkOneShot_20250101_120000.jsonl
+"""
+import json
+import os
+import sys
+import threading
+
+LOG_EXTENSION = '.jsonl'
+
+class RunLog:
+    """
+    Append-only log of the evaluated questions of a run, safe to share between threads.
+    """
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def create(file_path: str, meta: dict, run_info: dict = None) -> 'RunLog':
+        """
+        Create a new log file starting with the metadata of the run.
+        run_info contains information about the run that is not part of the output metadata (e.g. the benchmark file),
+        used to recognize the run when resuming it.
+        """
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(file_path, 'w', encoding='utf-8') as file:
+            file.write(json.dumps({'Meta': meta, 'Run': run_info or {}}) + '\n')
+        return RunLog(file_path)
+
+    def read_header(self) -> tuple[dict, dict]:
+        """
+        Read the metadata and the run information of the log (without reading the records).
+        """
+        with self._lock, open(self.file_path, 'r', encoding='utf-8') as file:
+            try:
+                header = json.loads(file.readline())
+            except json.JSONDecodeError:
+                return {}, {}
+        return header.get('Meta', {}), header.get('Run', {})
+
+    def append(self, records: list[dict]):
+        """
+        Append the records of evaluated questions to the log (one line per question).
+        """
+        with self._lock, open(self.file_path, 'a', encoding='utf-8') as file:
+            if not self._ends_with_newline():
+                file.write('\n') # the last line was truncated (e.g. crash while writing), it must not corrupt the next record
+            for record in records:
+                file.write(json.dumps(record) + '\n')
+            file.flush()
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.file_path, 'rb') as file:
+            file.seek(0, os.SEEK_END)
+            if file.tell() == 0:
+                return True
+            file.seek(-1, os.SEEK_END)
+            return file.read(1) == b'\n'
+
+    def read(self) -> tuple[dict, list[dict]]:
+        """
+        Read the metadata and the records of the log.
+        A truncated last line (e.g. crash while writing) is ignored.
+        If a question was logged several times, only its last record is kept.
+        """
+        meta = {}
+        records = []
+        with self._lock, open(self.file_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if 'Meta' in entry:
+                    meta = entry['Meta']
+                else:
+                    records.append(entry)
+        last_index = {record.get('Id'): i for i, record in enumerate(records)}
+        records = [record for i, record in enumerate(records) if last_index[record.get('Id')] == i]
+        return meta, records
+
+
+def output_file_of_log(log_file: str) -> str:
+    """
+    Name of the JSON output file corresponding to a log file.
+    """
+    return log_file[:-len(LOG_EXTENSION)] + '.json' if log_file.endswith(LOG_EXTENSION) else log_file + '.json'
+
+
+if __name__ == "__main__":
+    from system_evaluation import write_output_from_log
+    for log_file in sys.argv[1:]:
+        write_output_from_log(RunLog(log_file), output_file_of_log(log_file))
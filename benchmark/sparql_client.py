@@ -0,0 +1,215 @@
+"""
+Clients used by the evaluation to execute SPARQL queries on an endpoint (selected by SPARQL_CLIENT in config.py).
+- SparqlWrapperClient: based on SPARQLWrapper, a new connection is opened for each query.
+- SessionClient: based on a requests session shared by all the queries sent to an endpoint
+  (pool of keep-alive connections, gzip encoded responses and POST for long queries).
+A client returns the JSON results of a query, and raises QueryBadFormed for badly formed queries (HTTP 400)
+and TooManyRequests when the endpoint limits the queries (HTTP 429).
+The results are parsed while they are received, so that huge results can be cut off after a number of rows or bytes.
+Only the fields of the terms used by the evaluation are kept in the rows of the bindings (see TERM_FIELDS).
+"""
+from abc import abstractmethod
+import codecs
+import json
+import re
+import threading
+from typing import Iterable
+import requests
+from requests.adapters import HTTPAdapter
+from SPARQLWrapper import SPARQLWrapper, JSON
+from SPARQLWrapper.SPARQLExceptions import QueryBadFormed
+import config
+
+SPARQLWRAPPER = 'sparqlwrapper'
+SESSION = 'session'
+
+# Size of the chunks read from the responses (in bytes)
+CHUNK_SIZE = 64 * 1024
+
+class TooManyRequests(Exception):
+    """
+    Raised when the endpoint answers 429 Too Many Requests (headers contains the Retry-After header if any).
+    """
+    def __init__(self, headers: dict = None):
+        super().__init__("HTTP Error 429: Too Many Requests")
+        self.headers = headers or {}
+
+class SparqlClient:
+    """
+    Abstract class for a client executing SPARQL queries on an endpoint.
+    """
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+
+    @abstractmethod
+    def query(self, query: str, max_rows: int = None, max_bytes: int = None) -> tuple[dict, bool]:
+        """
+        Execute a query and return its results in the SPARQL JSON format,
+        and whether the bindings were truncated to max_rows rows or max_bytes bytes of response.
+        """
+        pass
+
+
+#####################################
+
+
+class SparqlWrapperClient(SparqlClient):
+    def query(self, query: str, max_rows: int = None, max_bytes: int = None) -> tuple[dict, bool]:
+        # A new wrapper for each query, as a wrapper can't be shared between threads
+        user_agent = config.USER_AGENT # Without it we get 403 error from Wikidata after a few queries
+        sparql = SPARQLWrapper(self.endpoint, agent=user_agent)
+        sparql.setReturnFormat(JSON)
+        sparql.setQuery(query)
+        response = sparql.query().response
+        try:
+            return parse_results(iter(lambda: response.read(CHUNK_SIZE), b''), max_rows, max_bytes)
+        finally:
+            response.close()
+
+
+class SessionClient(SparqlClient):
+    def __init__(self, endpoint: str):
+        super().__init__(endpoint)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.SPARQL_MAX_CONCURRENT_QUERIES)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "User-Agent": config.USER_AGENT, # Without it we get 403 error from Wikidata after a few queries
+            "Accept": "application/sparql-results+json",
+            "Accept-Encoding": "gzip, deflate",
+        })
+
+    def query(self, query: str, max_rows: int = None, max_bytes: int = None) -> tuple[dict, bool]:
+        # Long queries are sent with POST to avoid 414 URI Too Long errors
+        if len(query) > config.SPARQL_POST_THRESHOLD:
+            response = self.session.post(self.endpoint, data={"query": query}, timeout=config.SPARQL_QUERY_TIMEOUT, stream=True)
+        else:
+            response = self.session.get(self.endpoint, params={"query": query}, timeout=config.SPARQL_QUERY_TIMEOUT, stream=True)
+        with response:
+            if response.status_code == 400:
+                raise QueryBadFormed(response.text)
+            if response.status_code == 429:
+                raise TooManyRequests(response.headers)
+            response.raise_for_status()
+            return parse_results(response.iter_content(CHUNK_SIZE), max_rows, max_bytes)
+
+
+#####################################
+
+_BINDINGS_START = re.compile(r'"bindings"\s*:\s*\[')
+# Start of the bindings not received completely yet
+_BINDINGS_PARTIAL_START = re.compile(r'"bindings"\s*(:\s*)?')
+# Fields of the terms kept in the rows: the value is scored, the type gives the type of the answer (BenchmarkResultType),
+# and the datatype and language are compared with SCORING_STRICT_TERMS (possibly later, when an output is rescored)
+TERM_FIELDS = ('type', 'value', 'datatype', 'xml:lang')
+
+def compact_row(row):
+    """
+    Row of the bindings with only the TERM_FIELDS of its terms.
+    """
+    if not isinstance(row, dict):
+        return row
+    return {variable: {field: term[field] for field in TERM_FIELDS if field in term} if isinstance(term, dict) else term
+            for variable, term in row.items()}
+
+def parse_results(chunks: Iterable[bytes], max_rows: int = None, max_bytes: int = None) -> tuple[dict, bool]:
+    """
+    Parse SPARQL JSON results from the chunks of a response, reading the rows of the bindings one by one.
+    Stop reading after max_rows rows or max_bytes bytes (decompressed), in which case the bindings are truncated.
+    Return the results and whether they were truncated.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    received_bytes = 0
+    buffer = ''
+    exhausted = False
+
+    def read_more() -> bool:
+        nonlocal buffer, received_bytes, exhausted
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+            buffer += text_decoder.decode(b'', final=True)
+            return False
+        received_bytes += len(chunk)
+        buffer += text_decoder.decode(chunk)
+        return True
+
+    # Read until the start of the bindings (a response without bindings, e.g. ASK, is parsed at once)
+    match = None
+    search_start = 0 # only the new text is searched
+    while match is None:
+        if not read_more():
+            return json.loads(buffer), False
+        match = _BINDINGS_START.search(buffer, search_start)
+        partial_start = buffer.rfind('"bindings"', search_start)
+        if partial_start != -1 and _BINDINGS_PARTIAL_START.fullmatch(buffer, partial_start):
+            search_start = partial_start
+        else:
+            search_start = max(search_start, len(buffer) - len('"bindings"'))
+    try:
+        results = json.loads(buffer[:match.end()] + ']}}') # head and results, without the bindings
+    except json.JSONDecodeError:
+        results = {"results": {}}
+    bindings = []
+    results.setdefault("results", {})["bindings"] = bindings
+
+    buffer = buffer[match.end():]
+    position = 0
+    while True:
+        # Skip the separators between the rows
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if position == len(buffer):
+            if max_bytes is not None and received_bytes > max_bytes:
+                return results, True
+            buffer = buffer[position:]
+            position = 0
+            if not read_more():
+                raise ValueError("Unexpected end of SPARQL results")
+            continue
+        if buffer[position] == ']':
+            return results, False
+        if max_rows is not None and len(bindings) >= max_rows:
+            return results, True
+        try:
+            row, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if exhausted:
+                raise
+            if max_bytes is not None and received_bytes > max_bytes:
+                return results, True
+            buffer = buffer[position:]
+            position = 0
+            read_more()
+            continue
+        bindings.append(compact_row(row))
+
+
+#####################################
+
+_clients: dict[tuple[str, str], SparqlClient] = {}
+_clients_lock = threading.Lock()
+
+def sparqlClientFactory(client_name: str, endpoint: str) -> SparqlClient:
+    """
+    Factory method to create a SPARQL client.
+    """
+    if client_name == SPARQLWRAPPER:
+        return SparqlWrapperClient(endpoint)
+    elif client_name == SESSION:
+        return SessionClient(endpoint)
+    else:
+        raise ValueError('Unknown SPARQL client name')
+
+def get_sparql_client(endpoint: str) -> SparqlClient:
+    """
+    Get the client shared by all the queries sent to an endpoint (type of client chosen in config.py).
+    """
+    key = (config.SPARQL_CLIENT, endpoint)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = sparqlClientFactory(config.SPARQL_CLIENT, endpoint)
+        return _clients[key]
@@ -0,0 +1,143 @@
+"""
+Local caching proxy for the SPARQL queries sent by Sparklis (suggestions, counts, labels...) while executing commands.
+The same navigation queries are sent again and again across the runs and the strategies of the benchmarks,
+they are answered from a persistent cache instead of the remote endpoint.
+Identical queries received at the same time are only sent once to the endpoint (in-flight coalescing),
+and at most SPARQL_PROXY_MAX_CONCURRENT_QUERIES queries are sent at the same time to each endpoint.
+Only the successful responses are cached.
+
+The proxy is served by api.py under /sparql: http://localhost:8000/sparql/[target] forwards the queries to
+the endpoint SPARQL_PROXY_TARGETS[target], set SPARQL_PROXY to True in config.py to make Sparklis use it.
+It can also be run alone:
+python sparql_proxy.py --port 8002
+"""
+import argparse
+import asyncio
+import fastapi
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
+import httpx
+from persistent_cache import PersistentCache, make_key
+import config
+
+router = fastapi.APIRouter()
+
+_cache: PersistentCache = None
+_client: httpx.AsyncClient = None
+# Limit of the queries sent at the same time, per endpoint
+_endpoint_slots: dict[str, asyncio.Semaphore] = {}
+# Queries being sent to their endpoint, by key (the identical queries received meanwhile wait for the same response)
+_in_flight: dict[str, asyncio.Task] = {}
+
+def responses_cache() -> PersistentCache:
+    """
+    Get the cache of the responses of the endpoints.
+    """
+    global _cache
+    if _cache is None:
+        _cache = PersistentCache(config.SPARQL_PROXY_CACHE_FILE, ttl=config.SPARQL_PROXY_CACHE_TTL)
+    return _cache
+
+def upstream_client() -> httpx.AsyncClient:
+    """
+    Get the client used to send the queries to the endpoints (keep-alive connections, as for the evaluation).
+    """
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(timeout=httpx.Timeout(30, read=config.SPARQL_QUERY_TIMEOUT),
+                                    headers={"User-Agent": config.USER_AGENT})
+    return _client
+
+def endpoint_slots(endpoint: str) -> asyncio.Semaphore:
+    if endpoint not in _endpoint_slots:
+        _endpoint_slots[endpoint] = asyncio.Semaphore(config.SPARQL_PROXY_MAX_CONCURRENT_QUERIES)
+    return _endpoint_slots[endpoint]
+
+def response_key(endpoint: str, params: list[tuple[str, str]], accept: str) -> str:
+    """
+    Key of a query in the cache: its endpoint, its parameters (query, default graph...) and the accepted formats.
+    The method (GET or POST) doesn't change the response.
+    """
+    return make_key(endpoint, sorted(params), accept)
+
+#####################################
+
+async def send_query(endpoint: str, method: str, params: list[tuple[str, str]], accept: str, key: str) -> dict:
+    """
+    Send a query to its endpoint (within the limit of the endpoint), and cache its response if it succeeded.
+    """
+    headers = {"Accept": accept} if accept else {}
+    async with endpoint_slots(endpoint):
+        if method == "POST":
+            response = await upstream_client().post(endpoint, data=params, headers=headers)
+        else:
+            response = await upstream_client().get(endpoint, params=params, headers=headers)
+    entry = {
+        "status": response.status_code,
+        "content_type": response.headers.get("Content-Type"),
+        "body": response.text,
+        "retry_after": response.headers.get("Retry-After"),
+    }
+    if response.status_code == 200:
+        responses_cache().set(key, entry)
+    return entry
+
+async def coalesced_query(endpoint: str, method: str, params: list[tuple[str, str]], accept: str, key: str) -> tuple[dict, bool]:
+    """
+    Response of a query, sent only once to the endpoint if identical queries are received at the same time.
+    Also returns whether the query was already being sent.
+    """
+    task = _in_flight.get(key)
+    coalesced = task is not None
+    if task is None:
+        task = asyncio.ensure_future(send_query(endpoint, method, params, accept, key))
+        _in_flight[key] = task
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+    # shield: a client leaving doesn't cancel the query for the other clients waiting for it
+    return await asyncio.shield(task), coalesced
+
+def entry_response(entry: dict, cache_status: str) -> Response:
+    headers = {"X-Cache": cache_status}
+    if entry.get("retry_after") is not None:
+        headers["Retry-After"] = entry["retry_after"]
+    return Response(entry["body"], status_code=entry["status"], media_type=entry.get("content_type"), headers=headers)
+
+@router.api_route("/{target}", methods=["GET", "POST"])
+async def sparql(target: str, request: fastapi.Request):
+    """
+    SPARQL endpoint forwarding the queries to the endpoint SPARQL_PROXY_TARGETS[target], answered from the cache when possible.
+    """
+    endpoint = config.SPARQL_PROXY_TARGETS.get(target)
+    if endpoint is None:
+        raise fastapi.HTTPException(404, f"Unknown SPARQL endpoint '{target}', known endpoints: {', '.join(config.SPARQL_PROXY_TARGETS)}")
+    params = list(request.query_params.multi_items())
+    if request.method == "POST":
+        content_type = request.headers.get("Content-Type", "")
+        if content_type.startswith("application/sparql-query"):
+            params.append(("query", (await request.body()).decode()))
+        else:
+            params.extend((key, str(value)) for key, value in (await request.form()).multi_items())
+    if not any(key in ("query", "update") for key, _ in params):
+        raise fastapi.HTTPException(400, "Missing query parameter.")
+    accept = request.headers.get("Accept", "")
+
+    key = response_key(endpoint, params, accept)
+    entry = responses_cache().get(key)
+    if entry is not None:
+        return entry_response(entry, "HIT")
+    entry, coalesced = await coalesced_query(endpoint, request.method, params, accept, key)
+    return entry_response(entry, "COALESCED" if coalesced else "MISS")
+
+
+if __name__ == "__main__":
+    import uvicorn
+    parser = argparse.ArgumentParser(description="Run the caching SPARQL proxy alone.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8002)
+    args = parser.parse_args()
+
+    app = fastapi.FastAPI(title="Caching SPARQL proxy")
+    # The page of Sparklis is served from another origin
+    app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+    app.include_router(router, prefix="/sparql")
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,176 @@
+"""
+Run a sweep of benchmark evaluations: every combination of benchmarks, systems, tactics and LLMs of a matrix.
+The matrix is a JSON file, the missing axes take their value in config.py:
+{
+    "Benchmarks": [{"Name": "QALD-10", "File": "Inputs/qald_10_patched.json"},
+                   {"Name": "QALD-9-plus", "File": "Inputs/qald_9_plus_train_wikidata_patched.json"}],
+    "Systems": ["sparklisllm-LLMFrameworkOneShot", "sparklisllm-LLMFrameworkBooleanBySubquestions"],
+    "Tactics": ["best_at_individual_cmd", "beam_search"],
+    "LLMs": ["gpt-4o-mini", "gpt-4.1-mini"],
+    "Exclude": [{"System": "sparklisllm-LLMFrameworkOneShot", "Tactic": "beam_search"}],
+    "NbTests": 3,
+    "MaxParallelJobs": 2
+}
+The files of the benchmarks are relative to the benchmark folder, and a benchmark can have its own "Endpoint" (SPARQL_ENDPOINT by default).
+
+Each combination is a job, with its own configuration (SweepJob) instead of the globals of config.py,
+and its outputs in its own folder. Up to MaxParallelJobs jobs run at the same time, in the same process:
+they share the pool of browsers (NB_WORKERS browsers), the gold results cache and the limits of each endpoint.
+
+python sweep.py sweeps/egc.json --dry-run
+python sweep.py sweeps/egc.json --output-folder Outputs/egc
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+import system_evaluation
+import config
+
+MATRIX_AXES = ['Benchmark', 'System', 'Tactic', 'LLM']
+
+class SweepJob:
+    """
+    Configuration of a job of a sweep (one combination of the matrix), used instead of the globals of config.py.
+    """
+    def __init__(self, benchmark_name: str, benchmark_file: str, endpoint: str, tested_system_name: str,
+                 suggestion_commands_tactic: str, llm_model_name: str, nb_tests: int, output_folder: str):
+        self.benchmark_name = benchmark_name
+        self.benchmark_file = benchmark_file
+        self.endpoint = endpoint
+        self.tested_system_name = tested_system_name
+        self.suggestion_commands_tactic = suggestion_commands_tactic
+        self.llm_model_name = llm_model_name
+        self.nb_tests = nb_tests
+        self.output_folder = output_folder
+
+    @property
+    def name(self) -> str:
+        parts = [self.benchmark_name, self.tested_system_name, self.suggestion_commands_tactic, self.llm_model_name or 'default-llm']
+        return re.sub(r'[^\w.-]+', '-', '_'.join(parts))
+
+    def completed_runs(self) -> int:
+        """
+        Number of runs of the job already done (their output file is written), e.g. before a sweep was interrupted.
+        """
+        if not os.path.isdir(self.output_folder):
+            return 0
+        prefix = self.benchmark_name + '_' + self.tested_system_name + '_'
+        return len([file_name for file_name in os.listdir(self.output_folder)
+                    if file_name.startswith(prefix) and file_name.endswith('.json')])
+
+    def run(self, used_llm: str):
+        """
+        Run the evaluations of the job (one after the other), up to nb_tests runs with the ones already done.
+        An interrupted run is resumed by the first evaluation (see RESUME_INTERRUPTED_RUNS).
+        """
+        nb_runs = max(0, self.nb_tests - self.completed_runs())
+        logging.info(f'Sweep job {self.name} Start ({nb_runs} runs)')
+        for _ in range(nb_runs):
+            system_evaluation.main(self.benchmark_file, self.benchmark_name, self.tested_system_name,
+                                   self.suggestion_commands_tactic, self.endpoint, used_llm,
+                                   output_folder=self.output_folder, llm_model_name=self.llm_model_name)
+        logging.info(f'Sweep job {self.name} End')
+
+def matches(combination: dict, rule: dict) -> bool:
+    """
+    Check if a combination of the matrix matches an exclusion rule (all the values of the rule are the same).
+    """
+    return all(combination.get(key) == value or (key == 'Benchmark' and combination['Benchmark']['Name'] == value)
+               for key, value in rule.items())
+
+def expand_matrix(matrix: dict, output_folder: str) -> list[SweepJob]:
+    """
+    Expand a matrix into the list of its jobs, in the order of the axes (benchmarks first).
+    """
+    axes = {
+        'Benchmark': matrix.get('Benchmarks') or [{'Name': config.BENCHMARK_NAME, 'File': config.BENCHMARK_FILE}],
+        'System': matrix.get('Systems') or [config.TESTED_SYSTEM],
+        'Tactic': matrix.get('Tactics') or [config.SUGGESTION_COMMANDS_TACTIC],
+        'LLM': matrix.get('LLMs') or [config.LLM_API_MODEL_NAME],
+    }
+    jobs = []
+    for values in itertools.product(*[axes[axis] for axis in MATRIX_AXES]):
+        combination = dict(zip(MATRIX_AXES, values))
+        if any(matches(combination, rule) for rule in matrix.get('Exclude', [])):
+            continue
+        benchmark = combination['Benchmark']
+        job = SweepJob(benchmark['Name'], os.path.join(config.script_dir, benchmark['File']),
+                       benchmark.get('Endpoint', config.SPARQL_ENDPOINT), combination['System'], combination['Tactic'],
+                       combination['LLM'], matrix.get('NbTests', config.NB_TESTS), None)
+        job.output_folder = os.path.join(output_folder, job.name)
+        jobs.append(job)
+    return jobs
+
+def check_jobs(jobs: list[SweepJob]) -> list[str]:
+    """
+    Problems preventing the jobs from running (empty if they can all run).
+    """
+    problems = []
+    for job in jobs:
+        if not system_evaluation.is_file_available(job.benchmark_file):
+            problems.append(f"{job.name}: benchmark file '{job.benchmark_file}' is not available.")
+        # Sparklis is always opened on the endpoint of SPARKLIS_LINK
+        if "sparklisllm" in job.tested_system_name and job.endpoint != config.SPARQL_ENDPOINT:
+            problems.append(f"{job.name}: the sparklisllm systems can only be evaluated on SPARQL_ENDPOINT ({config.SPARQL_ENDPOINT}).")
+    if any("sparklisllm" in job.tested_system_name for job in jobs) and not system_evaluation.is_file_available(config.SPARKLIS_FILE):
+        problems.append(f"Sparklis file '{config.SPARKLIS_FILE}' is not available.")
+    if not system_evaluation.is_valid_user_agent(config.USER_AGENT):
+        problems.append(f"Invalid User-Agent: '{config.USER_AGENT}'. It should follow the format 'Product/Version ; email'.")
+    return problems
+
+def run_sweep(jobs: list[SweepJob], max_parallel_jobs: int) -> dict:
+    """
+    Run the jobs, at most max_parallel_jobs at the same time. A failed job doesn't stop the other ones.
+    Returns the error of each failed job, by name.
+    """
+    # The LLMs are checked before starting any job
+    used_llms = {}
+    for job in jobs:
+        key = (job.tested_system_name == "replay", job.llm_model_name)
+        if key not in used_llms:
+            used_llms[key] = system_evaluation.used_llm_name(job.tested_system_name, job.llm_model_name)
+
+    failures = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel_jobs)) as executor:
+        runs = {job.name: executor.submit(job.run, used_llms[(job.tested_system_name == "replay", job.llm_model_name)])
+                for job in jobs}
+        for name, run in runs.items():
+            try:
+                run.result()
+            except Exception as e:
+                logging.exception(f'Sweep job {name} failed')
+                failures[name] = str(e)
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the benchmark evaluations of a matrix of benchmarks, systems, tactics and LLMs.")
+    parser.add_argument("matrix", help="JSON file of the matrix.")
+    parser.add_argument("--output-folder", help="Folder of the outputs, with one subfolder per job (by default OUTPUT_FOLDER/[matrix name]).")
+    parser.add_argument("--max-parallel-jobs", type=int, help="Number of jobs run at the same time (MaxParallelJobs of the matrix, 1 by default).")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the jobs of the matrix.")
+    args = parser.parse_args()
+
+    with open(args.matrix) as file:
+        matrix = json.load(file)
+    output_folder = args.output_folder or os.path.join(config.OUTPUT_FOLDER, os.path.splitext(os.path.basename(args.matrix))[0])
+    jobs = expand_matrix(matrix, output_folder)
+    for job in jobs:
+        print(f"{job.name} ({job.nb_tests} runs) -> {job.output_folder}")
+    if args.dry_run:
+        exit(0)
+
+    problems = check_jobs(jobs)
+    for problem in problems:
+        logging.error(problem)
+    if len(problems) > 0:
+        exit(1)
+
+    failures = run_sweep(jobs, args.max_parallel_jobs or matrix.get('MaxParallelJobs', 1))
+    logging.info(f'Sweep done: {len(jobs) - len(failures)} jobs succeeded, {len(failures)} failed.')
+    if len(failures) > 0:
+        exit(1)
@@ -8,94 +8,190 @@ import datetime
 import time
 import os
 import re
-from SPARQLWrapper import SPARQLWrapper, JSON
+import glob
+import queue
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from SPARQLWrapper.SPARQLExceptions import QueryBadFormed
 import requests
 import benchmark_extraction
+from persistent_cache import PersistentCache, sparql_cache_key
+from run_log import RunLog, LOG_EXTENSION, output_file_of_log
+from rate_limiting import get_endpoint_limiter, retry_after_seconds, backoff_delay
+from sparql_client import SparqlClient, get_sparql_client
+from call_accounting import make_call, calls_usage, calls_stats, SPARQL, EVALUATION
 from test_system import TestSystem, testSystemFactory
 import config
 
 ERROR_PREFIX = "Error: "
 
+# Metadata that must be the same to resume an interrupted run
+RESUME_META_KEYS = ['BenchmarkName', 'TestedSystem', 'SuggestionCommandsTactic', 'Endpoint', 'UsedLLM']
+
+# Category of the time spent in each step of the LLMFramework pipeline, from the function executing the step
+STEP_CATEGORIES = {
+    'step_generation': 'LLM',
+    'step_execute_commands': 'Sparklis',
+    'step_change_or_add_limit': 'Sparklis',
+    'step_change_or_add_offset': 'Sparklis',
+    'step_change_order_type_to_date': 'Sparklis',
+    'step_group_by_and_count': 'Sparklis',
+    'step_remove_ordering_var_from_select': 'Sparklis',
+    'step_get_results': 'Endpoint',
+}
+OTHER_STEP_CATEGORY = 'Other'
+
+# Time (in seconds) spent in each stage of the runs of this process (see harness_benchmark.py)
+# The evaluation of a batch runs in the background, its time overlaps the generation of the next batch
+stage_times = defaultdict(float)
+_stage_times_lock = threading.Lock()
+
+# Cache of the gold results, opened on first use (see gold_results_cache)
+_gold_results_cache: PersistentCache = None
+# One lock per benchmark query being executed, so that concurrent runs (e.g. of sweep.py) execute it only once
+_gold_query_locks: dict[str, threading.Lock] = {}
+_gold_query_locks_lock = threading.Lock()
+
 def main(benchmark_file: str, benchmark_name: str, 
          tested_system_name: str, suggestion_commands_tactic: str, 
-         endpoint: str, used_llm: str):
+         endpoint: str, used_llm: str, output_folder: str = None, llm_model_name: str = None, resume: bool = True):
     """
     Evaluation of a system on a benchmark, based on the configuration in config.py.
+    output_folder and llm_model_name replace OUTPUT_FOLDER and LLM_API_MODEL_NAME for this run (e.g. for the jobs of sweep.py).
+    If resume is False, an interrupted run is not resumed even with RESUME_INTERRUPTED_RUNS (e.g. for the next runs of a series).
     """
+    output_folder = output_folder or config.OUTPUT_FOLDER
     logging.info('########## System evaluation Start ##########')
 
     #This part is only done one time
     now = datetime.datetime.now()
     filename = benchmark_name+'_'+tested_system_name+'_'+now.strftime('%Y%m%d_%H%M%S')+'.json'
     meta: dict = metadata(benchmark_name, tested_system_name, suggestion_commands_tactic, endpoint, used_llm)
-    questions_ids, questions, benchmark_queries, tags = extract_benchmark(benchmark_file, benchmark_name)
-
-    # Create the system object
-    system: TestSystem = testSystemFactory(tested_system_name, suggestion_commands_tactic)
-
-
-    # Initialize empty lists to accumulate results
-    all_system_queries, all_errors, all_steps_status_list, all_reasonings = [], [], [], []
-    all_system_nl_queries = []
-    all_benchmark_results, all_system_results = [], []
-    all_systems_times = []
-    all_responses_types = []
-    all_precisions, all_recalls, all_f1_scores = [], [], []
-
-    # Process in batches (to save incrementally the results in case of crash)
-    batches_dones = 0
-    batch_size = config.BATCH_SIZE
-    for i in range(0, len(questions), batch_size):
-        batch_questions = questions[i:i + batch_size]
-        batch_question_ids = questions_ids[i:i + batch_size]
-        batch_benchmark_queries = benchmark_queries[i:i + batch_size]
-
-        batch_system_queries, batch_system_nl_queries, batch_errors, steps_status_list, batch_reasonings, batch_times = system_queries_generation(
-            batch_questions, system, endpoint
-        )
-        batch_benchmark_results, batch_expected_reponse_types, batch_system_results, batch_errors = queries_evaluation(
-            batch_benchmark_queries, batch_system_queries, batch_errors, endpoint
-        )
-        batch_precisions, batch_recalls, batch_f1_scores = stats_calculation(batch_benchmark_results, batch_system_results)
-        
-        # Append batch results to global lists
-        all_system_queries.extend(batch_system_queries)
-        all_system_nl_queries.extend(batch_system_nl_queries)
-        all_errors.extend(batch_errors)
-        all_steps_status_list.extend(steps_status_list)
-        all_reasonings.extend(batch_reasonings)
-        all_benchmark_results.extend(batch_benchmark_results)
-        all_system_results.extend(batch_system_results)
-        all_systems_times.extend(batch_times)
-        all_responses_types.extend(batch_expected_reponse_types)
-        all_precisions.extend(batch_precisions)
-        all_recalls.extend(batch_recalls)
-        all_f1_scores.extend(batch_f1_scores)
-
-        # Rewrite the file after each batch
-        data = make_dict(meta, questions_ids[: len(all_system_queries)], questions[: len(all_system_queries)], 
-                         tags[: len(all_system_queries)],
-                         benchmark_queries[: len(all_system_queries)], all_system_queries, 
-                         all_system_nl_queries,
-                         all_benchmark_results, all_system_results, 
-                         all_systems_times, all_responses_types,
-                         all_errors, all_steps_status_list, all_reasonings,
-                         all_precisions, all_recalls, all_f1_scores)
-        
-        os.makedirs(config.OUTPUT_FOLDER, exist_ok=True)  # Ensure the directory exists
-        with open(config.OUTPUT_FOLDER + filename, 'w') as file:
-            json.dump(data, file, indent=4)
-        
-        batches_dones += 1
-        logging.info(f'Batch {batches_dones} done.')
-
-    #close the system
-    system.end_system()
+    with timed_stage('Extraction'):
+        questions_ids, questions, benchmark_queries, tags = extract_benchmark(benchmark_file, benchmark_name)
+
+    # Create the system objects (one per worker, the browsers are shared through a pool with one browser per worker)
+    nb_workers = max(1, config.NB_WORKERS)
+    systems: list[TestSystem] = [testSystemFactory(tested_system_name, suggestion_commands_tactic, llm_model_name) for _ in range(nb_workers)]
+
+    try:
+        # Each evaluated question is appended to the log of the run (to keep the results in case of crash)
+        # (the selected questions are part of it, they depend on BENCHMARK_QUESTIONS_FILTER)
+        run_info = {'BenchmarkFile': os.path.basename(benchmark_file), 'LanguageQuestions': config.LANGUAGE_QUESTIONS,
+                    'QuestionsIds': sorted(questions_ids, key=str)}
+        if tested_system_name == 'replay':
+            run_info['ReplayedOutputFile'] = os.path.basename(config.REPLAY_OUTPUT_FILE)
+        run_log = find_interrupted_run_log(meta, run_info, output_folder) if config.RESUME_INTERRUPTED_RUNS and resume else None
+        all_questions_ids = questions_ids
+        if run_log is not None:
+            # Resume the interrupted run: skip the questions already evaluated
+            filename = os.path.basename(output_file_of_log(run_log.file_path))
+            done_ids = {record['Id'] for record in run_log.read()[1]}
+            logging.info(f'Resuming the interrupted run {run_log.file_path} ({len(done_ids)} questions already evaluated).')
+            tags = tags + [[]] * (len(questions) - len(tags))
+            remaining = [i for i in range(len(questions)) if questions_ids[i] not in done_ids]
+            questions_ids = [questions_ids[i] for i in remaining]
+            questions = [questions[i] for i in remaining]
+            benchmark_queries = [benchmark_queries[i] for i in remaining]
+            tags = [tags[i] for i in remaining]
+        else:
+            run_log = RunLog.create(os.path.join(output_folder, filename[:-len('.json')] + LOG_EXTENSION), meta, run_info)
+
+        # Process in batches
+        # The queries of a batch are evaluated in the background while the next batch is generated
+        # (one batch at a time, to keep the order of the questions in the log)
+        evaluation_executor = ThreadPoolExecutor(max_workers=1)
+        evaluations = []
+        batch_size = max(config.BATCH_SIZE, nb_workers) # each worker needs at least one question per batch
+        try:
+            for i in range(0, len(questions), batch_size):
+                batch_questions = questions[i:i + batch_size]
+                batch_question_ids = questions_ids[i:i + batch_size]
+                batch_benchmark_queries = benchmark_queries[i:i + batch_size]
+                batch_tags = [tags[j] if j < len(tags) else [] for j in range(i, i + len(batch_questions))]
+
+                with timed_stage('Generation'):
+                    batch_system_queries, batch_system_nl_queries, batch_errors, steps_status_list, batch_reasonings, batch_times, batch_calls = system_queries_generation(
+                        batch_questions, systems, endpoint
+                    )
+                evaluations.append(evaluation_executor.submit(
+                    batch_evaluation, run_log, endpoint, len(evaluations) + 1,
+                    batch_question_ids, batch_questions, batch_tags,
+                    batch_benchmark_queries, batch_system_queries, batch_system_nl_queries,
+                    batch_errors, steps_status_list, batch_reasonings, batch_times, batch_calls
+                ))
+                # Stop early if the evaluation of a previous batch failed
+                for evaluation in evaluations:
+                    if evaluation.done():
+                        evaluation.result()
+        finally:
+            evaluation_executor.shutdown(wait=True)
+        for evaluation in evaluations:
+            evaluation.result()
+
+        # The output file is only written once, from the log
+        with timed_stage('Output'):
+            write_output_from_log(run_log, os.path.join(output_folder, filename), all_questions_ids)
+        if not config.KEEP_RUN_LOGS:
+            os.remove(run_log.file_path)
+    finally:
+        # close the systems (also when the run failed, e.g. to close the shared browsers at the end of a sweep)
+        for system in systems:
+            system.end_system()
 
     logging.info('########## System evaluation End ##########')
 
 
+@contextmanager
+def timed_stage(stage: str):
+    """
+    Add the time spent in the block to the time of the stage in stage_times.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _stage_times_lock:
+            stage_times[stage] += time.perf_counter() - start
+
+def batch_evaluation(run_log: RunLog, endpoint: str, batch_number: int,
+                     questions_ids: list, questions: list, tags: list,
+                     benchmark_queries: list, system_queries: list, system_nl_queries: list,
+                     errors: list, steps_status_list: list, reasonings: list, times: list, calls_list: list):
+    """
+    Evaluate the generated queries of a batch, calculate their scores and append them to the log of the run.
+    The SPARQL calls of the evaluation are added to the calls of each question.
+    """
+    with timed_stage('Evaluation'):
+        benchmark_results, expected_reponse_types, system_results, errors = queries_evaluation(
+            benchmark_queries, system_queries, errors, endpoint, calls_list
+        )
+    with timed_stage('Scoring'):
+        precisions, recalls, f1_scores = stats_calculation(benchmark_results, system_results)
+        run_log.append(make_records(questions_ids, questions, tags,
+                                    benchmark_queries, system_queries, system_nl_queries,
+                                    benchmark_results, system_results,
+                                    times, expected_reponse_types,
+                                    errors, steps_status_list, reasonings,
+                                    precisions, recalls, f1_scores, calls_list))
+    logging.info(f'Batch {batch_number} done.')
+
+def find_interrupted_run_log(meta: dict, run_info: dict, output_folder: str = None) -> RunLog:
+    """
+    Find the log of an interrupted run with the same configuration in the output folder (OUTPUT_FOLDER by default), or None.
+    A run is interrupted if its log exists without its output file.
+    """
+    for log_file in sorted(glob.glob(os.path.join(output_folder or config.OUTPUT_FOLDER, '*' + LOG_EXTENSION)), reverse=True):
+        if os.path.exists(output_file_of_log(log_file)):
+            continue
+        run_log = RunLog(log_file)
+        log_meta, log_run_info = run_log.read_header()
+        if all(log_meta.get(key) == meta.get(key) for key in RESUME_META_KEYS) and log_run_info == run_info:
+            return run_log
+    return None
+
 def metadata(benchmark_name: str, tested_system_name: str, suggestion_commands_tactic: str, endpoint: str, used_llm: str) -> dict:
     """
     Create a metadata dictionary.
@@ -119,27 +215,52 @@ def extract_benchmark(benchmark_file: str, benchmark_name: str) -> list:
     return extractor.extractData(benchmark_file, config.LANGUAGE_QUESTIONS, 
                                  config.BENCHMARK_QUESTIONS_FILTER)
 
-def system_queries_generation(questions: list, system: TestSystem, endpoint_sparql: str) -> tuple[list, list, list, list, list]:
+def system_queries_generation(questions: list, systems: list[TestSystem], endpoint_sparql: str) -> tuple[list, list, list, list, list, list, list]:
     """
-    Use the tested system and SPARQL endpoint to generate queries for the given questions.
+    Use the tested systems and SPARQL endpoint to generate queries for the given questions.
+    With several systems, the questions are dispatched from a shared queue to one worker thread per system.
+    The results are always returned in the order of the questions.
     """
     logging.info('System queries generation Start')
-    queries = []
-    nl_queries = []
-    errors = []
-    steps_status_list = []
-    reasonings = []
-    times = []
-    for question in questions:
-        current_time = datetime.datetime.now()
-        query, nl_query, error, steps_status, reasoning = system.create_query(question, endpoint_sparql)
-        queries.append(query)
-        nl_queries.append(nl_query)
-        errors.append(error)
-        steps_status_list.append(steps_status)
-        reasonings.append(reasoning)
-        times.append((datetime.datetime.now() - current_time).total_seconds())
-    return queries, nl_queries, errors, steps_status_list, reasonings, times
+    answers = [None] * len(questions)
+    if len(systems) == 1:
+        for i, question in enumerate(questions):
+            answers[i] = timed_query_creation(systems[0], question, endpoint_sparql)
+    else:
+        questions_queue = queue.Queue()
+        for i, question in enumerate(questions):
+            questions_queue.put((i, question))
+
+        def worker(system: TestSystem):
+            while True:
+                try:
+                    i, question = questions_queue.get_nowait()
+                except queue.Empty:
+                    return
+                answers[i] = timed_query_creation(system, question, endpoint_sparql)
+
+        workers = [threading.Thread(target=worker, args=(system,)) for system in systems]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+    queries = [answer[0] for answer in answers]
+    nl_queries = [answer[1] for answer in answers]
+    errors = [answer[2] for answer in answers]
+    steps_status_list = [answer[3] for answer in answers]
+    reasonings = [answer[4] for answer in answers]
+    times = [answer[5] for answer in answers]
+    calls_list = [answer[6] for answer in answers]
+    return queries, nl_queries, errors, steps_status_list, reasonings, times, calls_list
+
+def timed_query_creation(system: TestSystem, question: str, endpoint_sparql: str) -> tuple[str, str, str, str, str, float, list]:
+    """
+    Create the query of a single question and measure the time taken by the system (in seconds).
+    """
+    current_time = datetime.datetime.now()
+    query, nl_query, error, steps_status, reasoning, calls = system.create_query(question, endpoint_sparql)
+    return query, nl_query, error, steps_status, reasoning, (datetime.datetime.now() - current_time).total_seconds(), calls
 
 def find_response_type(response: dict) -> str:
     """
@@ -154,68 +275,135 @@ def find_response_type(response: dict) -> str:
     else:
         return 'unknown'
 
-def queries_evaluation(benchmark_queries: list, system_queries: list, errors: list, endpoint: str) -> tuple[list, list, list, list]:
+def queries_evaluation(benchmark_queries: list, system_queries: list, errors: list, endpoint: str,
+                       calls_list: list = None, stored_system_results: list = None) -> tuple[list, list, list, list]:
     """
     Execute the benchmark and system queries on the SPARQL endpoint and return the results.
+    All the queries are executed concurrently, within the limits of the endpoint (see rate_limiting.py).
+    If calls_list is given, the executed queries are added to the calls of their question.
+    If stored_system_results is given, the system queries are not executed and these results are used instead (see rescore.py).
     """
+    if calls_list is None:
+        calls_list = [[] for _ in benchmark_queries]
     logging.info('Queries evaluation Start')
-    user_agent = config.USER_AGENT # Without it we get 403 error from Wikidata after a few queries
-    sparql = SPARQLWrapper(endpoint, agent=user_agent)
-    sparql.setReturnFormat(JSON)
-    logging.info('Wrapper set')
-    benchmark_results = []
-    system_results = []
-    expected_response_types = []
-    for i, (b_query, s_query) in enumerate(zip(benchmark_queries, system_queries)):
-        # Execute benchmark query
-        benchmark_result, benchmark_error = execute_query(sparql, b_query, i, 'Benchmark')
-        expected_response_types.append(find_response_type(benchmark_result)) # Find the response type of the benchmark query
-        benchmark_results.append(benchmark_result)
-        errors[i] += benchmark_error
-        
-        # Execute system query
-        if s_query is None or s_query == '':  # Skip system query if it's empty
-            system_result, system_error = None, 'Warning: No query to execute;'
-        else:
-            system_result, system_error = execute_query(sparql, s_query, i, 'System')
+    # The threads mostly wait for the endpoint, no more than the queries it accepts at the same time (benchmark and system queries)
+    with ThreadPoolExecutor(max_workers=max(1, 2 * min(len(benchmark_queries), config.SPARQL_MAX_CONCURRENT_QUERIES))) as executor:
+        sparql = get_sparql_client(endpoint)
+        benchmark_executions = [executor.submit(execute_benchmark_query, sparql, b_query, i, endpoint, calls_list[i])
+                                for i, b_query in enumerate(benchmark_queries)]
+        system_executions = [None if s_query is None or s_query == '' or stored_system_results is not None # Skip system query if it's empty
+                             else executor.submit(execute_query, sparql, s_query, i, 'System',
+                                                  config.SPARQL_MAX_RESULT_ROWS, config.SPARQL_MAX_RESULT_BYTES, calls_list[i])
+                             for i, s_query in enumerate(system_queries)]
+
+        benchmark_results = []
+        system_results = []
+        expected_response_types = []
+        for i, (benchmark_execution, system_execution) in enumerate(zip(benchmark_executions, system_executions)):
+            benchmark_result, benchmark_error = benchmark_execution.result()
+            expected_response_types.append(find_response_type(benchmark_result)) # Find the response type of the benchmark query
+            benchmark_results.append(benchmark_result)
+            errors[i] += benchmark_error
+
+            if stored_system_results is not None:
+                system_result, system_error = stored_system_results[i], ''
+            elif system_execution is None:
+                system_result, system_error = None, 'Warning: No query to execute;'
+            else:
+                system_result, system_error = system_execution.result()
+            system_results.append(system_result)
+            errors[i] += system_error
 
-        system_results.append(system_result)
-        errors[i] += system_error
-                
-        logging.info(f'Query {i} evaluated')
+            logging.info(f'Query {i} evaluated')
     return benchmark_results, expected_response_types, system_results, errors
 
-def execute_query(sparql, query: str, query_index: int, query_type: str) -> tuple:
+def gold_results_cache() -> PersistentCache:
+    """
+    Get the cache of the gold results, or None if it is disabled.
+    """
+    global _gold_results_cache
+    if config.GOLD_RESULTS_CACHE and _gold_results_cache is None:
+        _gold_results_cache = PersistentCache(config.GOLD_RESULTS_CACHE_FILE, ttl=config.GOLD_RESULTS_CACHE_TTL)
+    return _gold_results_cache if config.GOLD_RESULTS_CACHE else None
+
+def execute_benchmark_query(sparql: SparqlClient, query: str, query_index: int, endpoint: str, calls: list = None) -> tuple:
+    """
+    Executes a benchmark query, reusing its results from the gold results cache if possible.
+    Only the results obtained without error are cached.
+    A query already being executed (by another run on the same endpoint) is waited for, and its results are taken from the cache.
+    """
+    cache = gold_results_cache()
+    if cache is None:
+        return execute_query(sparql, query, query_index, 'Benchmark', calls=calls)
+
+    key = sparql_cache_key(endpoint, query)
+    with _gold_query_locks_lock:
+        query_lock = _gold_query_locks.setdefault(key, threading.Lock())
+    with query_lock:
+        if not config.GOLD_RESULTS_CACHE_REFRESH:
+            cached_result = cache.get(key)
+            if cached_result is not None:
+                logging.info(f"Query {query_index} (Benchmark) results found in cache.")
+                return cached_result, ""
+
+        result, error = execute_query(sparql, query, query_index, 'Benchmark', calls=calls)
+        if error == "" and result is not None:
+            cache.set(key, result)
+        return result, error
+
+def execute_query(sparql: SparqlClient, query: str, query_index: int, query_type: str,
+                  max_rows: int = None, max_bytes: int = None, calls: list = None) -> tuple:
     """
     Executes a SPARQL query with retry logic on 429 errors and handles both SELECT and ASK queries.
+    The query waits for the limits of its endpoint, and is retried at most SPARQL_MAX_RETRIES times
+    after the delay asked by the endpoint (Retry-After) or a capped exponential backoff.
+    The bindings of a SELECT query are truncated after max_rows rows or max_bytes bytes of response, with a warning.
+    If calls is given, each attempt is added to it (see call_accounting.py).
     """
-    while True:
+    limiter = get_endpoint_limiter(sparql.endpoint)
+    def record_call(start: float, status):
+        if calls is not None:
+            calls.append(make_call(SPARQL, EVALUATION, time.perf_counter() - start, status))
+    for attempt in range(config.SPARQL_MAX_RETRIES + 1):
+        start = time.perf_counter()
         try:
-            sparql.setQuery(query)
-            result = sparql.query().convert()
+            with limiter:
+                start = time.perf_counter() # the waiting time of the limits is not part of the latency
+                result, truncated = sparql.query(query, max_rows, max_bytes)
+            record_call(start, 200)
             
             if "boolean" in result:  # ASK Query
                 return result["boolean"], ""
             elif "results" in result and "bindings" in result["results"]:  # SELECT Query
-                return result["results"]["bindings"], ""
+                bindings = result["results"]["bindings"]
+                if truncated:
+                    logging.warning(f"Query {query_index} ({query_type}) results truncated to {len(bindings)} rows.")
+                    return bindings, f"Warning: {query_type} query results truncated to {len(bindings)} rows;"
+                return bindings, ""
             else:
                 logging.error(f"Unexpected response format for query {query_index} ({query_type}): {result}")
                 return None, ERROR_PREFIX + "Unexpected response format."
 
         except QueryBadFormed as e:
+            record_call(start, 400)
             logging.error(f"Query {query_index} ({query_type}) is badly formed: {e}")
             return None, ERROR_PREFIX + query_type + " query is badly formed."
         except Exception as e:
             error_message = str(e)
-            if "429" in error_message:  # Detect 429 Too Many Requests
-                retry_after = 5  # Default retry time
-                if hasattr(e, "headers") and "Retry-After" in e.headers:
-                    retry_after = int(e.headers["Retry-After"])
-                logging.warning(f"Query {query_index} ({query_type}) hit 429 Too Many Requests. Retrying after {retry_after} seconds.")
-                time.sleep(retry_after)
-            else:
+            record_call(start, 429 if "429" in error_message else "error")
+            if "429" not in error_message:  # Detect 429 Too Many Requests
                 logging.error(f"Error executing query {query_index} ({query_type}): {e}")
                 return None, ERROR_PREFIX + query_type + " query execution failed."
+            if attempt == config.SPARQL_MAX_RETRIES:
+                break
+            retry_after = retry_after_seconds(getattr(e, "headers", None))
+            if retry_after is None:
+                retry_after = backoff_delay(attempt, config.SPARQL_BACKOFF_BASE, config.SPARQL_BACKOFF_MAX)
+            retry_after = min(retry_after, config.SPARQL_BACKOFF_MAX) # an endpoint can't stall a worker longer
+            logging.warning(f"Query {query_index} ({query_type}) hit 429 Too Many Requests. Retrying after {retry_after:.1f} seconds.")
+            time.sleep(retry_after)
+    logging.error(f"Query {query_index} ({query_type}) still hit 429 Too Many Requests after {config.SPARQL_MAX_RETRIES} retries.")
+    return None, ERROR_PREFIX + query_type + " query execution failed (too many requests)."
             
 def recursive_dict_extract(obj: dict, key_name: str) -> list:
     """
@@ -232,12 +420,42 @@ def recursive_dict_extract(obj: dict, key_name: str) -> list:
             values.extend(recursive_dict_extract(item, key_name))  # Handle lists as well
     return values
 
-def remove_duplicates(original_list: list) -> list:
-    unique_list = []
-    for item in original_list:
-        if item not in unique_list:
-            unique_list.append(item)
-    return unique_list
+def term_key(term: dict, value, strict: bool):
+    """
+    Canonical hashable key of a value of a SPARQL result, used to compare results as sets.
+    If strict, the type, datatype and language of the term are part of the key (e.g. "1"^^xsd:integer != "1"^^xsd:decimal),
+    else only the value is compared (default behaviour of the evaluation).
+    """
+    if not isinstance(value, (str, int, float, bool)) and value is not None:
+        value = json.dumps(value, sort_keys=True) # non hashable values (unexpected format) are compared by their JSON representation
+    if not strict:
+        return value
+    term_type = term.get('type')
+    if term_type == 'typed-literal': # older name of typed literals in the SPARQL JSON format
+        term_type = 'literal'
+    return (term_type, term.get('datatype'), term.get('xml:lang'), value)
+
+def result_keys(result, strict: bool = False) -> set:
+    """
+    Set of the canonical keys of all the values of a SPARQL result (boolean for ASK queries, list of bindings for SELECT queries).
+    As with recursive_dict_extract, all the 'value' fields are considered, whatever the name of their variable.
+    """
+    if isinstance(result, bool):
+        return {result}
+    keys = set()
+    if not isinstance(result, list):
+        return keys
+    stack = [result]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            for key, val in item.items():
+                if key == 'value':
+                    keys.add(term_key(item, val, strict))
+                stack.append(val)
+        elif isinstance(item, list):
+            stack.extend(item)
+    return keys
 
 def stats_calculation(benchmark_results: list, system_results: list) -> tuple[list, list, list]:
     """
@@ -247,50 +465,75 @@ def stats_calculation(benchmark_results: list, system_results: list) -> tuple[li
     precisions = []
     recalls = []
     f1_scores = []
-    for i in range(len(benchmark_results)):
-        benchmark_list = []
-        system_list = []
-        if benchmark_results[i] is not None:
-            if isinstance(benchmark_results[i], bool):  # Handle ASK query
-                benchmark_list = [benchmark_results[i]]
-            elif isinstance(benchmark_results[i], list) and len(benchmark_results[i]) > 0:  # Handle SELECT query
-                benchmark_list = recursive_dict_extract(benchmark_results[i], 'value')
-
-        if system_results[i] is not None:
-            if isinstance(system_results[i], bool):  # Handle ASK query
-                system_list = [system_results[i]]
-            elif isinstance(system_results[i], list) and len(system_results[i]) > 0:  # Handle SELECT query
-                system_list = recursive_dict_extract(system_results[i], 'value')
-
-        # not a real set to avoid errors with non hashable items
-        benchmark_set = remove_duplicates(benchmark_list)
-        system_set = remove_duplicates(system_list)
+    for benchmark_result, system_result in zip(benchmark_results, system_results):
+        benchmark_set = result_keys(benchmark_result, config.SCORING_STRICT_TERMS)
+        system_set = result_keys(system_result, config.SCORING_STRICT_TERMS)
         if len(benchmark_set) > 0 and len(system_set) > 0:
-            intersection = [d for d in benchmark_set if d in system_set]
-            precisions.append(len(intersection) / len(system_set))
-            recalls.append(len(intersection) / len(benchmark_set))
-            f1_scores.append(2 * len(intersection) / (len(benchmark_set) + len(system_set)))
-        elif len(benchmark_list) == 0: # If the benchmark has no results, we don't consider the question
+            intersection = len(benchmark_set & system_set)
+            precisions.append(intersection / len(system_set))
+            recalls.append(intersection / len(benchmark_set))
+            f1_scores.append(2 * intersection / (len(benchmark_set) + len(system_set)))
+        elif len(benchmark_set) == 0: # If the benchmark has no results, we don't consider the question
             precisions.append(None)
             recalls.append(None)
             f1_scores.append(None)
-        elif len(system_list) == 0: # If the system has no results, the precision is 0, the f1 and recall are 0
+        elif len(system_set) == 0: # If the system has no results, the precision is 0, the f1 and recall are 0
             precisions.append(0) # Usually the precision is set to 1, but setting it to 0 eases the tracking of ameliorations
             recalls.append(0)
             f1_scores.append(0)
     return precisions, recalls, f1_scores
 
+def steps_timings(steps_status: str) -> list[dict]:
+    """
+    Timings of the steps of a question, from its StepsStatus (steps stamped with their start and end times in ms).
+    The start of each step is given in seconds from the start of the first step, its duration is None if it didn't end.
+    """
+    try:
+        steps = json.loads(steps_status) if steps_status else {}
+    except (json.JSONDecodeError, TypeError):
+        return []
+    if not isinstance(steps, dict):
+        return []
+    steps = [step for _, step in sorted(steps.items(), key=lambda item: int(item[0])) if step.get('Start') is not None]
+    if len(steps) == 0:
+        return []
+    origin = steps[0]['Start']
+    return [{
+        'Name': step.get('Name'),
+        'Function': step.get('Function'),
+        'Category': STEP_CATEGORIES.get(step.get('Function'), OTHER_STEP_CATEGORY),
+        'Status': step.get('Status'),
+        'Start': (step['Start'] - origin) / 1000,
+        'Duration': (step['End'] - step['Start']) / 1000 if step.get('End') is not None else None,
+    } for step in steps]
+
+def steps_categories_stats(timings_list: list[list[dict]]) -> dict:
+    """
+    Mean time spent per question in each category of steps (only for the questions with timings).
+    """
+    timed = [timings for timings in timings_list if len(timings) > 0]
+    if len(timed) == 0:
+        return {}
+    stats = {}
+    for category in sorted(set(STEP_CATEGORIES.values())) + [OTHER_STEP_CATEGORY]:
+        total = sum(step['Duration'] for timings in timed for step in timings
+                    if step['Category'] == category and step['Duration'] is not None)
+        stats[f'Mean{category}StepsTime'] = total / len(timed)
+    return stats
+
 def make_dict(meta: dict, questions_ids: list, questions: list,
               tags: list, 
               benchmark_queries: list, system_queries: list, system_nl_queries: list,
               benchmark_results: list, 
               system_results: list, all_system_times: list, all_responses_types: list,
               errors: list, steps_status: list, reasoning: list, 
-              precisions: list, recalls: list, f1_scores: list) -> dict:
+              precisions: list, recalls: list, f1_scores: list, calls: list = None) -> dict:
     """
     Create a dictionary with all the data.
     Also calculate the stats.
     """
+    if calls is None:
+        calls = [[] for _ in questions_ids]
     logging.info('Make dict Start')
 
     # Global stats
@@ -346,6 +589,13 @@ def make_dict(meta: dict, questions_ids: list, questions: list,
         stats['MeanRecallLiteral'] = sum([recalls[i] for i in literal_ids]) / len(literal_ids)
         stats['MeanF1ScoreLiteral'] = sum([f1_scores[i] for i in literal_ids]) / len(literal_ids)
 
+    # Global stats of the LLM and SPARQL calls (tokens, latencies and cost)
+    stats.update(calls_stats(calls))
+
+    # Global stats of the time spent in the steps of the system
+    timings_list = [steps_timings(status) for status in steps_status]
+    stats.update(steps_categories_stats(timings_list))
+
     # Add all the relevant data in the same dictionary
     data = {}
     for i in range(len(questions_ids)):
@@ -354,6 +604,7 @@ def make_dict(meta: dict, questions_ids: list, questions: list,
             'Tags' : tags[i] if i < len(tags) else [],  # Ensure to create an empty list if tags are not provided
             **({'Error': errors[i]} if errors[i] != '' else {}), # only add if it's not an empty string
             'StepsStatus' : steps_status[i],
+            **({'StepsTimings': timings_list[i]} if len(timings_list[i]) > 0 else {}), # only add if the steps were timed
             'Precision' : precisions[i],
             'Recall' : recalls[i],
             'F1Score' : f1_scores[i],
@@ -364,10 +615,77 @@ def make_dict(meta: dict, questions_ids: list, questions: list,
             'BenchmarkResultType' : all_responses_types[i],
             'BenchmarkResult' : benchmark_results[i],
             'SystemResult' : system_results[i],
-            'Reasoning' : reasoning[i]
+            'Reasoning' : reasoning[i],
+            **({'Usage': calls_usage(calls[i]), 'Calls': calls[i]} if len(calls[i]) > 0 else {}) # only add if calls were recorded
         }
     return {**meta, 'Stats' : stats, 'Data' : data}
 
+def make_records(questions_ids: list, questions: list,
+                 tags: list,
+                 benchmark_queries: list, system_queries: list, system_nl_queries: list,
+                 benchmark_results: list,
+                 system_results: list, all_system_times: list, all_responses_types: list,
+                 errors: list, steps_status: list, reasoning: list,
+                 precisions: list, recalls: list, f1_scores: list, calls: list = None) -> list[dict]:
+    """
+    Create the records of the run log, one for each evaluated question.
+    """
+    records = []
+    for i in range(len(questions_ids)):
+        records.append({
+            'Id' : questions_ids[i],
+            'Question' : questions[i],
+            'Tags' : tags[i],
+            'Error' : errors[i],
+            'StepsStatus' : steps_status[i],
+            'Precision' : precisions[i],
+            'Recall' : recalls[i],
+            'F1Score' : f1_scores[i],
+            'BenchmarkQuery' : benchmark_queries[i],
+            'SystemQuery' : system_queries[i],
+            'SystemNLQuery': system_nl_queries[i],
+            'SystemTime' : all_system_times[i],
+            'BenchmarkResultType' : all_responses_types[i],
+            'BenchmarkResult' : benchmark_results[i],
+            'SystemResult' : system_results[i],
+            'Reasoning' : reasoning[i],
+            'Calls' : calls[i] if calls is not None else []
+        })
+    return records
+
+def make_dict_from_records(meta: dict, records: list[dict]) -> dict:
+    """
+    Create the dictionary with all the data (and the stats) from the records of a run log.
+    """
+    column = lambda key: [record[key] for record in records]
+    return make_dict(meta, column('Id'), column('Question'), column('Tags'),
+                     column('BenchmarkQuery'), column('SystemQuery'), column('SystemNLQuery'),
+                     column('BenchmarkResult'), column('SystemResult'),
+                     column('SystemTime'), column('BenchmarkResultType'),
+                     column('Error'), column('StepsStatus'), column('Reasoning'),
+                     column('Precision'), column('Recall'), column('F1Score'),
+                     [record.get('Calls', []) for record in records])
+
+def write_output_from_log(run_log: RunLog, output_file: str, questions_order: list = None):
+    """
+    Write the JSON output of a run from its log.
+    If questions_order (list of questions ids) is given, the questions are sorted in this order (e.g. for a resumed run)
+    and the questions which are not in it are left out.
+    """
+    meta, records = run_log.read()
+    if questions_order is not None:
+        position = {question_id: i for i, question_id in enumerate(questions_order)}
+        records = [record for record in records if record['Id'] in position]
+        records.sort(key=lambda record: position[record['Id']])
+    if len(records) == 0:
+        logging.warning(f'No evaluated question in {run_log.file_path}, no output written.')
+        return
+    data = make_dict_from_records(meta, records)
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)  # Ensure the directory exists
+    with open(output_file, 'w') as file:
+        json.dump(data, file, indent=4)
+    logging.info(f'Output written in {output_file}')
+
 def getModelName(models_api: str, model_name: str = None, api_key: str = None) -> str:
     """
     Get the name of the used LLM model from the model API.
@@ -400,6 +718,15 @@ def getModelName(models_api: str, model_name: str = None, api_key: str = None) -
         logging.error("Unexpected response format from the LLM API. Please check that the API is running and the endpoint is correct. You could also have forgot to define your API key in the config.py file.")
         exit(1)
 
+def used_llm_name(tested_system_name: str, llm_model_name: str = None) -> str:
+    """
+    Name of the LLM used by a run (for a replayed run, the model that generated its queries).
+    """
+    if tested_system_name == "replay":
+        with open(config.REPLAY_OUTPUT_FILE) as file:
+            return json.load(file).get('UsedLLM')
+    return getModelName(config.LLM_API_MODELS, llm_model_name or config.LLM_API_MODEL_NAME, config.LLM_API_KEY)
+
 def is_file_available(file_url: str) -> bool:
     """
     Checks if a file is available either locally or over the network.
@@ -441,10 +768,11 @@ if __name__ == "__main__":
     if not is_file_available(config.BENCHMARK_FILE):
         logging.error(f"Benchmark file '{config.BENCHMARK_FILE}' is not available.")
         exit(1)
-    logging.info("Sparklis file: " + config.SPARKLIS_FILE)
-    if not is_file_available(config.SPARKLIS_FILE):
-        logging.error(f"Sparklis file '{config.SPARKLIS_FILE}' is not available.")
-        exit(1)
+    if "sparklisllm" in config.TESTED_SYSTEM:
+        logging.info("Sparklis file: " + config.SPARKLIS_FILE)
+        if not is_file_available(config.SPARKLIS_FILE):
+            logging.error(f"Sparklis file '{config.SPARKLIS_FILE}' is not available.")
+            exit(1)
     if not is_valid_user_agent(config.USER_AGENT):
         logging.error(f"Invalid User-Agent: '{config.USER_AGENT}'. It should follow the format 'Product/Version ; email'.")
         exit(1)
@@ -452,10 +780,10 @@ if __name__ == "__main__":
     logging.info("SPARQL endpoint: " + config.SPARQL_ENDPOINT)
 
     # Get the name of the used LLM model
-    used_llm = getModelName(config.LLM_API_MODELS, config.LLM_API_MODEL_NAME, config.LLM_API_KEY)
+    used_llm = used_llm_name(config.TESTED_SYSTEM)
     logging.info(f"Used LLM model: {used_llm}")
 
-    # Start the evaluation
-    for _ in range(config.NB_TESTS):
+    # Start the evaluation (only the first run resumes an interrupted run, it is one of the NB_TESTS runs)
+    for i in range(config.NB_TESTS):
         main(config.BENCHMARK_FILE, config.BENCHMARK_NAME, config.TESTED_SYSTEM, 
-            config.SUGGESTION_COMMANDS_TACTIC, config.SPARQL_ENDPOINT, used_llm)
+            config.SUGGESTION_COMMANDS_TACTIC, config.SPARQL_ENDPOINT, used_llm, resume=(i == 0))
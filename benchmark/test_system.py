@@ -4,34 +4,46 @@ SparklisLLM corresponds to the ALASQA system.
 If you want to test another system, you can create a new class that inherits from TestSystem (and update the factory method testSystemFactory).
 """
 from abc import abstractmethod
+import functools
+import json
+import re
+import threading
+import time
+import requests
 import interactions
+from call_accounting import make_call, LLM
+from driver_pool import DriverPool
 import config
 class TestSystem:
     """
     Abstract class for a tested system.
     A system is used to create queries from questions and endpoints.
+    The LLM used by the system is llm_model_name, or LLM_API_MODEL_NAME of config.py by default.
     """
-    def __init__(self, system_name: str, suggestion_commands_tactic: str):
+    def __init__(self, system_name: str, suggestion_commands_tactic: str, llm_model_name: str = None):
         self.system_name = system_name
         self.suggestion_commands_tactic = suggestion_commands_tactic
+        self.llm_model_name = llm_model_name or config.LLM_API_MODEL_NAME
 
-    def create_query(self, question: str, endpoint: str) -> tuple[str, str, str, str]:
+    def create_query(self, question: str, endpoint: str) -> tuple[str, str, str, str, str, list]:
         """
         Create a query from a question and an endpoint.
-        If an error occurs, it is returned as a string in the second element of the tuple.
+        If an error occurs, it is returned as a string in the third element of the tuple.
+        The last element is the list of the LLM and SPARQL calls made by the system (see call_accounting.py).
         """
         try:
-            response, nl_query, error, steps_status, reasoning = self.create_query_body(question, endpoint)
+            response, nl_query, error, steps_status, reasoning, calls = self.create_query_body(question, endpoint)
         except Exception as e:
             response = ""
             nl_query = ""
             error = "Error: please try to intercept the error before." + str(e)
             reasoning = ""
             steps_status = ""
-        return response, nl_query, error, steps_status, reasoning
+            calls = []
+        return response, nl_query, error, steps_status, reasoning, calls
 
     @abstractmethod
-    def create_query_body(self, question: str, endpoint: str) -> tuple[str, str, str, str]:
+    def create_query_body(self, question: str, endpoint: str) -> tuple[str, str, str, str, str, list]:
         """
         Logic to create a query from a question and an endpoint.
         """
@@ -48,46 +60,169 @@ class TestSystem:
 #####################################
 
 class Dummy(TestSystem):
-    def create_query_body(self, question: str, endpoint: str) -> tuple[str, str, str, str]:
-        return 'SELECT ?s WHERE { ?s <http://example.com/nonexistentPredicate> ?o.}',"no nl query", 'Error: dummy', '', ''
+    def create_query_body(self, question: str, endpoint: str) -> tuple[str, str, str, str, str, list]:
+        return 'SELECT ?s WHERE { ?s <http://example.com/nonexistentPredicate> ?o.}',"no nl query", 'Error: dummy', '', '', []
     
     def end_system(self):
         pass
 
 
 class Sparklisllm(TestSystem):
-    # (static variable) allow to keep the same driver for all requests of a benchmark
-    used_driver = None
-    keep_same_driver = False #True to keep the same browser for all the requests of a benchmark (can cause problems after too many requests, but faster)
-
-    def create_query_body(self, question: str, endpoint: str) -> tuple[str, str, str, str]:
-        response, nl_query, error, steps_status, reasoning, driver = interactions.simulated_user(
-            config.SPARKLIS_LINK,
-            lambda driver: interactions.sparklisllm_question(driver, question, endpoint, self.system_name, self.suggestion_commands_tactic),
-            driver=Sparklisllm.used_driver,
-        )
-        if Sparklisllm.keep_same_driver:
-            Sparklisllm.used_driver = driver
-        else:
-            driver.close() # close the driver before opening a new one
-        return response, nl_query, error, steps_status, reasoning
+    # (static variable) pool of warm browsers shared by all the instances (one browser per worker),
+    # closed when the last instance using it ends (e.g. the last run of a sweep)
+    driver_pool = None
+    driver_pool_lock = threading.Lock()
+    driver_pool_users = 0
+
+    def __init__(self, system_name: str, suggestion_commands_tactic: str, llm_model_name: str = None):
+        super().__init__(system_name, suggestion_commands_tactic, llm_model_name)
+        with Sparklisllm.driver_pool_lock:
+            Sparklisllm.driver_pool_users += 1
+
+    @staticmethod
+    def get_driver_pool() -> DriverPool:
+        """
+        Get the shared pool of browsers, starting it if needed.
+        """
+        with Sparklisllm.driver_pool_lock:
+            if Sparklisllm.driver_pool is None:
+                nb_workers = max(1, config.NB_WORKERS)
+                Sparklisllm.driver_pool = DriverPool(
+                    nb_workers,
+                    is_headless=config.HIDE_BROWSER_ON_BENCHMARK_EVALUATION or nb_workers > 1,
+                    max_questions=config.DRIVER_MAX_QUESTIONS,
+                    max_memory_mb=config.DRIVER_MAX_MEMORY_MB,
+                )
+            return Sparklisllm.driver_pool
+
+    def create_query_body(self, question: str, endpoint: str) -> tuple[str, str, str, str, str, list]:
+        with Sparklisllm.get_driver_pool().driver() as driver:
+            response, nl_query, error, steps_status, reasoning, calls, _ = interactions.simulated_user(
+                interactions.sparklis_url(endpoint),
+                lambda driver: self.ask_question(driver, question),
+                driver=driver,
+            )
+        return response, nl_query, error, steps_status, reasoning, calls
+
+    def ask_question(self, driver, question: str):
+        """
+        Ask the question in the page of Sparklis (through its chatbot interface).
+        """
+        return interactions.sparklisllm_question(driver, question, self.system_name, self.suggestion_commands_tactic, self.llm_model_name)
     
     def end_system(self):
-        # Close the driver (and the page) if it was opened
-        if Sparklisllm.used_driver is not None:
-            Sparklisllm.used_driver.close()
-            Sparklisllm.used_driver = None
+        # Close the browsers of the pool if it was started and no other instance uses it
+        with Sparklisllm.driver_pool_lock:
+            Sparklisllm.driver_pool_users -= 1
+            if Sparklisllm.driver_pool is not None and Sparklisllm.driver_pool_users <= 0:
+                Sparklisllm.driver_pool.close()
+                Sparklisllm.driver_pool = None
+
+
+class SparklisllmDirect(Sparklisllm):
+    """
+    Same system as Sparklisllm, but the strategy is run directly in the page instead of using its interface (faster).
+    """
+    def ask_question(self, driver, question: str):
+        return interactions.sparklisllm_direct_question(driver, question, self.system_name, self.suggestion_commands_tactic,
+                                                        self.llm_model_name)
+
+
+class DirectLLM(TestSystem):
+    """
+    The SPARQL query is directly asked to the LLM API (LLM_API_CHAT_COMPLETIONS), without Sparklis.
+    Baseline without browser, also used by harness_benchmark.py with a stub LLM server.
+    """
+    PROMPT = ("Write a SPARQL query answering the question below on the endpoint {endpoint}. "
+              "Only answer with the query, in a ```sparql code block.\n\nQuestion: {question}")
+    QUERY_BLOCK = re.compile(r"```(?:sparql)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+
+    def __init__(self, system_name: str, suggestion_commands_tactic: str, llm_model_name: str = None):
+        super().__init__(system_name, suggestion_commands_tactic, llm_model_name)
+        self.session = requests.Session()
+        if config.LLM_API_KEY is not None:
+            self.session.headers["Authorization"] = f"Bearer {config.LLM_API_KEY}"
+
+    def create_query_body(self, question: str, endpoint: str) -> tuple[str, str, str, str, str, list]:
+        body = {"messages": [{"role": "user", "content": self.PROMPT.format(endpoint=endpoint, question=question)}],
+                "temperature": 0}
+        if self.llm_model_name is not None:
+            body["model"] = self.llm_model_name
+        start = time.perf_counter()
+        try:
+            response = self.session.post(config.LLM_API_CHAT_COMPLETIONS, json=body, timeout=config.SYSTEM_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            call = make_call(LLM, "System", time.perf_counter() - start, "error", self.llm_model_name)
+            return "", "", f"Error: LLM API unavailable: {e};", "", "", [call]
+        data = response.json() if response.ok else {}
+        usage = data.get("usage") or {}
+        call = make_call(LLM, "System", time.perf_counter() - start, response.status_code,
+                         data.get("model", self.llm_model_name),
+                         usage.get("prompt_tokens"), usage.get("completion_tokens"))
+        if not response.ok:
+            return "", "", f"Error: LLM API answered {response.status_code};", "", "", [call]
+        answer = data["choices"][0]["message"]["content"]
+        match = self.QUERY_BLOCK.search(answer)
+        query = (match.group(1) if match else answer).strip()
+        return query, "", "", "", answer, [call]
+
+    def end_system(self):
+        self.session.close()
+
+
+@functools.lru_cache(maxsize=None)
+def replayed_answers(output_file: str) -> dict:
+    """
+    Answers of the system in an output file, by question text (the first answer is kept for duplicated questions).
+    """
+    with open(output_file) as file:
+        data = json.load(file)
+    answers = {}
+    for entry in data['Data'].values():
+        answers.setdefault(entry['Question'], entry)
+    return answers
+
+class Replay(TestSystem):
+    """
+    Replays the system queries of an existing output (REPLAY_OUTPUT_FILE in config.py), matched by question text.
+    The answers are returned instantly, without browser nor LLM, to score and time the evaluation again
+    (e.g. on another endpoint or after a change of the scoring).
+    The errors of the replayed run are not replayed, as they also contain the errors of its evaluation.
+    """
+    def __init__(self, system_name: str, suggestion_commands_tactic: str, output_file: str = None):
+        super().__init__(system_name, suggestion_commands_tactic)
+        self.output_file = output_file or config.REPLAY_OUTPUT_FILE
+        if self.output_file is None:
+            raise ValueError('REPLAY_OUTPUT_FILE must be set in config.py to use the replay system')
+        self.answers = replayed_answers(self.output_file)
+
+    def create_query_body(self, question: str, endpoint: str) -> tuple[str, str, str, str, str, list]:
+        entry = self.answers.get(question)
+        if entry is None:
+            return "", "", f"Error: question not found in the replayed output {self.output_file};", "", "", []
+        calls = [call for call in entry.get('Calls', []) if call.get('Source', 'System') == 'System']
+        return (entry.get('SystemQuery') or "", entry.get('SystemNLQuery') or "", "",
+                entry.get('StepsStatus') or "", entry.get('Reasoning') or "", calls)
+
+    def end_system(self):
+        pass
 
 
 #####################################
 
-def testSystemFactory(system_name: str, suggestion_commands_tactic: str) -> TestSystem:
+def testSystemFactory(system_name: str, suggestion_commands_tactic: str, llm_model_name: str = None) -> TestSystem:
     """
     Factory method to create a test system.
     """
     if system_name == "dummy":
         return Dummy(system_name, suggestion_commands_tactic)
+    elif system_name == "llm":
+        return DirectLLM(system_name, suggestion_commands_tactic, llm_model_name)
+    elif system_name == "replay":
+        return Replay(system_name, suggestion_commands_tactic)
     elif "sparklisllm" in system_name:
-        return Sparklisllm(system_name, suggestion_commands_tactic)
+        if config.SPARKLIS_RUNNER == "direct":
+            return SparklisllmDirect(system_name, suggestion_commands_tactic, llm_model_name)
+        return Sparklisllm(system_name, suggestion_commands_tactic, llm_model_name)
     else:
         raise ValueError('Unknown test system name')
@@ -1,8 +1,38 @@
 """
 Not really unit testing, but allow to verify some properties of the system
 """
+import os
+import json
+import threading
+import asyncio
+import time
+import http.server
+import random
+import tempfile
 import unittest
-from system_evaluation import stats_calculation, recursive_dict_extract
+import config
+from system_evaluation import stats_calculation, recursive_dict_extract, system_queries_generation, execute_query, steps_timings, steps_categories_stats
+from test_system import Dummy, DirectLLM, Replay, Sparklisllm
+import system_evaluation
+from driver_pool import DriverPool
+from persistent_cache import PersistentCache, sparql_cache_key
+from run_log import RunLog, LOG_EXTENSION
+from rate_limiting import TokenBucket, retry_after_seconds
+from sparql_client import SessionClient, parse_results
+from interactions import wait_for_qa_end, harvest_errors, load_page, sparklis_url, sparklisllm_direct_question
+from selenium.common.exceptions import TimeoutException
+import fastapi
+from fastapi.testclient import TestClient
+import httpx
+import llm_proxy
+import sparql_proxy
+import wikidata_service
+from call_accounting import make_call, calls_usage, calls_stats, percentile, call_cost
+from harness_benchmark import MockSparqlEndpoint, StubLLMServer, canned_results, compare_results, make_benchmark_file
+from rescore import rescore_file
+from sweep import expand_matrix, run_sweep
+from run_catalog import RunCatalog
+from run_data import load_run_data
 
 class TestRecursiveDictExtract(unittest.TestCase):
 
@@ -100,5 +130,915 @@ class TestStatsCalculation(unittest.TestCase):
         self.assertEqual(recalls, [1/2])
         self.assertEqual(f1s, [(2*(1/2)*(1/2))/((1/2)+(1/2))])
 
+    def test_dict_several_variables(self):
+        dictList = [{"a": {"type": "uri", "value": "http://www.wikidata.org/entity/Q41"},
+                     "b": {"type": "literal", "value": "41"}}]
+        dictList2 = [{"c": {"type": "literal", "value": "41"}}]
+        precisions, recalls, f1s = stats_calculation([dictList], [dictList2])
+        self.assertEqual(precisions, [1])
+        self.assertEqual(recalls, [1/2])
+
+    def test_dict_strict_terms(self):
+        dictList = [{"result": {"type": "literal", "datatype": "http://www.w3.org/2001/XMLSchema#integer", "value": "1"}},
+                    {"result": {"type": "literal", "xml:lang": "en", "value": "Paris"}}]
+        dictList2 = [{"result": {"type": "typed-literal", "datatype": "http://www.w3.org/2001/XMLSchema#integer", "value": "1"}},
+                     {"result": {"type": "literal", "xml:lang": "fr", "value": "Paris"}}]
+        strict = config.SCORING_STRICT_TERMS
+        try:
+            config.SCORING_STRICT_TERMS = False
+            self.assertEqual(stats_calculation([dictList], [dictList2])[0], [1])
+            config.SCORING_STRICT_TERMS = True
+            self.assertEqual(stats_calculation([dictList], [dictList2])[0], [1/2])
+        finally:
+            config.SCORING_STRICT_TERMS = strict
+
+    def test_large_results(self):
+        dictList = [{"x": {"type": "uri", "value": f"http://www.wikidata.org/entity/Q{i}"}} for i in range(20000)]
+        dictList2 = [{"x": {"type": "uri", "value": f"http://www.wikidata.org/entity/Q{i}"}} for i in range(10000, 30000)]
+        precisions, recalls, f1s = stats_calculation([dictList], [dictList2])
+        self.assertEqual(precisions, [1/2])
+        self.assertEqual(recalls, [1/2])
+
+class TestSystemQueriesGeneration(unittest.TestCase):
+
+    class SlowEcho(Dummy):
+        def create_query_body(self, question: str, endpoint: str) -> tuple[str, str, str, str, str, list]:
+            time.sleep(random.uniform(0, 0.02))
+            return question, '', '', '', '', []
+
+    def test_parallel_keeps_questions_order(self):
+        questions = [str(i) for i in range(20)]
+        systems = [self.SlowEcho("dummy", "") for _ in range(4)]
+        queries, _, _, _, _, times, _ = system_queries_generation(questions, systems, "")
+        self.assertEqual(queries, questions)
+        self.assertEqual(len(times), len(questions))
+
+    def test_sequential_and_parallel_equal(self):
+        questions = [str(i) for i in range(10)]
+        sequential = system_queries_generation(questions, [Dummy("dummy", "")], "")
+        parallel = system_queries_generation(questions, [Dummy("dummy", ""), Dummy("dummy", "")], "")
+        self.assertEqual(sequential[:5], parallel[:5])
+
+class TestDriverPool(unittest.TestCase):
+
+    class FakeDriver:
+        def __init__(self):
+            self.window_handles = ["main"]
+            self.scripts = []
+            self.closed = False
+        def execute_script(self, script):
+            self.scripts.append(script)
+        def quit(self):
+            self.closed = True
+
+    def test_reuse_and_reset(self):
+        pool = DriverPool(1, driver_factory=self.FakeDriver)
+        with pool.driver() as first:
+            pass
+        with pool.driver() as second:
+            pass
+        self.assertIs(first, second)
+        self.assertTrue(any("steps_status" in script for script in first.scripts))
+        pool.close()
+        self.assertTrue(first.closed)
+
+    def test_recycle_after_max_questions(self):
+        pool = DriverPool(1, max_questions=2, driver_factory=self.FakeDriver)
+        drivers = []
+        for _ in range(3):
+            with pool.driver() as driver:
+                drivers.append(driver)
+        self.assertIs(drivers[0], drivers[1])
+        self.assertIsNot(drivers[1], drivers[2])
+        self.assertTrue(drivers[0].closed)
+
+    def test_unhealthy_driver_replaced(self):
+        pool = DriverPool(1, driver_factory=self.FakeDriver)
+        with pool.driver() as driver:
+            driver.window_handles = []
+        with pool.driver() as new_driver:
+            self.assertIsNot(driver, new_driver)
+        self.assertTrue(driver.closed)
+
+    def test_slot_kept_when_browser_fails_to_start(self):
+        failures = [False, True, True] # the first driver starts, the next two fail
+        def factory():
+            if failures and failures.pop(0):
+                raise RuntimeError("geckodriver failed")
+            return self.FakeDriver()
+        pool = DriverPool(1, max_questions=1, driver_factory=factory)
+        with pool.driver():
+            pass # recycled, but the new browser fails to start
+        with self.assertRaises(RuntimeError):
+            pool.acquire(timeout=0.01) # fails again
+        with pool.driver(timeout=0.01) as driver:
+            self.assertFalse(driver.closed)
+        pool.close()
+
+    def test_started_browsers_closed_when_pool_fails_to_start(self):
+        drivers = []
+        def factory():
+            if len(drivers) == 2:
+                raise RuntimeError("geckodriver failed")
+            drivers.append(self.FakeDriver())
+            return drivers[-1]
+        with self.assertRaises(RuntimeError):
+            DriverPool(3, driver_factory=factory)
+        self.assertEqual([driver.closed for driver in drivers], [True, True])
+
+    def test_timeout_when_exhausted(self):
+        pool = DriverPool(1, driver_factory=self.FakeDriver)
+        pool.acquire()
+        with self.assertRaises(TimeoutError):
+            pool.acquire(timeout=0.01)
+
+class TestPersistentCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file = os.path.join(self.directory.name, "cache.sqlite")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_persistence(self):
+        cache = PersistentCache(self.file)
+        cache.set("key", [{"x": {"type": "uri", "value": "http://www.wikidata.org/entity/Q42"}}])
+        cache.close()
+        cache = PersistentCache(self.file)
+        self.assertEqual(cache.get("key"), [{"x": {"type": "uri", "value": "http://www.wikidata.org/entity/Q42"}}])
+        self.assertIsNone(cache.get("other"))
+        cache.close()
+
+    def test_ttl_and_clear(self):
+        cache = PersistentCache(self.file, ttl=-1)
+        cache.set("key", True)
+        self.assertIsNone(cache.get("key"))
+        self.assertEqual(cache.clear(), 1)
+        self.assertEqual(len(cache), 0)
+        cache.close()
+
+    def test_sparql_key_normalization(self):
+        endpoint = "https://query.wikidata.org/sparql"
+        self.assertEqual(sparql_cache_key(endpoint, "ASK WHERE {\n  wd:Q42 ?p ?o }"),
+                         sparql_cache_key(endpoint, "ASK WHERE { wd:Q42 ?p ?o } "))
+        self.assertNotEqual(sparql_cache_key(endpoint, "ASK WHERE { wd:Q42 ?p ?o }"),
+                            sparql_cache_key("https://dbpedia.org/sparql", "ASK WHERE { wd:Q42 ?p ?o }"))
+
+class TestRunLog(unittest.TestCase):
+
+    def test_append_and_read(self):
+        with tempfile.TemporaryDirectory() as directory:
+            run_log = RunLog.create(os.path.join(directory, "run.jsonl"), {"BenchmarkName": "QALD-10"})
+            run_log.append([{"Id": "1"}, {"Id": "2"}])
+            run_log.append([{"Id": "3"}])
+            with open(run_log.file_path, "a") as file:
+                file.write('{"Id": "4", "Quest') # crash while writing
+            meta, records = run_log.read()
+            self.assertEqual(meta, {"BenchmarkName": "QALD-10"})
+            self.assertEqual([record["Id"] for record in records], ["1", "2", "3"])
+            run_log.append([{"Id": "4"}, {"Id": "1", "Resumed": True}])
+            _, records = run_log.read()
+            self.assertEqual([record["Id"] for record in records], ["2", "3", "4", "1"])
+            self.assertTrue(records[-1]["Resumed"])
+
+    def test_resume_only_same_questions(self):
+        saved = {key: getattr(config, key) for key in ('GOLD_RESULTS_CACHE', 'RESUME_INTERRUPTED_RUNS', 'KEEP_RUN_LOGS',
+                                                        'SPARQL_MAX_QUERIES_PER_SECOND', 'BENCHMARK_QUESTIONS_FILTER')}
+        def run(output_folder):
+            system_evaluation.main(benchmark_file, 'QALD-10', 'dummy', 'best_at_individual_cmd', endpoint.endpoint, 'llm',
+                                   output_folder=output_folder)
+            [output_file] = [file_name for file_name in os.listdir(output_folder) if file_name.endswith('.json')]
+            with open(os.path.join(output_folder, output_file)) as file:
+                output = json.load(file)
+            os.remove(os.path.join(output_folder, output_file)) # the run looks interrupted
+            # the log is renamed as an older one, a run in the same second would write the same file
+            logs = [file_name for file_name in os.listdir(output_folder) if file_name.endswith(LOG_EXTENSION)]
+            os.rename(os.path.join(output_folder, output_file[:-len('.json')] + LOG_EXTENSION),
+                      os.path.join(output_folder, f'QALD-10_dummy_2000010{len(logs)}_000000' + LOG_EXTENSION))
+            return sorted(output['Data'])
+        try:
+            config.GOLD_RESULTS_CACHE = False
+            config.RESUME_INTERRUPTED_RUNS = True
+            config.KEEP_RUN_LOGS = True
+            config.SPARQL_MAX_QUERIES_PER_SECOND = None
+            config.BENCHMARK_QUESTIONS_FILTER = {}
+            with tempfile.TemporaryDirectory() as tmp, MockSparqlEndpoint() as endpoint:
+                benchmark_file = os.path.join(tmp, 'questions.json')
+                make_benchmark_file(benchmark_file, 4)
+                output_folder = os.path.join(tmp, 'Outputs')
+                all_ids = run(output_folder)
+                # Other questions: the interrupted run is not resumed
+                config.BENCHMARK_QUESTIONS_FILTER = {'id': lambda x: x in ('1', '2')}
+                filtered_ids = run(output_folder)
+                # Same questions: the interrupted run is resumed
+                resumed_ids = run(output_folder)
+                nb_logs = len([file_name for file_name in os.listdir(output_folder) if file_name.endswith(LOG_EXTENSION)])
+        finally:
+            for key, value in saved.items():
+                setattr(config, key, value)
+        self.assertEqual(all_ids, ['0', '1', '2', '3'])
+        self.assertEqual(filtered_ids, ['1', '2'])
+        self.assertEqual(resumed_ids, ['1', '2'])
+        self.assertEqual(nb_logs, 2)
+
+    def test_output_only_current_questions(self):
+        meta = {'BenchmarkName': 'QALD-10', 'TestedSystem': 'dummy', 'SuggestionCommandsTactic': '', 'Date': '',
+                'Endpoint': '', 'UsedLLM': ''}
+        record = {'Question': 'q', 'Tags': [], 'BenchmarkQuery': '', 'SystemQuery': '', 'SystemNLQuery': '',
+                  'BenchmarkResult': None, 'SystemResult': None, 'SystemTime': 1.0, 'BenchmarkResultType': 'unknown',
+                  'Error': '', 'StepsStatus': None, 'Reasoning': '', 'Precision': 1.0, 'Recall': 1.0, 'F1Score': 1.0}
+        with tempfile.TemporaryDirectory() as directory:
+            run_log = RunLog.create(os.path.join(directory, "run.jsonl"), meta)
+            run_log.append([dict(record, Id=question_id) for question_id in ("1", "2", "3")])
+            output_file = os.path.join(directory, "run.json")
+            system_evaluation.write_output_from_log(run_log, output_file, ["3", "1"])
+            with open(output_file) as file:
+                output = json.load(file)
+        self.assertEqual(list(output['Data']), ["3", "1"])
+        self.assertEqual(output['Stats']['NbQuestions'], 2)
+
+class TestRateLimiting(unittest.TestCase):
+
+    class TooManyRequests(Exception):
+        def __init__(self, retry_after):
+            super().__init__("HTTP Error 429: Too Many Requests")
+            self.headers = {"Retry-After": retry_after}
+
+    class FakeSparql:
+        endpoint = "http://fake.endpoint/sparql"
+        def __init__(self, nb_failures, retry_after="0"):
+            self.nb_failures = nb_failures
+            self.retry_after = retry_after
+            self.calls = 0
+        def query(self, query, max_rows=None, max_bytes=None):
+            self.calls += 1
+            if self.calls <= self.nb_failures:
+                raise TestRateLimiting.TooManyRequests(self.retry_after)
+            return {"boolean": True}, False
+
+    def test_retry_after_429(self):
+        sparql = self.FakeSparql(2)
+        self.assertEqual(execute_query(sparql, "ASK {}", 0, "System"), (True, ""))
+        self.assertEqual(sparql.calls, 3)
+
+    def test_retry_after_capped(self):
+        backoff_max = config.SPARQL_BACKOFF_MAX
+        try:
+            config.SPARQL_BACKOFF_MAX = 0.01
+            start = time.monotonic()
+            self.assertEqual(execute_query(self.FakeSparql(1, retry_after="3600"), "ASK {}", 0, "System"), (True, ""))
+        finally:
+            config.SPARQL_BACKOFF_MAX = backoff_max
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_max_retries(self):
+        sparql = self.FakeSparql(1000)
+        result, error = execute_query(sparql, "ASK {}", 0, "System")
+        self.assertIsNone(result)
+        self.assertIn("too many requests", error)
+        self.assertEqual(sparql.calls, config.SPARQL_MAX_RETRIES + 1)
+
+    def test_retry_after_header(self):
+        self.assertEqual(retry_after_seconds({"Retry-After": "12"}), 12)
+        self.assertIsNone(retry_after_seconds({}))
+        self.assertAlmostEqual(retry_after_seconds({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}), 0)
+
+    def test_token_bucket_rate(self):
+        bucket = TokenBucket(rate=100, capacity=1)
+        start = time.monotonic()
+        for _ in range(11):
+            bucket.take()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+class TestSessionClient(unittest.TestCase):
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def answer(self, method):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/sparql-results+json")
+            self.end_headers()
+            self.wfile.write(json.dumps({"boolean": True, "method": method}).encode())
+        def do_GET(self):
+            self.answer("GET")
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            self.answer("POST")
+        def log_message(self, *args):
+            pass
+
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), TestSessionClient.Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = SessionClient(f"http://127.0.0.1:{self.server.server_address[1]}/sparql")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_short_query_get(self):
+        self.assertEqual(self.client.query("ASK {}")[0]["method"], "GET")
+
+    def test_long_query_post(self):
+        query = "ASK { " + " ".join(["?s ?p ?o ."] * config.SPARQL_POST_THRESHOLD) + " }"
+        self.assertEqual(self.client.query(query)[0]["method"], "POST")
+
+
+class TestParseResults(unittest.TestCase):
+
+    def make_chunks(self, nb_rows, chunk_size=7):
+        rows = [{"x": {"type": "literal", "value": f"v{i} é"}} for i in range(nb_rows)]
+        text = json.dumps({"head": {"vars": ["x"]}, "results": {"distinct": False, "bindings": rows}}).encode()
+        return [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)], rows
+
+    def test_complete(self):
+        chunks, rows = self.make_chunks(50)
+        result, truncated = parse_results(chunks)
+        self.assertFalse(truncated)
+        self.assertEqual(result["results"]["bindings"], rows)
+        self.assertEqual(result["head"], {"vars": ["x"]})
+
+    def test_compact_rows(self):
+        text = ('{"head": {"vars": ["x"]}, "results": {"bindings"   \n  :   [{"x": {"type": "literal", "value": "1", '
+                '"datatype": "http://www.w3.org/2001/XMLSchema#integer", "extra": "dropped"}}]}}').encode()
+        result, _ = parse_results([text[i:i + 3] for i in range(0, len(text), 3)])
+        self.assertEqual(result["results"]["bindings"],
+                         [{"x": {"type": "literal", "value": "1", "datatype": "http://www.w3.org/2001/XMLSchema#integer"}}])
+
+    def test_ask(self):
+        self.assertEqual(parse_results([b'{"head": {}, "boolean": ', b'true}']), ({"head": {}, "boolean": True}, False))
+
+    def test_max_rows(self):
+        chunks, rows = self.make_chunks(50)
+        result, truncated = parse_results(chunks, max_rows=10)
+        self.assertTrue(truncated)
+        self.assertEqual(result["results"]["bindings"], rows[:10])
+        self.assertFalse(parse_results(chunks, max_rows=50)[1])
+
+    def test_max_bytes(self):
+        chunks, rows = self.make_chunks(1000)
+        result, truncated = parse_results(chunks, max_bytes=1000)
+        self.assertTrue(truncated)
+        self.assertLess(len(result["results"]["bindings"]), len(rows))
+        self.assertEqual(result["results"]["bindings"], rows[:len(result["results"]["bindings"])])
+
+
+class TestWaitForQaEnd(unittest.TestCase):
+
+    class FakeDriver:
+        def __init__(self, outcome):
+            self.outcome = outcome
+        def set_script_timeout(self, timeout):
+            pass
+        def execute_async_script(self, script):
+            if isinstance(self.outcome, Exception):
+                raise self.outcome
+            return self.outcome
+
+    def test_done(self):
+        self.assertEqual(wait_for_qa_end(TestWaitForQaEnd.FakeDriver("done"), 1, lambda d: False), "")
+
+    def test_failed(self):
+        self.assertIn("boom", wait_for_qa_end(TestWaitForQaEnd.FakeDriver("failed: boom"), 1, lambda d: False))
+
+    def test_timeout(self):
+        error = wait_for_qa_end(TestWaitForQaEnd.FakeDriver(TimeoutException()), 1, lambda d: False)
+        self.assertEqual(error, "Timeout while waiting for system response.")
+
+    def test_fallback_polling(self):
+        self.assertEqual(wait_for_qa_end(TestWaitForQaEnd.FakeDriver("no_run"), 1, lambda d: True), "")
+
+
+class TestHarvestErrors(unittest.TestCase):
+
+    def harvest(self, **fields):
+        harvest = {"reasoning": "r", "answer": "a", "sparql_request": "q", "sparklis_request": "s",
+                   "errors": "", "alert_messages": "[]", "steps_status": "{}"}
+        harvest.update(fields)
+        return harvest
+
+    def test_no_error(self):
+        self.assertEqual(harvest_errors(self.harvest()), "")
+
+    def test_empty_fields(self):
+        self.assertEqual(harvest_errors(self.harvest(answer="", sparql_request="")),
+                         "Warning: Empty answer from the system;Warning: Empty SPARQL request from the system;")
+
+    def test_system_errors(self):
+        self.assertEqual(harvest_errors(self.harvest(errors="e", alert_messages='["alert"]')),
+                         'Errors from the system [e]Alert messages from the system [["alert"]]')
+
+
+class TestLoadPage(unittest.TestCase):
+
+    class FakeDriver:
+        def __init__(self):
+            self.loaded_url = None
+            self.busy = False
+            self.nb_loads = 0
+        def get(self, url):
+            self.nb_loads += 1
+        def execute_script(self, script, url):
+            if "return" in script:
+                return self.loaded_url == url and not self.busy
+            self.loaded_url = url
+
+    def test_warm_page(self):
+        driver = TestLoadPage.FakeDriver()
+        url = sparklis_url("https://query.wikidata.org/sparql")
+        load_page(driver, url)
+        load_page(driver, url)
+        self.assertEqual(driver.nb_loads, 1)
+        load_page(driver, sparklis_url("https://dbpedia.org/sparql"))
+        self.assertEqual(driver.nb_loads, 2)
+
+    def test_busy_page(self):
+        driver = TestLoadPage.FakeDriver()
+        url = sparklis_url("https://query.wikidata.org/sparql")
+        load_page(driver, url)
+        driver.busy = True
+        load_page(driver, url)
+        self.assertEqual(driver.nb_loads, 2)
+
+    def test_url(self):
+        url = sparklis_url("https://query.wikidata.org/sparql")
+        self.assertTrue(url.startswith(config.SPARKLIS_LINK))
+        self.assertIn("wikidata_mode=true", url)
+        self.assertNotIn("wikidata_mode=true", sparklis_url("https://dbpedia.org/sparql"))
+
+
+class TestSparklisllmDirectQuestion(unittest.TestCase):
+
+    class FakeDriver:
+        def __init__(self, outcome):
+            self.outcome = outcome
+            self.args = None
+        def execute_script(self, script, *args):
+            return {"reasoning": "", "answer": "a", "sparql_request": "q", "sparklis_request": "s",
+                    "errors": "", "alert_messages": "[]", "steps_status": "{}"}
+        def set_script_timeout(self, timeout):
+            pass
+        def execute_async_script(self, script, *args):
+            self.args = args
+            return self.outcome
+
+    def test_direct_run(self):
+        harvest = {"reasoning": "r", "answer": "a", "sparql_request": "q", "sparklis_request": "s",
+                   "errors": "", "alert_messages": "[]", "steps_status": "{}"}
+        driver = TestSparklisllmDirectQuestion.FakeDriver(harvest)
+        result = sparklisllm_direct_question(driver, "question?", "sparklisllm-LLMFrameworkOneShot", "tactic")
+        self.assertEqual(result, ("q", "s", "", "{}", "r", []))
+        self.assertEqual(driver.args, ("question?", "LLMFrameworkOneShot", "tactic"))
+
+    def test_failed_run(self):
+        driver = TestSparklisllmDirectQuestion.FakeDriver("failed: boom")
+        result = sparklisllm_direct_question(driver, "question?", "sparklisllm-LLMFrameworkOneShot", "tactic")
+        self.assertEqual(result[0], "q")
+        self.assertIn("boom", result[2])
+        self.assertIn("Warning: Empty reasoning from the system;", result[2])
+
+
+class TestLLMProxy(unittest.TestCase):
+
+    def upstream(self, request):
+        self.nb_upstream_calls += 1
+        if json.loads(request.content).get("stream"):
+            events = [{"model": "m", "choices": [{"delta": {"content": "Hel"}, "finish_reason": None}]},
+                      {"model": "m", "choices": [{"delta": {"content": "lo"}, "finish_reason": "stop"}]}]
+            content = "".join("data: " + json.dumps(event) + "\n\n" for event in events) + "data: [DONE]\n\n"
+            return httpx.Response(200, content=content, headers={"Content-Type": "text/event-stream"})
+        return httpx.Response(200, json={"model": "m", "choices": [{"message": {"content": "Hello"}, "finish_reason": "stop"}]})
+
+    def setUp(self):
+        self.nb_upstream_calls = 0
+        self.tmp = tempfile.TemporaryDirectory()
+        llm_proxy._cache = PersistentCache(os.path.join(self.tmp.name, "llm.sqlite"))
+        llm_proxy._client = httpx.AsyncClient(transport=httpx.MockTransport(self.upstream))
+        app = fastapi.FastAPI()
+        app.include_router(llm_proxy.router, prefix="/llm")
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        llm_proxy._cache.close()
+        llm_proxy._cache = None
+        llm_proxy._client = None
+        self.tmp.cleanup()
+
+    def ask(self, stream, temperature=0):
+        body = {"messages": [{"role": "user", "content": "Hi"}], "temperature": temperature, "stream": stream}
+        return self.client.post("/llm/v1/chat/completions", json=body)
+
+    def stream_content(self, response):
+        content = ""
+        for part in response.text.split("data: "):
+            if part.strip() and "[DONE]" not in part:
+                content += json.loads(part)["choices"][0]["delta"].get("content") or ""
+        return content
+
+    def test_cache_hit(self):
+        self.assertEqual(self.ask(False).headers["X-Cache"], "MISS")
+        response = self.ask(False)
+        self.assertEqual(response.headers["X-Cache"], "HIT")
+        self.assertEqual(response.json()["choices"][0]["message"]["content"], "Hello")
+        self.assertEqual(self.nb_upstream_calls, 1)
+
+    def test_stream_replay(self):
+        self.assertEqual(self.stream_content(self.ask(True)), "Hello")
+        response = self.ask(True)
+        self.assertEqual(response.headers["X-Cache"], "HIT")
+        self.assertEqual(self.stream_content(response), "Hello")
+        self.assertEqual(self.nb_upstream_calls, 1)
+
+    def test_temperature_bypass(self):
+        self.assertEqual(self.ask(False, temperature=0.8).headers["X-Cache"], "BYPASS")
+        self.ask(False, temperature=0.8)
+        self.assertEqual(self.nb_upstream_calls, 2)
+
+    def test_missing_temperature_bypass(self):
+        # the API uses its default temperature (1 for OpenAI)
+        self.assertEqual(self.ask(False, temperature=None).headers["X-Cache"], "BYPASS")
+
+
+class TestSparqlProxy(unittest.TestCase):
+
+    async def upstream(self, request):
+        self.nb_upstream_calls += 1
+        await asyncio.sleep(0.05)
+        if "rate" in request.url.params.get("query", ""):
+            return httpx.Response(429, headers={"Retry-After": "1"})
+        return httpx.Response(200, json={"head": {}, "boolean": True}, headers={"Content-Type": "application/sparql-results+json"})
+
+    def setUp(self):
+        self.nb_upstream_calls = 0
+        self.tmp = tempfile.TemporaryDirectory()
+        sparql_proxy._cache = PersistentCache(os.path.join(self.tmp.name, "sparql.sqlite"))
+        sparql_proxy._client = httpx.AsyncClient(transport=httpx.MockTransport(self.upstream))
+        sparql_proxy._endpoint_slots.clear()
+        self.app = fastapi.FastAPI()
+        self.app.include_router(sparql_proxy.router, prefix="/sparql")
+        self.client = TestClient(self.app)
+
+    def tearDown(self):
+        sparql_proxy._cache.close()
+        sparql_proxy._cache = None
+        sparql_proxy._client = None
+        self.tmp.cleanup()
+
+    def test_cache_hit(self):
+        self.assertEqual(self.client.get("/sparql/wikidata", params={"query": "ASK {}"}).headers["X-Cache"], "MISS")
+        response = self.client.post("/sparql/wikidata", data={"query": "ASK {}"}) # same query with POST
+        self.assertEqual(response.headers["X-Cache"], "HIT")
+        self.assertEqual(response.json()["boolean"], True)
+        self.assertEqual(self.nb_upstream_calls, 1)
+
+    def test_coalescing(self):
+        async def ask_together():
+            transport = httpx.ASGITransport(app=self.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://proxy") as client:
+                return await asyncio.gather(*[client.get("/sparql/wikidata", params={"query": "ASK { ?s ?p ?o }"}) for _ in range(5)])
+        responses = asyncio.run(ask_together())
+        self.assertEqual(sorted(response.headers["X-Cache"] for response in responses), ["COALESCED"] * 4 + ["MISS"])
+        self.assertEqual(self.nb_upstream_calls, 1)
+
+    def test_errors_not_cached(self):
+        response = self.client.get("/sparql/wikidata", params={"query": "ASK { rate }"})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], "1")
+        self.client.get("/sparql/wikidata", params={"query": "ASK { rate }"})
+        self.assertEqual(self.nb_upstream_calls, 2)
+        self.assertEqual(self.client.get("/sparql/unknown", params={"query": "ASK {}"}).status_code, 404)
+
+
+class TestWikidataService(unittest.TestCase):
+
+    def wikidata_api(self, request):
+        self.requests.append(request.url.params)
+        language = request.url.params["languages"]
+        ids = request.url.params["ids"].split("|")
+        if self.rejected_id in ids: # the Wikidata API rejects the whole request
+            return httpx.Response(200, json={"error": {"code": "no-such-entity", "id": self.rejected_id}})
+        entities = {entity_id: {"labels": {language: {"value": f"{entity_id} {language}"}}} for entity_id in ids if entity_id != "Q0"}
+        return httpx.Response(200, json={"entities": entities})
+
+    def setUp(self):
+        self.requests = []
+        self.rejected_id = None
+        self.tmp = tempfile.TemporaryDirectory()
+        wikidata_service._cache = PersistentCache(os.path.join(self.tmp.name, "labels.sqlite"))
+        wikidata_service._client = httpx.AsyncClient(transport=httpx.MockTransport(self.wikidata_api))
+        app = fastapi.FastAPI()
+        app.include_router(wikidata_service.router, prefix="/wikidata")
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        wikidata_service._cache.close()
+        wikidata_service._cache = None
+        wikidata_service._client = None
+        wikidata_service._dump = None
+        self.tmp.cleanup()
+
+    def labels(self, uris, language="en"):
+        return self.client.post("/wikidata/labels", json={"uris": uris, "language": language}).json()["labels"]
+
+    def test_batched_labels(self):
+        uris = [f"http://www.wikidata.org/entity/Q{i}" for i in range(120)] + ["http://example.com/not-wikidata"]
+        labels = self.labels(uris)
+        self.assertEqual(len(self.requests), 3) # batches of 50 entities
+        self.assertEqual(labels["http://www.wikidata.org/entity/Q42"], "Q42 en")
+        self.assertIsNone(labels["http://www.wikidata.org/entity/Q0"])
+        self.assertIsNone(labels["http://example.com/not-wikidata"])
+        # Cached by language
+        self.assertEqual(self.labels(uris[:10]), {uri: labels[uri] for uri in uris[:10]})
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual(self.labels(uris[42:43], "fr")["http://www.wikidata.org/entity/Q42"], "Q42 fr")
+        self.assertEqual(len(self.requests), 4)
+
+    def test_rejected_batch(self):
+        self.rejected_id = "Q13"
+        uris = [f"http://www.wikidata.org/entity/Q{i}" for i in range(1, 30)]
+        labels = self.labels(uris)
+        self.assertEqual(len(self.requests), 1 + 29) # the rejected batch, then one request per id
+        self.assertEqual(labels[uris[0]], "Q1 en")
+        self.assertIsNone(labels["http://www.wikidata.org/entity/Q13"])
+        # The labels of the batch are cached, except the rejected one
+        self.rejected_id = None
+        self.assertEqual(self.labels(uris)["http://www.wikidata.org/entity/Q13"], "Q13 en")
+        self.assertEqual(len(self.requests), 31)
+
+    def test_offline_dump(self):
+        dump_file = os.path.join(self.tmp.name, "dump.json")
+        with open(dump_file, "w") as file:
+            file.write("[\n")
+            file.write(json.dumps({"id": "Q90", "labels": {"en": {"language": "en", "value": "Paris"}}, "descriptions": {"en": "capital of France"}}) + ",\n")
+            file.write(json.dumps({"id": "Q1", "labels": {"en": "Paris Hilton"}}) + ",\n")
+            file.write(json.dumps({"id": "P31", "labels": {"en": "instance of"}}) + "\n]\n")
+        dump_file_config = config.WIKIDATA_DUMP_FILE
+        try:
+            config.WIKIDATA_DUMP_FILE = dump_file
+            self.assertEqual(self.labels(["http://www.wikidata.org/entity/Q90"]), {"http://www.wikidata.org/entity/Q90": "Paris"})
+            results = self.client.get("/wikidata/search", params={"search": "paris", "type": "item"}).json()["search"]
+            self.assertEqual([result["id"] for result in results], ["Q90", "Q1"]) # exact match first
+            self.assertEqual(results[0]["description"], "capital of France")
+        finally:
+            config.WIKIDATA_DUMP_FILE = dump_file_config
+        self.assertEqual(len(self.requests), 0)
+
+
+class TestCallAccounting(unittest.TestCase):
+
+    def calls(self):
+        return [make_call("LLM", "System", 2.0, 200, "gpt-4o-mini-2024-07-18", 1000, 100, 0.5),
+                make_call("LLM", "System", 4.0, 200, "local-model", 2000, 200, 1.0),
+                make_call("SPARQL", "System", 0.5, 200),
+                make_call("SPARQL", "Evaluation", 0.1, 200)]
+
+    def test_percentile(self):
+        self.assertEqual(percentile([], 50), None)
+        self.assertEqual(percentile([3, 1, 2], 50), 2)
+        self.assertAlmostEqual(percentile([1, 2], 95), 1.95)
+
+    def test_cost(self):
+        self.assertAlmostEqual(call_cost(self.calls()[0]), (0.15 * 1000 + 0.60 * 100) / 1_000_000)
+        self.assertIsNone(call_cost(self.calls()[1]))
+
+    def test_usage(self):
+        usage = calls_usage(self.calls())
+        self.assertEqual(usage["NbLLMCalls"], 2)
+        self.assertEqual(usage["PromptTokens"], 3000)
+        self.assertEqual(usage["LLMLatency"], 6.0)
+        self.assertEqual(usage["NbSparqlCalls"], 1) # the queries of the evaluation are not made by the system
+
+    def test_stats(self):
+        self.assertEqual(calls_stats([[], []]), {})
+        stats = calls_stats([self.calls(), []])
+        self.assertEqual(stats["MeanNbLLMCalls"], 1)
+        self.assertEqual(stats["LLMLatencyP50"], 3.0)
+        self.assertEqual(stats["EvaluationSparqlLatencyP50"], 0.1)
+
+
+class TestStepsTimings(unittest.TestCase):
+
+    def test_timings(self):
+        steps_status = json.dumps({
+            "0": {"Name": "Start", "Status": "Done", "Start": 1000, "End": 1000},
+            "1": {"Name": "Generation", "Status": "Done", "Function": "step_generation", "Start": 1000, "End": 3500},
+            "2": {"Name": "Get results", "Status": "Ongoing", "Function": "step_get_results", "Start": 3500},
+            "10": {"Name": "Custom step", "Status": "Done", "Function": "step_custom", "Start": 4000, "End": 4500},
+        })
+        timings = steps_timings(steps_status)
+        self.assertEqual([t["Category"] for t in timings], ["Other", "LLM", "Endpoint", "Other"])
+        self.assertEqual(timings[1]["Duration"], 2.5)
+        self.assertEqual(timings[2]["Start"], 2.5)
+        self.assertIsNone(timings[2]["Duration"]) # the step didn't end
+        stats = steps_categories_stats([timings, []])
+        self.assertEqual(stats["MeanLLMStepsTime"], 2.5)
+        self.assertEqual(stats["MeanOtherStepsTime"], 0.5)
+
+    def test_untimed_steps(self):
+        # Outputs made before the steps were timed
+        self.assertEqual(steps_timings(json.dumps({"0": {"Name": "Start", "Status": "Done"}})), [])
+        self.assertEqual(steps_timings(""), [])
+        self.assertEqual(steps_timings("not json"), [])
+        self.assertEqual(steps_categories_stats([[], []]), {})
+
+
+class TestReplay(unittest.TestCase):
+
+    def test_replay(self):
+        output = {'Data': {
+            '1': {'Question': 'Who is the mayor of Paris?', 'SystemQuery': 'SELECT ?x WHERE { ?x ?p ?o }', 'SystemNLQuery': 'mayor',
+                  'StepsStatus': '', 'Reasoning': 'reasoning', 'Error': 'Error: from the evaluation;',
+                  'Calls': [make_call("LLM", "System", 1.0, 200), make_call("SPARQL", "Evaluation", 0.1, 200)]},
+        }}
+        with tempfile.TemporaryDirectory() as tmp:
+            output_file = os.path.join(tmp, "output.json")
+            with open(output_file, "w") as file:
+                json.dump(output, file)
+            system = Replay("replay", "", output_file)
+            query, nl_query, error, _, reasoning, calls = system.create_query('Who is the mayor of Paris?', "")
+            self.assertEqual((query, nl_query, error, reasoning), ('SELECT ?x WHERE { ?x ?p ?o }', 'mayor', '', 'reasoning'))
+            self.assertEqual(len(calls), 1) # only the calls of the system are replayed
+            query, _, error, _, _, _ = system.create_query('Unknown question', "")
+            self.assertEqual(query, "")
+            self.assertTrue(error.startswith("Error: question not found"))
+
+
+class TestHarnessBenchmark(unittest.TestCase):
+
+    def test_mock_endpoint(self):
+        query = "SELECT ?x WHERE { ?x ?p ?o }"
+        with MockSparqlEndpoint() as endpoint:
+            results, truncated = SessionClient(endpoint.endpoint).query(query)
+        self.assertEqual(results, canned_results(query))
+        self.assertFalse(truncated)
+
+    def test_direct_llm_with_stub(self):
+        chat_completions = config.LLM_API_CHAT_COMPLETIONS
+        try:
+            with StubLLMServer() as llm:
+                config.LLM_API_CHAT_COMPLETIONS = llm.api + "chat/completions"
+                system = DirectLLM("llm", "")
+                query, _, error, _, _, calls = system.create_query("Who is the mayor of Paris?", "http://example.com/sparql")
+                system.end_system()
+        finally:
+            config.LLM_API_CHAT_COMPLETIONS = chat_completions
+        self.assertTrue(query.startswith("SELECT"))
+        self.assertEqual(error, "")
+        self.assertEqual(calls[0]["Status"], 200)
+        self.assertGreater(calls[0]["PromptTokens"], 0)
+
+    def test_compare_results(self):
+        baseline = {'Scenarios': {'s': {'QuestionsPerMinute': 100, 'PeakRSSMB': 50, 'StageTimes': {'Evaluation': 1.0, 'Output': 0.001}}},
+                    'Micro': {'m': 0.1}}
+        results = {'Scenarios': {'s': {'QuestionsPerMinute': 90, 'PeakRSSMB': 80, 'StageTimes': {'Evaluation': 1.1, 'Output': 0.01}}},
+                   'Micro': {'m': 0.2}}
+        regressions = compare_results(baseline, results, 0.25)
+        self.assertEqual(len(regressions), 2) # peak RSS and micro benchmark, the output time is too short to be compared
+        self.assertEqual(compare_results(baseline, baseline, 0.25), [])
+
+
+class TestRescore(unittest.TestCase):
+
+    def test_rescore_stored_results(self):
+        gold_query = "SELECT ?x ?label WHERE { ?x ?p ?label }"
+        gold_bindings = canned_results(gold_query)["results"]["bindings"]
+        output = {'BenchmarkName': 'QALD-10', 'Endpoint': 'http://old.endpoint/sparql', 'Stats': {}, 'Data': {
+            '1': {'Question': 'q1', 'Error': 'Error: Benchmark query execution failed.Error: dummy;', 'StepsStatus': '',
+                  'Precision': None, 'Recall': None, 'F1Score': None, 'BenchmarkQuery': gold_query,
+                  'SystemQuery': 'SELECT ?x WHERE { ?x ?p ?o }', 'SystemNLQuery': '', 'SystemTime': 2.0,
+                  'BenchmarkResultType': 'unknown', 'BenchmarkResult': None, 'SystemResult': gold_bindings, 'Reasoning': ''},
+        }}
+        gold_cache = config.GOLD_RESULTS_CACHE
+        try:
+            config.GOLD_RESULTS_CACHE = False
+            with tempfile.TemporaryDirectory() as tmp, MockSparqlEndpoint() as endpoint:
+                output_file = os.path.join(tmp, "output.json")
+                with open(output_file, "w") as file:
+                    json.dump(output, file)
+                rescored = rescore_file(output_file, output_file, endpoint.endpoint)
+        finally:
+            config.GOLD_RESULTS_CACHE = gold_cache
+        entry = rescored['Data']['1']
+        self.assertEqual(entry['F1Score'], 1.0)
+        self.assertEqual(entry['Error'], 'Error: dummy;') # the error of the previous evaluation is removed
+        self.assertEqual(rescored['Endpoint'], endpoint.endpoint)
+        self.assertEqual(rescored['Stats']['NbQuestions'], 1)
+        self.assertEqual(entry['SystemTime'], 2.0)
+
+
+class TestSweep(unittest.TestCase):
+
+    def test_expand_matrix(self):
+        matrix = {'Benchmarks': [{'Name': 'QALD-10', 'File': 'a.json'}, {'Name': 'QALD-9-plus', 'File': 'b.json'}],
+                  'Systems': ['dummy', 'llm'], 'LLMs': ['m1', 'm2'],
+                  'Exclude': [{'System': 'dummy', 'LLM': 'm2'}, {'Benchmark': 'QALD-9-plus', 'System': 'llm'}]}
+        jobs = expand_matrix(matrix, '/tmp/sweep')
+        self.assertEqual([(job.benchmark_name, job.tested_system_name, job.llm_model_name) for job in jobs],
+                         [('QALD-10', 'dummy', 'm1'), ('QALD-10', 'llm', 'm1'), ('QALD-10', 'llm', 'm2'), ('QALD-9-plus', 'dummy', 'm1')])
+        self.assertEqual(jobs[0].suggestion_commands_tactic, config.SUGGESTION_COMMANDS_TACTIC)
+        self.assertEqual(len({job.output_folder for job in jobs}), 4)
+        self.assertTrue(jobs[0].output_folder.startswith('/tmp/sweep/QALD-10_dummy_'))
+
+    def test_concurrent_jobs(self):
+        saved = {key: getattr(config, key) for key in ('GOLD_RESULTS_CACHE', 'RESUME_INTERRUPTED_RUNS', 'KEEP_RUN_LOGS',
+                                                        'SPARQL_MAX_QUERIES_PER_SECOND', 'LLM_API_MODELS', 'LLM_API_KEY')}
+        try:
+            config.GOLD_RESULTS_CACHE = False
+            config.RESUME_INTERRUPTED_RUNS = False
+            config.KEEP_RUN_LOGS = False
+            config.SPARQL_MAX_QUERIES_PER_SECOND = None
+            config.LLM_API_KEY = None
+            with tempfile.TemporaryDirectory() as tmp, MockSparqlEndpoint() as endpoint, StubLLMServer() as llm:
+                config.LLM_API_MODELS = llm.api + 'models'
+                benchmark_file = os.path.join(tmp, 'questions.json')
+                make_benchmark_file(benchmark_file, 5)
+                matrix = {'Benchmarks': [{'Name': 'QALD-10', 'File': benchmark_file, 'Endpoint': endpoint.endpoint}],
+                          'Systems': ['dummy'], 'Tactics': ['t1', 't2'], 'NbTests': 1}
+                jobs = expand_matrix(matrix, tmp)
+                failures = run_sweep(jobs, 2)
+                outputs = [os.listdir(job.output_folder) for job in jobs]
+                # The sweep launched again only does the missing runs (the output of the first run is renamed
+                # as an older one, a second run in the same second would write the same file)
+                os.rename(os.path.join(jobs[0].output_folder, outputs[0][0]),
+                          os.path.join(jobs[0].output_folder, 'QALD-10_dummy_20000101_000000.json'))
+                matrix['NbTests'] = 2
+                failures.update(run_sweep(expand_matrix(matrix, tmp)[:1], 1))
+                relaunched_outputs = os.listdir(jobs[0].output_folder)
+        finally:
+            for key, value in saved.items():
+                setattr(config, key, value)
+        self.assertEqual(failures, {})
+        self.assertEqual([len(files) for files in outputs], [1, 1])
+        self.assertEqual(len(relaunched_outputs), 2)
+
+    def test_failed_run_ends_systems(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            benchmark_file = os.path.join(tmp, 'questions.json')
+            make_benchmark_file(benchmark_file, 2)
+            not_a_folder = os.path.join(tmp, 'file')
+            open(not_a_folder, 'w').close()
+            users = Sparklisllm.driver_pool_users
+            with self.assertRaises(OSError): # the log of the run can't be created
+                system_evaluation.main(benchmark_file, 'QALD-10', 'sparklisllm-LLMFrameworkOneShot', 'best_at_individual_cmd',
+                                       'http://example.com/sparql', 'llm', output_folder=not_a_folder)
+            self.assertEqual(Sparklisllm.driver_pool_users, users)
+
+
+class TestRunCatalog(unittest.TestCase):
+
+    def write_output(self, file_name, used_llm, f1_score):
+        output = {'BenchmarkName': 'QALD-10', 'TestedSystem': 'sparklisllm-LLMFrameworkOneShot', 'SuggestionCommandsAlgo': 'beam_search',
+                  'Endpoint': 'http://example.com/sparql', 'UsedLLM': used_llm, 'Stats': {'MeanF1Score': f1_score},
+                  'Data': {'1': {'BenchmarkResultType': 'uri', 'Precision': f1_score, 'Recall': f1_score, 'F1Score': f1_score}}}
+        with open(file_name, 'w') as file:
+            json.dump(output, file)
+
+    def test_incremental_update(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            outputs = os.path.join(tmp, 'Outputs')
+            os.makedirs(os.path.join(outputs, 'old'))
+            self.write_output(os.path.join(outputs, 'a.json'), 'm1', 0.5)
+            self.write_output(os.path.join(outputs, 'b.json'), 'm1', 1.0)
+            self.write_output(os.path.join(outputs, 'c.json'), 'm2', 0.2)
+            with open(os.path.join(outputs, 'broken.json'), 'w') as file:
+                file.write('{"BenchmarkName": ')
+            catalog = RunCatalog(os.path.join(tmp, 'catalog.sqlite'))
+            self.assertEqual(catalog.update([outputs])['Added'], 4)
+            self.assertEqual(catalog.update([outputs])['Unchanged'], 4)
+
+            os.replace(os.path.join(outputs, 'a.json'), os.path.join(outputs, 'old', 'a.json'))
+            os.remove(os.path.join(outputs, 'c.json'))
+            self.write_output(os.path.join(outputs, 'b.json'), 'm1', 0.0)
+            counts = catalog.update([outputs])
+            self.assertEqual((counts['Moved'], counts['Removed'], counts['Updated']), (1, 1, 1))
+
+            runs = catalog.runs(outputs, used_llm='m1')
+            self.assertEqual([os.path.basename(run['Path']) for run in runs], ['b.json', 'a.json'])
+            self.assertEqual(runs[0]['SuggestionCommandsTactic'], 'beam_search')
+            self.assertEqual(catalog.stat_by_group('MeanF1Score', strategy='LLMFrameworkOneShot')['m1']['Mean'], 0.25)
+            entry = catalog.run_entries(os.path.join(outputs, 'old'))[0]
+            self.assertEqual(entry['Data']['1']['F1Score'], 0.5)
+            catalog.close()
+
+
+class TestRunData(unittest.TestCase):
+
+    def test_loads_once(self):
+        output = {'BenchmarkName': 'QALD-10', 'Data': {'0': {'F1Score': 1.0}, '1': {'F1Score': None}}}
+        with tempfile.TemporaryDirectory() as tmp:
+            file_name = os.path.join(tmp, 'output.json')
+            with open(file_name, 'w') as file:
+                json.dump(output, file)
+            run_data = load_run_data(file_name)
+            self.assertEqual(run_data, output)
+            self.assertIs(load_run_data(file_name), run_data)
+
+            output['Data']['2'] = {'F1Score': 0.0}
+            with open(file_name, 'w') as file:
+                json.dump(output, file)
+            os.utime(file_name, ns=(1, 1))
+            self.assertEqual(len(load_run_data(file_name)['Data']), 3) # loaded again after a modification
+
+
 if __name__ == '__main__':
     unittest.main()
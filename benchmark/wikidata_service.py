@@ -0,0 +1,222 @@
+"""
+Label and entity search service for Wikidata, used by the page instead of the Wikidata API
+(getWikidataLabels and searchWikidataKeyword in llm_utils.js).
+The labels of many URIs are resolved in a single call (batched requests to the Wikidata API),
+and the labels and searches are kept in a persistent cache (by language), shared between the questions and the runs.
+With WIKIDATA_DUMP_FILE, the labels and searches are answered offline from a dump file, without the Wikidata API.
+
+The service is served by api.py under /wikidata, set WIKIDATA_SERVICE to True in config.py to make the page use it.
+It can also be run alone:
+python wikidata_service.py --port 8003
+"""
+import argparse
+import asyncio
+import json
+import logging
+import re
+import fastapi
+from fastapi.middleware.cors import CORSMiddleware
+import httpx
+from pydantic import BaseModel
+from persistent_cache import PersistentCache, make_key
+import config
+
+# Maximum number of entities in a wbgetentities request of the Wikidata API
+MAX_IDS_PER_REQUEST = 50
+# Number of requests sent at the same time to the Wikidata API
+MAX_CONCURRENT_REQUESTS = 4
+ENTITY_ID = re.compile(r"^[QPL]\d+(-[FS]\d+)?$")
+SEARCH_TYPES = ["item", "property", "lexeme", "form", "sense"]
+
+router = fastapi.APIRouter()
+
+_cache: PersistentCache = None
+_client: httpx.AsyncClient = None
+_dump: dict = None
+
+def labels_cache() -> PersistentCache:
+    """
+    Get the cache of the labels and searches.
+    """
+    global _cache
+    if _cache is None:
+        _cache = PersistentCache(config.WIKIDATA_CACHE_FILE, ttl=config.WIKIDATA_CACHE_TTL)
+    return _cache
+
+def wikidata_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(timeout=30, headers={"User-Agent": config.USER_AGENT})
+    return _client
+
+def entity_id(uri: str) -> str:
+    """
+    Id of the entity of a Wikidata URI (e.g. Q42 for http://www.wikidata.org/entity/Q42), or None.
+    """
+    last_part = uri.rstrip("/").split("/")[-1]
+    return last_part if ENTITY_ID.match(last_part) else None
+
+#####################################
+
+def load_dump(file_name: str) -> dict:
+    """
+    Labels and descriptions of the entities of a dump, by id.
+    The dump is a Wikidata JSON dump (possibly filtered), or a JSON Lines file with one entity per line
+    in the same format ({"id": ..., "labels": {"en": {"value": ...}}, "descriptions": ...}, the values can also be plain strings).
+    """
+    entities = {}
+    with open(file_name) as file:
+        for line in file:
+            line = line.strip().rstrip(",")
+            if line in ("", "[", "]"):
+                continue
+            entity = json.loads(line)
+            value = lambda term: term["value"] if isinstance(term, dict) else term
+            entities[entity["id"]] = {
+                "labels": {language: value(term) for language, term in entity.get("labels", {}).items()},
+                "descriptions": {language: value(term) for language, term in entity.get("descriptions", {}).items()},
+            }
+    logging.info(f"{len(entities)} entities loaded from the dump {file_name}")
+    return entities
+
+def dump() -> dict:
+    global _dump
+    if _dump is None:
+        _dump = load_dump(config.WIKIDATA_DUMP_FILE)
+    return _dump
+
+def entity_type(entity_id: str) -> str:
+    if "-F" in entity_id:
+        return "form"
+    if "-S" in entity_id:
+        return "sense"
+    return {"Q": "item", "P": "property", "L": "lexeme"}[entity_id[0]]
+
+def search_dump(search: str, search_type: str, language: str, limit: int) -> list[dict]:
+    """
+    Search the entities of the dump whose label contains the keyword (exact matches first, then prefixes).
+    """
+    keyword = search.strip().lower()
+    matches = []
+    for entity_id, entity in dump().items():
+        label = entity["labels"].get(language)
+        if label is None or entity_type(entity_id) != search_type or keyword not in label.lower():
+            continue
+        rank = 0 if label.lower() == keyword else 1 if label.lower().startswith(keyword) else 2
+        matches.append((rank, len(label), entity_id, label, entity["descriptions"].get(language)))
+    matches.sort()
+    return [{"id": entity_id, "label": label, "description": description}
+            for _, _, entity_id, label, description in matches[:limit]]
+
+#####################################
+
+async def fetch_labels(ids: list[str], language: str) -> dict:
+    """
+    Labels of entities from the Wikidata API (None for the entities without label in the language).
+    The Wikidata API rejects a whole request if one of its ids is invalid (e.g. a deleted entity): the ids of a rejected batch
+    are then requested one by one, and the rejected ids are left out of the result.
+    """
+    slots = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    async def fetch_batch(batch: list[str]) -> dict:
+        params = {"action": "wbgetentities", "ids": "|".join(batch), "props": "labels", "languages": language, "format": "json"}
+        async with slots:
+            response = await wikidata_client().get(config.WIKIDATA_API, params=params)
+        response.raise_for_status()
+        data = response.json()
+        if "error" in data:
+            if len(batch) == 1:
+                logging.warning(f"Wikidata API error for {batch[0]}: {data['error'].get('code')}")
+                return {}
+            labels = {}
+            for batch_labels in await asyncio.gather(*[fetch_batch([entity_id]) for entity_id in batch]):
+                labels.update(batch_labels)
+            return labels
+        entities = data.get("entities", {})
+        return {entity_id: (entities.get(entity_id, {}).get("labels", {}).get(language) or {}).get("value") for entity_id in batch}
+
+    batches = [ids[i:i + MAX_IDS_PER_REQUEST] for i in range(0, len(ids), MAX_IDS_PER_REQUEST)]
+    labels = {}
+    for batch_labels in await asyncio.gather(*[fetch_batch(batch) for batch in batches]):
+        labels.update(batch_labels)
+    return labels
+
+async def resolve_labels(uris: list[str], language: str) -> dict:
+    """
+    Labels of Wikidata URIs (None if not found), from the dump, the cache or the Wikidata API.
+    """
+    ids = {uri: entity_id(uri) for uri in uris}
+    if config.WIKIDATA_DUMP_FILE is not None:
+        entities = dump()
+        return {uri: entities.get(wikidata_id, {}).get("labels", {}).get(language) if wikidata_id else None for uri, wikidata_id in ids.items()}
+
+    cache = labels_cache()
+    labels_by_id = {}
+    missing = []
+    for wikidata_id in set(filter(None, ids.values())):
+        cached = cache.get(make_key("label", language, wikidata_id))
+        if cached is not None:
+            labels_by_id[wikidata_id] = cached["label"]
+        else:
+            missing.append(wikidata_id)
+    if len(missing) > 0:
+        fetched = await fetch_labels(sorted(missing), language)
+        for wikidata_id, label in fetched.items(): # the ids rejected by the Wikidata API are not cached
+            cache.set(make_key("label", language, wikidata_id), {"label": label})
+        labels_by_id.update(fetched)
+    return {uri: labels_by_id.get(wikidata_id) if wikidata_id else None for uri, wikidata_id in ids.items()}
+
+class LabelsRequest(BaseModel):
+    uris: list[str]
+    language: str = "en"
+
+@router.post("/labels")
+async def labels(request: LabelsRequest):
+    """
+    Labels of many Wikidata URIs in a single call: {"labels": {uri: label or null}}.
+    """
+    try:
+        return {"labels": await resolve_labels(request.uris, request.language)}
+    except httpx.HTTPError as e:
+        raise fastapi.HTTPException(502, f"Wikidata API unavailable: {e}")
+
+@router.get("/search")
+async def search(search: str, type: str = "item", language: str = "en", limit: int = 7):
+    """
+    Entities of Wikidata matching a keyword, as wbsearchentities: {"search": [{"id", "label", "description"}]}.
+    """
+    if type not in SEARCH_TYPES:
+        raise fastapi.HTTPException(400, f"Invalid type. Use one of {', '.join(SEARCH_TYPES)}")
+    if config.WIKIDATA_DUMP_FILE is not None:
+        return {"search": search_dump(search, type, language, limit)}
+
+    key = make_key("search", language, type, limit, search)
+    cached = labels_cache().get(key)
+    if cached is not None:
+        return {"search": cached}
+    params = {"action": "wbsearchentities", "search": search, "language": language, "type": type, "limit": limit, "format": "json"}
+    try:
+        response = await wikidata_client().get(config.WIKIDATA_API, params=params)
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        raise fastapi.HTTPException(502, f"Wikidata API unavailable: {e}")
+    results = [{"id": item["id"], "label": item.get("label"), "description": item.get("description")}
+               for item in response.json().get("search", [])]
+    labels_cache().set(key, results)
+    return {"search": results}
+
+
+if __name__ == "__main__":
+    import uvicorn
+    parser = argparse.ArgumentParser(description="Run the Wikidata label and search service alone.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8003)
+    parser.add_argument("--dump", help="Answer offline from this dump file (see load_dump).")
+    args = parser.parse_args()
+    if args.dump:
+        config.WIKIDATA_DUMP_FILE = args.dump
+
+    app = fastapi.FastAPI(title="Wikidata label and search service")
+    # The page of Sparklis is served from another origin
+    app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+    app.include_router(router, prefix="/wikidata")
+    uvicorn.run(app, host=args.host, port=args.port)
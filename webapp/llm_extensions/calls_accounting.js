@@ -0,0 +1,75 @@
+// if this file is included, the LLM and SPARQL calls made while answering a question are recorded
+// (tokens, time to first token, latency and HTTP status of each call), so that the benchmark can measure them.
+// The calls are kept in memory (Sparklis sends hundreds of queries per question), and written in the field "calls"
+// of the local storage only when the results of the question are harvested (saveCalls)
+
+window.recordedCalls = [];
+
+/**
+ * Record a call.
+ * @param {object} call - Type ("LLM" or "SPARQL"), Source, Model, PromptTokens, CompletionTokens, TimeToFirstToken, Latency (in seconds) and Status
+ */
+function recordCall(call) {
+    window.recordedCalls.push({ "Source": "System", ...call });
+}
+
+/**
+ * Get the recorded calls.
+ * @returns
+ */
+function getCalls() {
+    return window.recordedCalls;
+}
+
+/**
+ * Write the recorded calls in the field "calls" of the local storage.
+ */
+function saveCalls() {
+    localStorage.setItem("calls", JSON.stringify(window.recordedCalls));
+}
+
+/**
+ * Remove all the recorded calls (also from the local storage).
+ */
+function clearCalls() {
+    window.recordedCalls = [];
+    localStorage.setItem("calls", "[]");
+}
+
+/**
+ * Check if a request sent with XMLHttpRequest is a SPARQL query.
+ * @param {string} url
+ * @param {*} body
+ * @returns
+ */
+function isSparqlRequest(url, body) {
+    return /[?&]query=/.test(url) || (typeof body === "string" && /(^|&)query=/.test(body));
+}
+
+// The SPARQL queries of Sparklis are sent with XMLHttpRequest, record them when they end
+const xhrOpen = XMLHttpRequest.prototype.open;
+const xhrSend = XMLHttpRequest.prototype.send;
+XMLHttpRequest.prototype.open = function (method, url) {
+    this.accountingUrl = String(url);
+    return xhrOpen.apply(this, arguments);
+};
+XMLHttpRequest.prototype.send = function (body) {
+    if (isSparqlRequest(this.accountingUrl, body)) {
+        const start = performance.now();
+        let firstByte = null;
+        this.addEventListener("progress", () => {
+            if (firstByte === null) {
+                firstByte = performance.now();
+            }
+        });
+        this.addEventListener("loadend", () => {
+            recordCall({
+                "Type": "SPARQL",
+                "TimeToFirstToken": firstByte === null ? null : (firstByte - start) / 1000,
+                "Latency": (performance.now() - start) / 1000,
+                "Status": this.status
+            });
+        });
+    }
+    return xhrSend.apply(this, arguments);
+};
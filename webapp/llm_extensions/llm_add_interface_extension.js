@@ -146,7 +146,7 @@ document.addEventListener("DOMContentLoaded", function () {
     let input_button = document.createElement("button");
     input_button.textContent = "Send";
     input_button.onclick = function () {
-        qa_control();
+        start_qa_control();
     };
     input_button.id = "input-send-button";
     input_button.classList.add("disabled-during-request");
@@ -389,6 +389,33 @@ function updateAnswer(questionId, answer = "", sparklis_request = "", sparql_req
     }
 }
 
+/**
+ * Get all the fields of the last question of the chatbot, with the alert messages, the steps status and the recorded calls.
+ * Used by the tests to harvest the results of a question in a single call.
+ * @returns {object}
+ */
+function harvestLastQuestion() {
+    let qa_elements = document.querySelectorAll("#chatbot-responses-container .chatbot-qa");
+    let last_qa = qa_elements[qa_elements.length - 1];
+    if (typeof saveCalls === "function") {
+        saveCalls();
+    }
+    let getText = (className) => {
+        let element = last_qa ? last_qa.querySelector("." + className) : null;
+        return element ? element.innerText.trim() : "";
+    };
+    return {
+        "reasoning": getText("chatbot-reasoning"),
+        "answer": getText("chatbot-answer"),
+        "sparql_request": getText("sparql-request"),
+        "sparklis_request": getText("sparklis-request"),
+        "errors": getText("chatbot-errors"),
+        "alert_messages": localStorage.getItem("alertMessages"),
+        "steps_status": localStorage.getItem("steps_status"),
+        "calls": localStorage.getItem("calls")
+    };
+}
+
 /**
  * Disable interactions with the llm input field (used as the condition to wait for the end of the process in tests)
  */
@@ -118,13 +118,28 @@ class LLMFramework {
     }
 
     /**
-     * Insert a new step in the attribute steps_status.
+     * Insert a new step in the attribute steps_status, with its start time (in ms).
      * @param {string} name 
      * @param {string} status 
+     * @param {string|null} function_name - name of the function executing the step (used to categorize the time of the steps)
+     * @returns {string} the index of the step
      */
-    insertNewStepStatus(name, status) {
+    insertNewStepStatus(name, status, function_name = null) {
         const step_index = Object.keys(this.steps_status).length.toString();
-        this.steps_status[step_index] = { "Name" : name, "Status" : status };
+        this.steps_status[step_index] = { "Name" : name, "Status" : status, "Start" : Date.now() };
+        if (function_name) {
+            this.steps_status[step_index]["Function"] = function_name;
+        }
+        localStorage.setItem("steps_status", JSON.stringify(this.steps_status));
+        return step_index;
+    }
+
+    /**
+     * Set the end time (in ms) of a step in the attribute steps_status.
+     * @param {string} step_index 
+     */
+    setStepEnd(step_index) {
+        this.steps_status[step_index]["End"] = Date.now();
         localStorage.setItem("steps_status", JSON.stringify(this.steps_status));
     }
 
@@ -165,9 +180,14 @@ class LLMFramework {
      * @returns 
      */
     async executeStep(func, name, params) {
-        this.insertNewStepStatus(name, STATUS_ONGOING)
+        const step_index = this.insertNewStepStatus(name, STATUS_ONGOING, func.name)
         disableProxyIfenabled(); // sometimes the proxy will activate itself and prevent from accessing the endpoint, so we desactivate it if it's the case
-        const result  = await func(...params); // Execute the function with given parameters
+        let result;
+        try {
+            result = await func(...params); // Execute the function with given parameters
+        } finally {
+            this.setStepEnd(step_index);
+        }
         //change to done if not failed
         if (this.getCurrentStepStatus() == STATUS_ONGOING) {
             this.setCurrentStepStatus(STATUS_DONE) 
@@ -182,6 +202,7 @@ class LLMFramework {
     async answerQuestion() {
         // set the starting step to done
         this.setCurrentStepStatus(STATUS_DONE)
+        this.setStepEnd("0");
         // change the logic of the suggestions for the qa extension
         window.select_sugg_logic = this.select_sugg_logic;
         // call the strategy logic to answer the question
@@ -306,23 +327,41 @@ class LLMFramework {
  * Function to control the logic of the extension.
  */
 async function qa_control() {
-    /////////// Initialization ///////////
-    clearAlerts(); // Clear alerts in the storage for each new question
-    sparklis.home(); // we want to reset sparklis between different queries
     // disable interactions with the llm input field (used as the condition to wait for the end of the process in tests)
     disableInputs();
 
     let question_field = document.getElementById("user-input");
     let question = question_field.value;
-    let question_id = addLLMQuestion(question); //  Add a div in the interface to display the question and the answer
-
-    /////////// PROCESSING ///////////
 
     //the used framework type is inferred by the dropdown value (could also force a specific class here)
     // Get the selected value
     let dropdown = document.getElementById("strategy-dropdown");
     let selectedClassName = dropdown.value; // Example: "LLMFrameworkBooleanBySubquestions"
 
+    await answer_question_with_strategy(question, selectedClassName);
+
+    //re-enable interactions (used as the condition to end the wait from tests)
+    enableInputs(); 
+}
+
+/**
+ * Answer a question with a strategy and display it in the interface (core of qa_control).
+ * @param {string} question - question to answer
+ * @param {string} selectedClassName - name of the LLMFramework class of the strategy
+ * @returns {LLMFramework} the framework used to answer the question
+ */
+async function answer_question_with_strategy(question, selectedClassName) {
+    /////////// Initialization ///////////
+    clearAlerts(); // Clear alerts in the storage for each new question
+    if (typeof clearCalls === "function") {
+        clearCalls(); // Clear the recorded calls for each new question
+    }
+    sparklis.home(); // we want to reset sparklis between different queries
+
+    let question_id = addLLMQuestion(question); //  Add a div in the interface to display the question and the answer
+
+    /////////// PROCESSING ///////////
+
     let framework = null;
     // Select the class corresponding to the selected value (only if available)
     if (window[selectedClassName]) {
@@ -340,8 +379,42 @@ async function qa_control() {
     updateReasoning(framework.question_id, framework.reasoning_text);
     //set the result in the answer field
     updateAnswer(framework.question_id, framework.result_text, framework.sparklis_nl, framework.sparql, framework.errors); 
-    //re-enable interactions (used as the condition to end the wait from tests)
-    enableInputs(); 
+    return framework;
+}
+
+/**
+ * Run a strategy on a question without going through the inputs and dropdowns of the interface.
+ * Faster entry point for the tests, resolved with the results of the question.
+ * @param {string} question - question to answer
+ * @param {string} strategy_name - name of the LLMFramework class of the strategy
+ * @param {string} suggestion_commands_tactic - tactic of the suggestion commands (option of suggestion-commands-tactic-dropdown)
+ * @returns {object} the results of the question (see harvestLastQuestion)
+ */
+async function run_strategy(question, strategy_name, suggestion_commands_tactic) {
+    disableInputs();
+    try {
+        clearQuestionData(); // clear all previous messages
+        // The qa extension reads the tactic from its dropdown
+        if (window.suggestion_commands_tactic.includes(suggestion_commands_tactic)) {
+            $("#suggestion-commands-tactic-dropdown").val(suggestion_commands_tactic);
+        } else {
+            console.error("Tactic " + suggestion_commands_tactic + " not found in the dropdown");
+        }
+        await answer_question_with_strategy(question, strategy_name);
+    } finally {
+        enableInputs();
+    }
+    return harvestLastQuestion();
+}
+
+/**
+ * Start qa_control and keep its promise in window.qa_control_run,
+ * so that the end of the process can be awaited instead of polled (used by the tests).
+ * @returns the promise of qa_control
+ */
+function start_qa_control() {
+    window.qa_control_run = qa_control();
+    return window.qa_control_run;
 }
 
 // upon window load... create text field and ENTER handler
@@ -351,7 +424,7 @@ window.addEventListener(
     let input_field = document.getElementById("user-input");
     input_field.addEventListener("keyup", function(event) {
         if (event.keyCode == 13) { // ENTER
-            qa_control();
+            start_qa_control();
         }
 	})
 });
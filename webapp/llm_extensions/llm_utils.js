@@ -5,6 +5,8 @@ const DefaultALASQAConfig = {
     api_key: undefined, // API key for the LLM service, if needed
     model: undefined, // Model to use for the LLM service (if unset, will use the default model of the service)
     nl_post_processing: true,
+    temperature: 0.8, // Temperature of the LLM requests (0 for deterministic answers, which can be cached by llm_proxy.py)
+    wikidata_service_url: undefined, // Label and search service for Wikidata (wikidata_service.py), if unset the Wikidata API is used directly
 };
 
 // Initialize sessionStorage if not set (we use sessionStorage to have it updated each time the page is loaded)
@@ -47,13 +49,22 @@ function usualPrompt(systemPrompt, userPrompt) {
  * @param {string} input - the prompt to send to the LLM
  * @param {boolean} streamOption - if true, the response will be streamed
  * @param {*} updateCallback - function to call when the LLM sends a response
- * @param {*} usedTemperature - the temperature to use for the LLM
+ * @param {*} usedTemperature - the temperature to use for the LLM (by default the temperature of the config)
  * @param {Array} stop_sequences - the sequences that will stop the LLM generation
  * @param {number} max_response_length - the maximum length of the response in tokens (we can base it on GPT limits, e.g. 4096 for GPT-3.5)
  * @returns 
  */
-async function sendPrompt(input, streamOption = true, updateCallback = null, usedTemperature = 0.8, stop_sequences = ["Q:"], max_response_length = 4096) {
+async function sendPrompt(input, streamOption = true, updateCallback = null, usedTemperature = undefined, stop_sequences = ["Q:"], max_response_length = 4096) {
+    if (usedTemperature === undefined) {
+        usedTemperature = getALASQAConfig().temperature ?? DefaultALASQAConfig.temperature;
+    }
     //careful the first parameter can be interpreted as several parameters...
+    // measures of the call (recorded if calls_accounting.js is included)
+    const start = performance.now();
+    let firstToken = null;
+    let usage = null;
+    let usedModel = getALASQAConfig().model || null;
+    let status = null;
     try {
         let headers = {
             "Content-Type": "application/json"
@@ -70,6 +81,9 @@ async function sendPrompt(input, streamOption = true, updateCallback = null, use
             stop: stop_sequences,
             max_tokens: max_response_length 
         };
+        if (streamOption) {
+            body.stream_options = { include_usage: true }; // ask for the number of tokens in the last chunk
+        }
         // If a model is specified in the config, use it
         let model = getALASQAConfig().model;
         if (model) {
@@ -81,6 +95,7 @@ async function sendPrompt(input, streamOption = true, updateCallback = null, use
             headers: headers,
             body: JSON.stringify(body)
         });
+        status = response.status;
         console.log("Ongoing LLM generation...")
         let text = "";
         if (streamOption) {
@@ -106,6 +121,16 @@ async function sendPrompt(input, streamOption = true, updateCallback = null, use
         
                     try {
                         let chunkData = JSON.parse(part.trim());
+                        usedModel = chunkData.model || usedModel;
+                        if (chunkData.usage) {
+                            usage = chunkData.usage;
+                        }
+                        if (!chunkData.choices || chunkData.choices.length == 0) {
+                            continue; // last chunk with only the usage
+                        }
+                        if (firstToken === null) {
+                            firstToken = performance.now();
+                        }
                         text += chunkData.choices[0].delta["content"] || '';
         
                         if (updateCallback != null) {
@@ -118,6 +143,8 @@ async function sendPrompt(input, streamOption = true, updateCallback = null, use
             }
         } else {
             const data = await response.json();
+            usage = data.usage || null;
+            usedModel = data.model || usedModel;
             text = data["choices"][0]["message"]["content"] || "No response"
 
             if (updateCallback != null) {
@@ -126,7 +153,20 @@ async function sendPrompt(input, streamOption = true, updateCallback = null, use
         }
         return text;
     } catch (error) {
+        status = status || "error";
         return "Error: " + error.message;
+    } finally {
+        if (typeof recordCall === "function") {
+            recordCall({
+                "Type": "LLM",
+                "Model": usedModel,
+                "PromptTokens": usage ? usage.prompt_tokens : null,
+                "CompletionTokens": usage ? usage.completion_tokens : null,
+                "TimeToFirstToken": firstToken === null ? null : (firstToken - start) / 1000,
+                "Latency": (performance.now() - start) / 1000,
+                "Status": status
+            });
+        }
     }
 }
 
@@ -156,31 +196,92 @@ function waitForEvaluation(place) {
     });
 }
 
+// Id of a Wikidata entity (item, property, lexeme, form or sense), as ENTITY_ID in wikidata_service.py
+const WIKIDATA_ENTITY_ID = /^[QPL]\d+(-[FS]\d+)?$/;
+
 /**
- * Get the label corresponding to a Wikidata URI and add it to the result text as a new field
- * @param {string} wikidataURI - the Wikidata URI to get the label for
- * @param {string} language - the language to get the label in (default is "en")
- * @returns 
+ * Get the labels of Wikidata entities from the Wikidata API.
+ * The API rejects a whole request if one of its ids is invalid (e.g. a deleted entity), the ids are then requested one by one.
+ * @param {Array<string>} ids - the ids of the entities (at most 50)
+ * @param {string} language - the language to get the labels in
+ * @returns {Promise<Object>} - the label of each id found (undefined if the entity has no label in the language)
  */
-async function getWikidataLabel(wikidataURI, language = "en") {
-    const entityId = wikidataURI.split('/').pop();
-    const url = `https://www.wikidata.org/w/api.php?action=wbgetentities&ids=${entityId}&format=json&props=labels&languages=${language}&origin=*`;
+async function fetchWikidataLabels(ids, language) {
+    const url = `https://www.wikidata.org/w/api.php?action=wbgetentities&ids=${ids.join("|")}&format=json&props=labels&languages=${language}&origin=*`;
+    const response = await fetch(url);
+    const data = await response.json();
+    let labels = {};
+    if (data.error) {
+        if (ids.length > 1) {
+            for (const id of ids) {
+                Object.assign(labels, await fetchWikidataLabels([id], language));
+            }
+        }
+        return labels;
+    }
+    for (const id of ids) {
+        labels[id] = data.entities?.[id]?.labels?.[language]?.value;
+    }
+    return labels;
+}
 
+/**
+ * Get the labels corresponding to Wikidata URIs, in a single call to the Wikidata service if set (wikidata_service_url),
+ * else in batches of 50 entities to the Wikidata API
+ * @param {Array<string>} wikidataURIs - the Wikidata URIs to get the labels for
+ * @param {string} language - the language to get the labels in (default is "en")
+ * @returns {Promise<Object>} - the label of each URI ("Label not found" if the entity has no label in the language)
+ */
+async function getWikidataLabels(wikidataURIs, language = "en") {
+    const uris = [...new Set(wikidataURIs)];
+    let labels = {};
+    if (uris.length === 0) {
+        return labels;
+    }
+    const serviceUrl = getALASQAConfig().wikidata_service_url;
     try {
-        const response = await fetch(url);
-        const data = await response.json();
-        let label ="Label not fetched";
-        try {
-            label = data.entities[entityId]?.labels[language]?.value || "Label not found";
+        if (serviceUrl) {
+            const response = await fetch(`${serviceUrl}/labels`, {
+                method: "POST",
+                headers: { "Content-Type": "application/json" },
+                body: JSON.stringify({ uris: uris, language: language })
+            });
+            const data = await response.json();
+            for (const uri of uris) {
+                labels[uri] = data.labels?.[uri] || "Label not found";
+            }
+            return labels;
+        }
+        // Only the URIs of entities are sent (not the ones of statements, values or references)
+        const entityURIs = uris.filter(uri => WIKIDATA_ENTITY_ID.test(uri.split('/').pop()));
+        for (let i = 0; i < entityURIs.length; i += 50) {
+            const batch = entityURIs.slice(i, i + 50);
+            const ids = batch.map(uri => uri.split('/').pop());
+            const batchLabels = await fetchWikidataLabels(ids, language);
+            batch.forEach((uri, j) => {
+                labels[uri] = batchLabels[ids[j]];
+            });
         }
-        catch(err) {
-            console.error("Error fetching label:", err);
+        for (const uri of uris) {
+            labels[uri] = labels[uri] || "Label not found";
         }
-        return label;
     } catch (error) {
-        console.warn("Error fetching data:", error);
-        return "Error fetching label";
+        console.warn("Error fetching labels:", error);
+        for (const uri of uris) {
+            labels[uri] = labels[uri] || "Error fetching label";
+        }
     }
+    return labels;
+}
+
+/**
+ * Get the label corresponding to a Wikidata URI
+ * @param {string} wikidataURI - the Wikidata URI to get the label for
+ * @param {string} language - the language to get the label in (default is "en")
+ * @returns 
+ */
+async function getWikidataLabel(wikidataURI, language = "en") {
+    return (await getWikidataLabels([wikidataURI], language))[wikidataURI];
 }
 
 /**
@@ -196,7 +297,10 @@ async function searchWikidataKeyword(keyword, type) {
         throw new Error("Invalid type. Use 'item', 'property', 'lexeme', 'form', or 'sense'");
     }
     
-    const url = `${baseUrl}?action=wbsearchentities&search=${encodeURIComponent(keyword)}&language=en&type=${type}&format=json&origin=*`;
+    const serviceUrl = getALASQAConfig().wikidata_service_url;
+    const url = serviceUrl
+        ? `${serviceUrl}/search?search=${encodeURIComponent(keyword)}&language=en&type=${type}`
+        : `${baseUrl}?action=wbsearchentities&search=${encodeURIComponent(keyword)}&language=en&type=${type}&format=json&origin=*`;
     
     try {
         const response = await fetch(url);
@@ -284,13 +388,12 @@ async function getQueryResults(sparqlQuery, withLabels) {
     if (results && results.rows && isAskQuery(sparqlQuery)) { //the query also needs to not return an error
         results = results.rows.length > 0;
     } else if (withLabels && results && results.rows) { //only look for labels if needed
-        for (let row of results.rows) {
-            for (let value of row) {
-                // for each value, if it is a wikidata uri, add the corresponding label from wikidata
-                if (value && value.type === "uri" && value.uri.startsWith("http://www.wikidata.org/")) {
-                    value.label = await getWikidataLabel(value.uri);
-                }
-            }
+        // for each value, if it is a wikidata uri, add the corresponding label from wikidata (all the labels are fetched at once)
+        const isWikidataValue = value => value && value.type === "uri" && value.uri.startsWith("http://www.wikidata.org/");
+        const wikidataValues = results.rows.flat().filter(isWikidataValue);
+        const labels = await getWikidataLabels(wikidataValues.map(value => value.uri));
+        for (let value of wikidataValues) {
+            value.label = labels[value.uri];
         }
     }
     return results;